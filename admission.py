@@ -0,0 +1,164 @@
+"""
+Agent 运行准入控制
+
+每次行程生成都会占用一次 Agent 运行、MCP 会话和 OpenRouter 配额，突发请求会让所有请求一起变慢。
+- 全局并发上限：同时运行的 Agent 数，不超过 travel MCP 会话池大小，放行的请求不会再在会话池中排队
+- 每用户上限：同一登录用户同时运行 + 排队的请求数，超出时立即返回 429；
+  未登录的请求没有可靠的身份，不受此限制，每个请求单独参与公平调度，只受全局并发和队列限制
+- 有界等待队列：排队位置通过 ProgressManager 推送；队列已满或预计等待过长时立即返回 503
+- 公平调度：有空位时优先放行当前运行数最少的用户，同等情况下先到先得
+拒绝时附带 Retry-After，按最近运行耗时估算。
+"""
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from mcp_pool import travel_mcp_pool
+from progress import progress_manager
+
+ANONYMOUS_USER = "anonymous"
+
+
+class _Waiter:
+    def __init__(self, user_id: str, request_id: Optional[str], sequence: int):
+        self.user_id = user_id
+        self.request_id = request_id
+        self.sequence = sequence
+        self.position = 0  # 最近一次推送的排队位置
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = 4, per_user_limit: int = 2, max_waiting: int = 20,
+                 max_wait_seconds: float = 90, initial_run_seconds: float = 60):
+        """
+        Args:
+            max_concurrent: 同时运行的 Agent 数上限
+            per_user_limit: 每个用户同时运行 + 排队的请求数上限
+            max_waiting: 等待队列长度上限
+            max_wait_seconds: 排队等待超过此时间放弃；预计等待超过此时间的请求直接拒绝
+            initial_run_seconds: 尚无统计数据时假定的单次运行耗时
+        """
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.running = 0
+        self.running_by_user: Dict[str, int] = {}
+        self.pending_by_user: Dict[str, int] = {}
+        self.waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._anonymous = itertools.count()
+        # 单次运行耗时的指数移动平均，用于估算等待时间
+        self.average_run_seconds = initial_run_seconds
+
+    def estimated_wait(self, position: int) -> float:
+        """排在第 position 位（从 1 开始）的请求预计等待时间"""
+        return math.ceil(position / self.max_concurrent) * self.average_run_seconds
+
+    def _reject(self, status_code: int, detail: str, retry_after: float):
+        raise HTTPException(status_code=status_code, detail=detail,
+                            headers={"Retry-After": str(max(1, int(retry_after)))})
+
+    def reject_overloaded(self):
+        """下游资源（如 MCP 会话池）借用超时时，与排队已满一样返回 503 和重试提示"""
+        self._reject(503, "当前请求过多，请稍后重试", self.average_run_seconds)
+
+    def check(self, user_id: Optional[str]):
+        """在开始任何工作前检查是否会被拒绝，尽早返回重试提示"""
+        if user_id and self.pending_by_user.get(user_id, 0) >= self.per_user_limit:
+            self._reject(429, "您已有正在生成的行程，请稍后重试", self.average_run_seconds)
+        if self.running >= self.max_concurrent:
+            position = len(self.waiters) + 1
+            if position > self.max_waiting or self.estimated_wait(position) > self.max_wait_seconds:
+                self._reject(503, "当前请求过多，请稍后重试", self.estimated_wait(position))
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[str], request_id: Optional[str] = None):
+        """获得运行名额后进入上下文，退出时释放名额"""
+        self.check(user_id)
+        # 未登录的请求各自使用独立的键，互不占用对方的名额
+        user_id = user_id or f"{ANONYMOUS_USER}:{next(self._anonymous)}"
+        self.pending_by_user[user_id] = self.pending_by_user.get(user_id, 0) + 1
+        try:
+            if self.running < self.max_concurrent and not self.waiters:
+                self._start(user_id)
+            else:
+                await self._wait(user_id, request_id)
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self._finish(user_id, time.monotonic() - started)
+        finally:
+            self.pending_by_user[user_id] -= 1
+            if not self.pending_by_user[user_id]:
+                del self.pending_by_user[user_id]
+
+    def _start(self, user_id: str):
+        self.running += 1
+        self.running_by_user[user_id] = self.running_by_user.get(user_id, 0) + 1
+
+    def _finish(self, user_id: str, elapsed: float):
+        self.average_run_seconds = 0.8 * self.average_run_seconds + 0.2 * elapsed
+        self._release(user_id)
+
+    def _release(self, user_id: str):
+        self.running -= 1
+        self.running_by_user[user_id] -= 1
+        if not self.running_by_user[user_id]:
+            del self.running_by_user[user_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        """有空位时按公平顺序放行等待者"""
+        while self.waiters and self.running < self.max_concurrent:
+            waiter = min(self.waiters, key=lambda w: (self.running_by_user.get(w.user_id, 0), w.sequence))
+            self.waiters.remove(waiter)
+            self._start(waiter.user_id)
+            waiter.future.set_result(None)
+        self._report_positions()
+
+    def _report_positions(self):
+        for position, waiter in enumerate(sorted(self.waiters, key=lambda w: w.sequence), start=1):
+            if waiter.request_id and waiter.position != position:
+                waiter.position = position
+                asyncio.ensure_future(progress_manager.add_progress(
+                    waiter.request_id,
+                    f"Waiting for an available planner, you are #{position} in the queue",
+                    "queue",
+                    data={"position": position, "estimated_wait_seconds": int(self.estimated_wait(position))}
+                ))
+
+    async def _wait(self, user_id: str, request_id: Optional[str]):
+        waiter = _Waiter(user_id, request_id, next(self._sequence))
+        self.waiters.append(waiter)
+        self._report_positions()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # 超时的同时恰好获得名额，归还名额
+                self._release(user_id)
+            else:
+                waiter.future.cancel()
+                self.waiters.remove(waiter)
+                self._report_positions()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(503, "排队等待超时，请稍后重试", self.average_run_seconds)
+
+
+admission_controller = AdmissionController(
+    # 每次运行至少占用一个 travel MCP 会话，并发上限超过会话池大小只会让请求在池中等到借用超时
+    max_concurrent=min(int(os.getenv("AGENT_MAX_CONCURRENCY", str(travel_mcp_pool.size))), travel_mcp_pool.size),
+    per_user_limit=int(os.getenv("AGENT_PER_USER_LIMIT", "2")),
+    max_waiting=int(os.getenv("AGENT_MAX_WAITING", "20")),
+    max_wait_seconds=float(os.getenv("AGENT_MAX_WAIT_SECONDS", "90")),
+)
@@ -0,0 +1,131 @@
+"""
+Airbnb 房源图片提取
+
+- 按主机限制并发，多个房源同时抓取
+- 流式读取 HTML，解析到第一个带图片的 application/ld+json 块后立即停止下载
+- 按房源 URL 缓存结果（房源照片很少变化，TTL 较长）
+"""
+import asyncio
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from cache_utils import SQLiteTTLCache, TTLCache, TieredCache
+from http_client import get_http_client
+
+LISTING_CACHE_PATH = os.getenv("AIRBNB_CACHE_PATH", ".cache/airbnb.sqlite3")
+LISTING_CACHE_TTL = 7 * 24 * 3600
+LISTING_MISS_TTL = 6 * 3600  # 页面中没有图片时短期缓存
+PER_HOST_LIMIT = int(os.getenv("AIRBNB_PER_HOST_LIMIT", "4"))
+
+JSON_LD_OPEN = '<script type="application/ld+json">'
+JSON_LD_CLOSE = '</script>'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+
+
+def _create_listing_cache() -> TieredCache:
+    memory = TTLCache(maxsize=2048, ttl=LISTING_CACHE_TTL)
+    try:
+        disk = SQLiteTTLCache(LISTING_CACHE_PATH, table="listing_images", ttl=LISTING_CACHE_TTL)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Airbnb 磁盘缓存不可用，仅使用内存缓存: {e}")
+        disk = None
+    return TieredCache(memory, disk)
+
+
+listing_cache = _create_listing_cache()
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).hostname or ""
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PER_HOST_LIMIT)
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def _images_from_json_ld(block: str) -> List[str]:
+    try:
+        data = json.loads(block)
+    except ValueError:
+        return []
+    if not isinstance(data, dict) or 'image' not in data:
+        return []
+    if isinstance(data['image'], str):
+        return [data['image']]
+    if isinstance(data['image'], list):
+        return [image for image in data['image'][:3] if isinstance(image, str)]
+    return []
+
+
+class JsonLdImageScanner:
+    """增量扫描 HTML 文本块，找到第一个带图片的 JSON-LD 块"""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> Optional[List[str]]:
+        """喂入新的文本块，找到图片时返回图片列表"""
+        self._buffer += chunk
+        while True:
+            start = self._buffer.find(JSON_LD_OPEN)
+            if start == -1:
+                # 保留末尾可能被截断的开始标签
+                self._buffer = self._buffer[-len(JSON_LD_OPEN):]
+                return None
+            end = self._buffer.find(JSON_LD_CLOSE, start + len(JSON_LD_OPEN))
+            if end == -1:
+                # 块尚未结束，丢弃之前的内容等待更多数据
+                self._buffer = self._buffer[start:]
+                return None
+            images = _images_from_json_ld(self._buffer[start + len(JSON_LD_OPEN):end])
+            self._buffer = self._buffer[end + len(JSON_LD_CLOSE):]
+            if images:
+                return images
+
+
+async def _fetch_listing_images(room_url: str) -> List[str]:
+    scanner = JsonLdImageScanner()
+    async with _host_semaphore(room_url):
+        async with get_http_client().stream("GET", room_url, headers=HEADERS, follow_redirects=True) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_text():
+                images = scanner.feed(chunk)
+                if images:
+                    # 提前退出 stream 上下文，剩余 HTML 不再下载
+                    return images
+    return []
+
+
+async def get_airbnb_images(room_url: str) -> List[str]:
+    """
+    获取 Airbnb 房源图片（返回第一张图片）
+    """
+    cached = listing_cache.get(room_url)
+    if cached is not None:
+        return cached
+
+    try:
+        print(f"正在获取 Airbnb 房源图片: {room_url}")
+        image_urls = await _fetch_listing_images(room_url)
+    except Exception as e:
+        # 单个房源失败（网络错误、模型生成的非法链接 httpx.InvalidURL 等）不影响其他房源，也不缓存
+        print(f"获取 Airbnb 图片失败 {room_url}: {e}")
+        return []
+
+    print(f"找到 {len(image_urls)} 张图片")
+    result = image_urls[:1]  # 返回第一张图片
+    listing_cache.set(room_url, result, ttl=None if result else LISTING_MISS_TTL)
+    return result
+
+
+async def get_airbnb_images_many(room_urls: Iterable[str]) -> List[List[str]]:
+    """并发获取多个房源的图片，结果顺序与输入一致"""
+    return await asyncio.gather(*[get_airbnb_images(url) for url in room_urls])
@@ -0,0 +1,271 @@
+"""
+通用缓存工具
+
+- TTLCache: 进程内 LRU + TTL 缓存（线程安全）
+- SQLiteTTLCache: 基于 SQLite 的持久化 TTL 缓存，可跨进程/重启共享；每写入 purge_every 次清理一次过期条目
+- RedisTTLCache: 与 SQLiteTTLCache 接口一致的 Redis 后端，可跨机器共享（需安装 redis）
+- TieredCache: 内存 + 磁盘两级缓存
+- SWRCache: 异步 stale-while-revalidate 缓存，带请求合并
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """读取缓存，过期或不存在时返回 default"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTTLCache:
+    def __init__(self, path: str, table: str = "cache", ttl: float = 7 * 24 * 3600, purge_every: int = 256):
+        """
+        Args:
+            purge_every: 每写入多少次清理一次过期条目（过期条目只在再次读取同一个键时才会被删除，
+                         不清理的话文件会无限增长）；0 表示不自动清理
+        """
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str, default=None):
+        """读取缓存，值以 JSON 形式存储"""
+        return self.get_with_ttl(key, (default, None))[0]
+
+    def get_with_ttl(self, key: str, default=(None, None)):
+        """读取缓存及其剩余有效秒数，返回 (value, ttl)"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            value, expires_at = row
+            remaining = expires_at - time.time()
+            if remaining < 0:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return default
+        return json.loads(value), remaining
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at),
+            )
+            self._writes += 1
+            if self.purge_every and self._writes % self.purge_every == 0:
+                self._purge_expired()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        """删除所有过期条目，返回删除数量"""
+        with self._lock:
+            return self._purge_expired()
+
+    def _purge_expired(self) -> int:
+        cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisTTLCache:
+    """Redis（或兼容协议的 KeyDB / Valkey 等）后端，值以 JSON 存储，依赖 Redis 自身的过期机制"""
+
+    def __init__(self, url: str, prefix: str = "cache", ttl: float = 7 * 24 * 3600):
+        import redis  # 可选依赖，仅在配置了 Redis 时需要
+
+        self.prefix = prefix
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: str, default=None):
+        value = self._client.get(self._key(key))
+        if value is None:
+            return default
+        return json.loads(value)
+
+    def get_with_ttl(self, key: str, default=(None, None)):
+        """读取缓存及其剩余有效秒数，返回 (value, ttl)"""
+        pipeline = self._client.pipeline()
+        pipeline.get(self._key(key))
+        pipeline.pttl(self._key(key))
+        value, remaining_ms = pipeline.execute()
+        if value is None:
+            return default
+        return json.loads(value), (remaining_ms / 1000 if remaining_ms > 0 else None)
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        seconds = max(1, int(self.ttl if ttl is None else ttl))
+        self._client.set(self._key(key), json.dumps(value, ensure_ascii=False), ex=seconds)
+
+    def delete(self, key: str):
+        self._client.delete(self._key(key))
+
+    def close(self):
+        self._client.close()
+
+
+class TieredCache:
+    def __init__(self, memory: TTLCache, disk: Optional[SQLiteTTLCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str, default=None):
+        """先查内存，未命中再查磁盘并以磁盘条目的剩余有效期回填内存"""
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value, remaining = self.disk.get_with_ttl(key, (_MISSING, None))
+            if value is not _MISSING:
+                self.memory.set(key, value, ttl=None if remaining is None else min(remaining, self.memory.ttl))
+                return value
+        return default
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        self.memory.set(key, value, ttl=None if ttl is None else min(ttl, self.memory.ttl))
+        if self.disk is not None:
+            self.disk.set(key, value, ttl=ttl)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+
+class SWRCache:
+    """
+    异步 stale-while-revalidate 缓存
+
+    - 新鲜期内直接返回缓存
+    - 过期但仍在 stale 窗口内：立即返回旧值，并在后台刷新
+    - 相同 key 的并发未命中只触发一次上游请求
+    - is_degraded(value) 为真的降级结果（如上游失败时的占位内容）只缓存 degraded_ttl 秒，
+      不进入 stale 窗口，也不会覆盖已缓存的正常结果
+    """
+
+    def __init__(self, maxsize: int = 512, fresh_ttl: float = 3600, stale_ttl: float = 6 * 3600,
+                 is_degraded: Optional[Callable[[Any], bool]] = None, degraded_ttl: float = 10):
+        self.fresh_ttl = fresh_ttl
+        self.is_degraded = is_degraded
+        self.degraded_ttl = degraded_ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=fresh_ttl + stale_ttl)
+        self._inflight = {}
+        self._background = set()
+
+    def _store(self, key, value):
+        """缓存条目为 (值, 获取时间, 是否降级)"""
+        if self.is_degraded is None or not self.is_degraded(value):
+            self._entries.set(key, (value, time.monotonic(), False))
+            return
+        previous = self._entries.get(key)
+        if previous is not None and not previous[2]:
+            return  # 保留正常的旧结果，下次请求继续在后台重试
+        self._entries.set(key, (value, time.monotonic(), True), ttl=self.degraded_ttl)
+
+    def _fetch(self, key, fetch):
+        """合并同一 key 的并发请求，返回共享的 future"""
+        future = self._inflight.get(key)
+        if future is None:
+            async def run():
+                try:
+                    value = await fetch()
+                    self._store(key, value)
+                    return value
+                finally:
+                    self._inflight.pop(key, None)
+
+            future = asyncio.ensure_future(run())
+            self._inflight[key] = future
+        return future
+
+    async def get_or_fetch(self, key, fetch):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at, degraded = entry
+            fresh_ttl = self.degraded_ttl if degraded else self.fresh_ttl
+            if time.monotonic() - fetched_at > fresh_ttl and key not in self._inflight:
+                task = self._fetch(key, fetch)
+                self._background.add(task)
+                task.add_done_callback(self._on_background_done)
+            return value
+        return await asyncio.shield(self._fetch(key, fetch))
+
+    def _on_background_done(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"后台刷新缓存失败: {task.exception()}")
+
+    def invalidate(self, key):
+        self._entries.delete(key)
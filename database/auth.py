@@ -6,9 +6,10 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import RedirectResponse
 from google.oauth2 import id_token
 from google.auth.transport import requests
-import httpx
 from typing import Optional
 
+from http_client import get_http_client
+
 router = APIRouter()
 
 def get_google_config():
@@ -76,10 +77,11 @@ async def google_callback(code: Optional[str] = None, error: Optional[str] = Non
             "grant_type": "authorization_code"
         }
         
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(token_url, data=token_data)
-            token_response.raise_for_status()
-            tokens = token_response.json()
+        token_response = await get_http_client().post(token_url, data=token_data)
+        if token_response.is_error:
+            raise HTTPException(status_code=500,
+                                detail=f"OAuth token交换失败: {token_response.status_code} {token_response.text}")
+        tokens = token_response.json()
         
         id_token_str = tokens.get("id_token")
         if not id_token_str:
@@ -118,8 +120,8 @@ async def google_callback(code: Optional[str] = None, error: Optional[str] = Non
         
         return RedirectResponse(url=frontend_url)
         
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=500, detail=f"OAuth token交换失败: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"认证失败: {str(e)}")
 
@@ -1,12 +1,20 @@
+import asyncio
+import os
+
 from amadeus import Client, ResponseError
+
+from cache_utils import TTLCache
 from models import Flight
 
 class SimpleFlightService:
-    def __init__(self):
+    def __init__(self, cache_ttl: float = 900):
+        # Client 内部缓存 OAuth token，整个进程共用一个实例即可
         self.amadeus = Client(
             client_id='...',
             client_secret='...'
         )
+        # (出发地, 目的地, 日期, 人数) -> 航班报价
+        self.offer_cache = TTLCache(maxsize=512, ttl=cache_ttl)
         self.airport_mapping = {
             '东京': 'HND', 
             'tokyo': 'NRT', 
@@ -39,21 +47,31 @@ class SimpleFlightService:
 
         return 'HKG'  # 默认返回香港
     
+    def search_flight_offers(self, origin_code, destination_code, departure_date, passengers=1):
+        """查询航班报价，结果按 (origin, destination, date, adults) 缓存"""
+        cache_key = (origin_code, destination_code, departure_date, passengers)
+        cached = self.offer_cache.get(cache_key)
+        if cached is not None:
+            print(f"航班缓存命中: {cache_key}")
+            return cached
+
+        response = self.amadeus.shopping.flight_offers_search.get(
+            originLocationCode=origin_code,
+            destinationLocationCode=destination_code,
+            departureDate=departure_date,
+            adults=passengers,
+            nonStop='true', 
+            max=50 
+        )
+        self.offer_cache.set(cache_key, response.data)
+        return response.data
+
     def search_flights_with_budget(self, origin, destination, departure_date, passengers=1, max_budget=None):
         origin_code = self.get_airport_code(origin)
         destination_code = self.get_airport_code(destination)
            
         try:
-            response = self.amadeus.shopping.flight_offers_search.get(
-                originLocationCode=origin_code,
-                destinationLocationCode=destination_code,
-                departureDate=departure_date,
-                adults=passengers,
-                nonStop='true', 
-                max=50 
-            )
-            
-            all_flights = response.data
+            all_flights = self.search_flight_offers(origin_code, destination_code, departure_date, passengers)
             print(f"找到 {len(all_flights)} 个航班选项")
             
             if max_budget:
@@ -72,29 +90,40 @@ class SimpleFlightService:
             print(f"航班搜索失败: {error}")
             return None
 
-    def get_round_trip_flights(self, departure_city, destination_city, num_people, budget, departure_date, return_date):
-        """获取往返航班信息"""
+    async def get_round_trip_flights(self, departure_city, destination_city, num_people, budget, departure_date, return_date):
+        """获取往返航班信息，去程和返程在线程池中并发查询"""
         flight_budget = budget * 0.5  # 分配50%预算给单程机票
         
-        # 查询去程航班
-        outbound_flights = self.search_flights_with_budget(
-            origin=departure_city,
-            destination=destination_city,
-            departure_date=departure_date,
-            passengers=num_people,
-            max_budget=flight_budget
+        outbound_flights, inbound_flights = await asyncio.gather(
+            # 查询去程航班
+            asyncio.to_thread(
+                self.search_flights_with_budget,
+                origin=departure_city,
+                destination=destination_city,
+                departure_date=departure_date,
+                passengers=num_people,
+                max_budget=flight_budget
+            ),
+            # 查询返程航班
+            asyncio.to_thread(
+                self.search_flights_with_budget,
+                origin=destination_city,
+                destination=departure_city,
+                departure_date=return_date,
+                passengers=num_people,
+                max_budget=flight_budget
+            ),
+            return_exceptions=True
         )
-        
-        # 查询返程航班
-        inbound_flights = self.search_flights_with_budget(
-            origin=destination_city,
-            destination=departure_city,
-            departure_date=return_date,
-            passengers=num_people,
-            max_budget=flight_budget
-        )
-        
-        return outbound_flights, inbound_flights
+
+        # 一个方向查询失败不影响另一个方向的结果
+        legs = []
+        for flights in (outbound_flights, inbound_flights):
+            if isinstance(flights, Exception):
+                print(f"航班搜索失败: {flights}")
+                flights = None
+            legs.append(flights)
+        return legs[0], legs[1]
 
     def extract_flight(self, segment, duration, origin, destination):
         """从 segment 信息提取航班数据并返回 Flight 对象"""
@@ -111,3 +140,6 @@ class SimpleFlightService:
             airline=segment['carrierCode'],
             nonstop=True
         )
+
+
+flight_service = SimpleFlightService(cache_ttl=float(os.getenv("FLIGHT_CACHE_TTL", "900")))
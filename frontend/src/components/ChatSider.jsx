@@ -63,7 +63,9 @@ const ChatSider = () => {
         travelInfo,
         updateTravelInfo,
         firstCompleteFlag, 
-        setFirstCompleteFlag
+        setFirstCompleteFlag,
+        sessionId,
+        setSessionId
     } = useTravel();
     
     const messagesEndRef = useRef(null);
@@ -228,10 +230,23 @@ const ChatSider = () => {
                         end_date: updatedTravelInfo.endDate
                     },
                     request_id: requestId,
-                    first_complete_flag: firstCompleteFlag
+                    first_complete_flag: firstCompleteFlag,
+                    session_id: sessionId
                 }),
             });
 
+            if (response.status === 409) {
+                // 会话已过期（后端不再保存上一版行程），下次发送时重新生成完整行程
+                setFirstCompleteFlag(0);
+                setSessionId(null);
+                addChatMessage({
+                    type: 'system',
+                    content: 'Your previous itinerary has expired. Please send your request again to generate a new itinerary.',
+                    timestamp: new Date().toISOString()
+                });
+                return;
+            }
+
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -242,6 +257,10 @@ const ChatSider = () => {
             if (firstCompleteFlag === 0) {
                 setFirstCompleteFlag(1);
             }
+            // 保存会话 ID，修改行程时回传
+            if (itineraryData.session_id) {
+                setSessionId(itineraryData.session_id);
+            }
 
             // 使用后端返回的 request_id 开始监听进度
             if (itineraryData.request_id) {
@@ -14,6 +14,7 @@ const initialState = {
     isLoading: false,
     daily_itinerary: [],
     firstCompleteFlag: 0, // 标志位：0-未完成首次完整输入，1-已完成
+    sessionId: null, // 后端返回的会话 ID，修改行程时回传
     // 旅行信息
     travelInfo: {
         departure: null,      // 出发地点
@@ -98,6 +99,14 @@ export const TravelProvider = ({ children }) => {
         }));
     };
 
+    // 更新会话 ID
+    const setSessionId = (sessionId) => {
+        setState(prevState => ({
+            ...prevState,
+            sessionId
+        }));
+    };
+
     // 清除所有数据
     const clearData = () => {
         setState(initialState);
@@ -110,6 +119,7 @@ export const TravelProvider = ({ children }) => {
         setLoading,
         updateTravelInfo,
         setFirstCompleteFlag,
+        setSessionId,
         clearData,
     };
 
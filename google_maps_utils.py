@@ -1,48 +1,141 @@
-import requests
-
-def get_place_photo_url(place_name, api_key):
-    """根据地名返回Google Maps照片URL"""
-
-    find_place_url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    find_params = {
-        "input": place_name,
-        "inputtype": "textquery",
-        "fields": "place_id",
-        "key": api_key
-    }
-    find_resp = requests.get(find_place_url, params=find_params).json()
-    
-    if not find_resp.get("candidates"):
-        print("未找到该地点")
-        return None
-    
-    place_id = find_resp["candidates"][0]["place_id"]
-    print(f"找到 place_id: {place_id}")
-
-    details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-    details_params = {
-        "place_id": place_id,
-        "fields": "photos",
-        "key": api_key
-    }
-    details_resp = requests.get(details_url, params=details_params).json()
-    
-    photos = details_resp.get("result", {}).get("photos", [])
-    if not photos:
-        print("该地点没有照片数据")
+import asyncio
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from cache_utils import SQLiteTTLCache, TTLCache, TieredCache
+from http_client import get_http_client
+
+FIND_PLACE_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
+DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
+PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+
+PHOTO_CACHE_PATH = os.getenv("PLACES_CACHE_PATH", ".cache/places.sqlite3")
+PHOTO_CACHE_TTL = 30 * 24 * 3600  # photo_reference 长期有效，缓存 30 天
+PHOTO_MISS_TTL = 24 * 3600  # 无照片的地点缓存 1 天，避免反复查询
+# 只有这些状态表示"确实没有结果"，可以写入未命中缓存；
+# OVER_QUERY_LIMIT、REQUEST_DENIED 等是临时或配置错误，不能缓存
+PLACES_MISS_STATUSES = ("ZERO_RESULTS", "NOT_FOUND")
+
+
+class PlacesAPIError(Exception):
+    """Places API 返回了非 OK 且不表示"无结果"的状态"""
+
+
+def _places_payload(response: httpx.Response) -> Optional[dict]:
+    """解析 Places 响应；错误状态抛出 PlacesAPIError，"无结果"状态返回 None"""
+    payload = response.json()
+    status = payload.get("status", "OK")
+    if status in PLACES_MISS_STATUSES:
         return None
-    
-    photo_reference = photos[0]["photo_reference"]
-    photo_url = (
-        "https://maps.googleapis.com/maps/api/place/photo"
-        f"?maxwidth=1600&photoreference={photo_reference}&key={api_key}"
-    )
-    return photo_url
-
-
-# if __name__ == "__main__":
-#     API_KEY = "" 
-#     address = "13-6-3 Shibuya, Tokyo 150-0002, Japan"
-    
-#     image_url = get_place_photo_url(address, API_KEY)
-#     print("图片URL:", image_url)
+    if status != "OK":
+        raise PlacesAPIError(f"{status}: {payload.get('error_message', '')}")
+    return payload
+
+
+def _create_photo_cache() -> TieredCache:
+    """地址 -> photo_reference 缓存：内存 LRU + SQLite 持久层"""
+    memory = TTLCache(maxsize=4096, ttl=PHOTO_CACHE_TTL)
+    try:
+        disk = SQLiteTTLCache(PHOTO_CACHE_PATH, table="place_photos", ttl=PHOTO_CACHE_TTL)
+    except (sqlite3.Error, OSError) as e:
+        print(f"照片磁盘缓存不可用，仅使用内存缓存: {e}")
+        disk = None
+    return TieredCache(memory, disk)
+
+
+photo_cache = _create_photo_cache()
+
+
+def normalize_place_name(place_name: str) -> str:
+    """规范化地址作为缓存键"""
+    return " ".join((place_name or "").split()).casefold()
+
+
+def build_photo_url(photo_reference: str, api_key: str) -> str:
+    return f"{PHOTO_URL}?maxwidth=1600&photoreference={photo_reference}&key={api_key}"
+
+
+class PlacePhotoResolver:
+    """
+    异步 Google Places 照片解析器
+
+    - 复用应用级共享的 httpx.AsyncClient 连接池
+    - 信号量限制并发请求数
+    - 相同地址的并发查询合并为一次
+    - 结果写入 photo_cache，热门地点只查询一次
+    """
+
+    def __init__(self, max_concurrency: int = 8, cache: TieredCache = photo_cache):
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _fetch_photo_reference(self, place_name: str, api_key: str) -> str:
+        """查询 photo_reference，未找到时返回空字符串"""
+        client = get_http_client()
+        async with self._semaphore:
+            find_resp = await client.get(FIND_PLACE_URL, params={
+                "input": place_name,
+                "inputtype": "textquery",
+                "fields": "place_id",
+                "key": api_key
+            }, timeout=10.0)
+            payload = _places_payload(find_resp)
+            candidates = payload.get("candidates") if payload else None
+            if not candidates:
+                print(f"未找到该地点: {place_name}")
+                return ""
+
+            details_resp = await client.get(DETAILS_URL, params={
+                "place_id": candidates[0]["place_id"],
+                "fields": "photos",
+                "key": api_key
+            }, timeout=10.0)
+            payload = _places_payload(details_resp)
+            photos = payload.get("result", {}).get("photos", []) if payload else []
+            if not photos:
+                print(f"该地点没有照片数据: {place_name}")
+                return ""
+            return photos[0]["photo_reference"]
+
+    async def _resolve_reference(self, key: str, place_name: str, api_key: str) -> str:
+        try:
+            reference = await self._fetch_photo_reference(place_name, api_key)
+        except (httpx.HTTPError, ValueError, PlacesAPIError) as e:
+            # 网络错误和配额、权限等错误状态不写缓存，下次请求重试
+            print(f"获取地点照片失败 {place_name}: {e}")
+            return ""
+        self.cache.set(key, reference, ttl=None if reference else PHOTO_MISS_TTL)
+        return reference
+
+    async def resolve(self, place_name: str, api_key: str) -> Optional[str]:
+        """返回地点照片 URL，没有照片时返回 None"""
+        key = normalize_place_name(place_name)
+        if not key or not api_key:
+            return None
+
+        reference = self.cache.get(key)
+        if reference is None:
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._resolve_reference(key, place_name, api_key))
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            reference = await asyncio.shield(future)
+
+        return build_photo_url(reference, api_key) if reference else None
+
+    async def resolve_many(self, place_names: Iterable[str], api_key: str) -> List[Optional[str]]:
+        """批量解析，结果顺序与输入一致"""
+        place_names = list(place_names)
+        unique = {normalize_place_name(name): name for name in place_names}
+        urls = await asyncio.gather(*[self.resolve(name, api_key) for name in unique.values()])
+        by_key = dict(zip(unique.keys(), urls))
+        return [by_key[normalize_place_name(name)] for name in place_names]
+
+
+photo_resolver = PlacePhotoResolver()
+
@@ -0,0 +1,50 @@
+"""
+应用级共享的异步 HTTP 客户端
+
+在 FastAPI lifespan 中创建和关闭，所有模块通过 get_http_client() 复用同一个连接池，
+保持长连接（keep-alive），安装了 h2 时启用 HTTP/2，避免每次请求重新 TLS 握手。
+"""
+from typing import Optional
+
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=40,
+            keepalive_expiry=60.0,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享客户端；未在 lifespan 中启动时（如脚本调用）按需创建"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def start_http_client():
+    get_http_client()
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,123 @@
+"""
+增量 JSON 解析器
+
+逐块喂入 LLM 的流式输出，在行程 JSON 的各部分闭合时立即回调：
+- 顶层字段（trip_overview、accommodation、budget_breakdown 等）的对象/数组值闭合时
+- daily_itinerary 中每一天的对象闭合时
+
+无需等待整个 JSON 生成完毕，也不要求输出之前没有多余文本（从第一个 `{` 开始解析）。
+"""
+import json
+from typing import Callable, List, Optional
+
+SECTION = "section"
+DAY = "day"
+
+
+class _Frame:
+    __slots__ = ("is_object", "path", "start", "key", "expect_key", "index")
+
+    def __init__(self, is_object: bool, path: tuple, start: int):
+        self.is_object = is_object
+        self.path = path
+        self.start = start
+        self.key = None
+        self.expect_key = is_object
+        self.index = 0
+
+    def child_path(self) -> tuple:
+        return self.path + ((self.key,) if self.is_object else (self.index,))
+
+
+class IncrementalItineraryParser:
+    def __init__(self, on_value: Callable[[str, object, object], None], list_key: str = "daily_itinerary"):
+        """
+        Args:
+            on_value: 回调 on_value(kind, key, value)，kind 为 SECTION（key 为字段名）
+                      或 DAY（key 为数组下标）
+            list_key: 需要逐元素回调的顶层数组字段
+        """
+        self.on_value = on_value
+        self.list_key = list_key
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    @property
+    def done(self) -> bool:
+        """根对象是否已闭合"""
+        return self._done
+
+    def feed(self, chunk: str):
+        self.text += chunk
+        text = self.text
+        i = self._pos
+        n = len(text)
+        while i < n and not self._done:
+            ch = text[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Frame(True, (), i))
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame.is_object and frame.expect_key:
+                        frame.key = self._decode_key(text[self._string_start:i + 1])
+                        frame.expect_key = False
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append(_Frame(ch == "{", frame.child_path(), i))
+            elif ch in "}]":
+                closed = self._stack.pop()
+                if not self._stack:
+                    self._done = True
+                else:
+                    self._emit(closed, text[closed.start:i + 1])
+            elif ch == ",":
+                if frame.is_object:
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+            i += 1
+        self._pos = i
+
+    @staticmethod
+    def _decode_key(literal: str) -> Optional[str]:
+        try:
+            return json.loads(literal)
+        except ValueError:
+            return None
+
+    def _emit(self, frame: _Frame, raw: str):
+        path = frame.path
+        if len(path) == 2 and path[0] == self.list_key:
+            kind, key = DAY, path[1]
+        elif len(path) == 1:
+            kind, key = SECTION, path[0]
+        else:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.on_value(kind, key, value)
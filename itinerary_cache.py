@@ -0,0 +1,101 @@
+"""
+首次行程生成结果缓存
+
+按规范化的行程参数缓存完整的行程 JSON：
+- 目的地规范化：大小写、空白、"Osaka, Japan" 之类的后缀、中日文名称别名（"大阪" -> "osaka"）
+- 预算按人均每日金额分桶（对数分桶，相邻桶约相差 25%），同一桶内的请求共享结果；
+  可选复用低一档预算桶的结果（ITINERARY_CACHE_NEAR_BUCKETS=1），不会复用更高预算的行程
+- 内存 LRU + SQLite 两级存储，带 TTL（住宿价格和可用性会变化，默认 6 小时）
+
+命中时直接返回，不访问 OpenRouter 和 MCP 服务。
+"""
+import math
+import os
+import sqlite3
+from typing import Optional
+
+from cache_utils import SQLiteTTLCache, TTLCache, TieredCache
+
+ITINERARY_CACHE_PATH = os.getenv("ITINERARY_CACHE_PATH", ".cache/itineraries.sqlite3")
+ITINERARY_CACHE_TTL = float(os.getenv("ITINERARY_CACHE_TTL", str(6 * 3600)))
+ITINERARY_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "512"))
+# 未命中当前预算桶时，是否复用低一档预算桶的结果（默认关闭）
+ITINERARY_CACHE_NEAR_BUCKETS = os.getenv("ITINERARY_CACHE_NEAR_BUCKETS", "0") == "1"
+
+BUDGET_BUCKET_RATIO = 1.25
+
+DESTINATION_ALIASES = {
+    "大阪": "osaka", "大阪市": "osaka",
+    "东京": "tokyo", "東京": "tokyo", "东京都": "tokyo", "東京都": "tokyo",
+    "京都": "kyoto", "京都市": "kyoto",
+    "奈良": "nara",
+    "札幌": "sapporo", "北海道": "hokkaido",
+    "福冈": "fukuoka", "福岡": "fukuoka",
+    "名古屋": "nagoya",
+    "冲绳": "okinawa", "沖繩": "okinawa", "沖縄": "okinawa",
+    "香港": "hong kong", "hongkong": "hong kong",
+    "澳门": "macau", "澳門": "macau", "macao": "macau",
+    "台北": "taipei", "臺北": "taipei",
+    "首尔": "seoul", "首爾": "seoul", "서울": "seoul",
+    "釜山": "busan", "부산": "busan",
+    "曼谷": "bangkok",
+    "新加坡": "singapore",
+    "吉隆坡": "kuala lumpur",
+    "巴黎": "paris",
+    "伦敦": "london", "倫敦": "london",
+    "纽约": "new york", "紐約": "new york", "nyc": "new york", "new york city": "new york",
+    "上海": "shanghai",
+    "北京": "beijing",
+}
+
+
+def canonical_destination(destination: str) -> str:
+    name = " ".join((destination or "").split()).casefold()
+    # "Osaka, Japan" / "大阪，日本" 只保留城市部分
+    for separator in (",", "，", "、"):
+        name = name.split(separator)[0].strip()
+    return DESTINATION_ALIASES.get(name, name)
+
+
+def budget_bucket(budget: float, num_days: int, num_people: int) -> int:
+    """人均每日预算的对数分桶"""
+    per_person_day = max(float(budget), 1.0) / max(num_days, 1) / max(num_people, 1)
+    return round(math.log(per_person_day, BUDGET_BUCKET_RATIO))
+
+
+def _create_store() -> TieredCache:
+    memory = TTLCache(maxsize=ITINERARY_CACHE_SIZE, ttl=ITINERARY_CACHE_TTL)
+    try:
+        disk = SQLiteTTLCache(ITINERARY_CACHE_PATH, table="itineraries", ttl=ITINERARY_CACHE_TTL)
+    except (sqlite3.Error, OSError) as e:
+        print(f"行程磁盘缓存不可用，仅使用内存缓存: {e}")
+        disk = None
+    return TieredCache(memory, disk)
+
+
+class ItineraryCache:
+    def __init__(self, store: TieredCache, near_buckets: bool = False):
+        self.store = store
+        self.near_buckets = near_buckets
+
+    @staticmethod
+    def _key(destination: str, num_days: int, num_people: int, bucket: int) -> str:
+        return f"{canonical_destination(destination)}|{num_days}d|{num_people}p|b{bucket}"
+
+    def get(self, destination: str, num_days: int, num_people: int, budget: float) -> Optional[str]:
+        """返回缓存的行程 JSON 文本，未命中时返回 None"""
+        bucket = budget_bucket(budget, num_days, num_people)
+        # 只复用较低预算的结果，避免给用户超出预算的行程
+        buckets = [bucket, bucket - 1] if self.near_buckets else [bucket]
+        for candidate in buckets:
+            itinerary = self.store.get(self._key(destination, num_days, num_people, candidate))
+            if itinerary is not None:
+                return itinerary
+        return None
+
+    def set(self, destination: str, num_days: int, num_people: int, budget: float, itinerary: str):
+        bucket = budget_bucket(budget, num_days, num_people)
+        self.store.set(self._key(destination, num_days, num_people, bucket), itinerary)
+
+
+itinerary_cache = ItineraryCache(_create_store(), near_buckets=ITINERARY_CACHE_NEAR_BUCKETS)
@@ -0,0 +1,145 @@
+"""
+prompt.md 输出的行程 JSON 模式
+
+用预先构建的 TypeAdapter 直接从 JSON 文本/字节一次性校验整份行程：
+- 缺失字段使用默认值，不再在流水线中途因为 KeyError 失败
+- cost_hkd、评分、价格等数值字段兼容 "HK$120"、"Free"、"1,200" 之类的写法
+- 校验失败在补全照片、酒店图片之前就会抛出
+"""
+import re
+from typing import Annotated, List, Optional, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter
+
+from models import DailyItinerary, DailyItineraryResponse
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _to_number(value):
+    """把模型输出的数值（可能是字符串）转换为 int / float，无法识别时为 0"""
+    if value is None or isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    match = _NUMBER.search(str(value).replace(",", ""))
+    if not match:
+        return 0
+    number = float(match.group())
+    return int(number) if number.is_integer() else number
+
+
+Number = Annotated[Union[int, float], BeforeValidator(_to_number)]
+
+
+class _Schema(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class TravelInfoSchema(_Schema):
+    from_previous_duration_minutes: Number = 0
+    from_previous_distance_km: Number = 0
+    transportation_mode: str = "walking"
+
+
+class AttractionInfoSchema(_Schema):
+    opening_hours: str = ""
+    ticket_price_hkd: Number = 0
+    best_visit_time: str = ""
+
+
+class ActivitySchema(_Schema):
+    start_time: str = ""
+    end_time: str = ""
+    activity_name: str
+    description: str = ""
+    address: str = ""
+    cost_hkd: Number = 0
+    travel_info: TravelInfoSchema = Field(default_factory=TravelInfoSchema)
+    attraction_info: AttractionInfoSchema = Field(default_factory=AttractionInfoSchema)
+
+    def to_daily_itinerary(self, image_url: Optional[str]) -> dict:
+        """DailyItinerary 的字段"""
+        return {
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "activity": self.activity_name,
+            "activity_description": self.description,
+            "activity_cost": str(self.cost_hkd),
+            "activity_transport": f'{self.travel_info.from_previous_duration_minutes} minutes from_previous attraction by {self.travel_info.transportation_mode}',
+            "image_url": image_url or "",
+        }
+
+
+class DaySchema(_Schema):
+    day: int
+    date: Optional[str] = None
+    day_summary: str = ""
+    activities: List[ActivitySchema] = []
+
+
+class TripOverviewSchema(_Schema):
+    destination: str
+    duration_days: Number = 0
+    title: str = ""
+    people: Number = 0
+    total_budget_hkd: Number = 0
+    summary: str = ""
+    main_attractions: List[str] = []
+
+
+class AccommodationSchema(_Schema):
+    name: str = ""
+    address: str = ""
+    price_per_night_hkd: Number = 0
+    amenities: List[str] = []
+    link: str = ""
+    rating: Number = 0
+    review_count: Number = 0
+
+
+class BudgetBreakdownSchema(_Schema):
+    accommodation_total_hkd: Number = 0
+    activities_total_hkd: Number = 0
+    transportation_total_hkd: Number = 0
+    food_total_hkd: Number = 0
+    remaining_budget_hkd: Number = 0
+
+
+class ItinerarySchema(_Schema):
+    trip_overview: TripOverviewSchema
+    accommodation: List[AccommodationSchema] = []
+    daily_itinerary: List[DaySchema] = []
+    budget_breakdown: BudgetBreakdownSchema = Field(default_factory=BudgetBreakdownSchema)
+
+
+itinerary_adapter = TypeAdapter(ItinerarySchema)
+day_adapter = TypeAdapter(DaySchema)
+daily_responses_adapter = TypeAdapter(List[DailyItineraryResponse])
+
+
+def validate_itinerary(data: Union[str, bytes]) -> ItinerarySchema:
+    """从 JSON 文本一次性校验整份行程，失败时抛出 pydantic.ValidationError"""
+    return itinerary_adapter.validate_json(data)
+
+
+def build_daily_itinerary(activity: ActivitySchema, image_url: Optional[str]) -> DailyItinerary:
+    return DailyItinerary.model_validate(activity.to_daily_itinerary(image_url))
+
+
+def build_daily_responses(days: List[DaySchema], image_urls: List[Optional[str]]) -> List[DailyItineraryResponse]:
+    """
+    按天展开所有活动并批量构建 DailyItineraryResponse
+
+    image_urls 与展开后的活动一一对应（顺序同 activity_addresses）
+    """
+    urls = iter(image_urls)
+    return daily_responses_adapter.validate_python([
+        {"day": day.day, "itinerary": activity.to_daily_itinerary(next(urls))}
+        for day in days
+        for activity in day.activities
+    ])
+
+
+def activity_addresses(days: List[DaySchema]) -> List[str]:
+    return [activity.address for day in days for activity in day.activities]
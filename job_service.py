@@ -0,0 +1,149 @@
+"""
+后台任务服务
+
+提交行程生成任务后立即返回 job_id，由有界的 worker 池执行，
+结果保存在带 TTL 的结果存储中，客户端可轮询或长轮询等待结果。
+
+任务队列和结果都保存在当前进程的内存中：以多个 worker 进程部署时，
+轮询请求必须落到提交任务的同一个 worker（单 worker 部署，或按 job_id 做会话粘滞），
+否则会返回 404。
+每个任务记录提交者的 user_id，查询时只返回给同一用户；未登录的调用方没有可区分的身份，
+任务 API（/api/jobs）要求登录。
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from cache_utils import TTLCache
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job:
+    def __init__(self, job_id: str, func: Callable[[], Awaitable[Any]], owner: Optional[str] = None):
+        self.id = job_id
+        self.func = func
+        self.owner = owner
+        self.status = JOB_QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.result
+        if hasattr(result, "model_dump"):
+            result = result.model_dump()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": result,
+            "error": self.error,
+            "error_status": self.error_status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 4, max_queue: int = 100, result_ttl: float = 3600):
+        """
+        Args:
+            max_workers: 同时执行的任务数（与 HTTP 并发数独立）
+            max_queue: 排队任务上限，超出时拒绝提交
+            result_ttl: 已完成任务结果的保留时间（秒）
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_queue)
+        self._active: Dict[str, Job] = {}
+        self._results = TTLCache(maxsize=10000, ttl=result_ttl)
+        self._workers = []
+
+    async def start(self):
+        for i in range(self.max_workers - len(self._workers)):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"job-worker-{i}"))
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, func: Callable[[], Awaitable[Any]], job_id: Optional[str] = None,
+               owner: Optional[str] = None) -> Job:
+        """提交任务，队列已满时抛出 503；owner 为提交者的 user_id"""
+        job_id = job_id or uuid.uuid4().hex
+        if job_id in self._active or job_id in self._results:
+            raise HTTPException(status_code=409, detail=f"任务已存在: {job_id}")
+
+        job = Job(job_id, func, owner=owner)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="任务队列已满，请稍后重试",
+                                headers={"Retry-After": "30"})
+        self._active[job_id] = job
+        return job
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Job]:
+        """返回任务；不属于 owner 的任务视为不存在"""
+        job = self._active.get(job_id) or self._results.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    async def wait(self, job_id: str, timeout: float, owner: Optional[str] = None) -> Optional[Job]:
+        """等待任务完成（长轮询），超时返回当前状态"""
+        job = self.get(job_id, owner)
+        if job is None or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = JOB_RUNNING
+            try:
+                job.result = await job.func()
+                job.status = JOB_SUCCEEDED
+            except asyncio.CancelledError:
+                job.status = JOB_FAILED
+                job.error = "任务已取消"
+                raise
+            except HTTPException as e:
+                job.status = JOB_FAILED
+                job.error = str(e.detail)
+                job.error_status = e.status_code
+            except Exception as e:
+                print(f"后台任务 {job.id} 执行失败: {e}")
+                job.status = JOB_FAILED
+                job.error = str(e)
+                job.error_status = 500
+            finally:
+                job.finished_at = datetime.now().isoformat()
+                job.func = None
+                self._results.set(job.id, job)
+                self._active.pop(job.id, None)
+                job.done.set()
+                self._queue.task_done()
+
+
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queue=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", "3600")),
+)
@@ -0,0 +1,247 @@
+"""
+LLM 输出的 JSON 提取与修复
+
+模型输出常见的问题：前后夹带说明文字或 markdown 代码块、对象后多余的逗号、
+输出被截断（最后一天只写了一半）。整次生成代价很高，尽量修复而不是丢弃：
+1. 依次尝试每个 { 开始的平衡对象（字符串内的括号不计），跳过说明文字里的 {…} 和空对象
+2. remove_trailing_commas: 去掉 } 和 ] 前多余的逗号（不算作修复，不丢失内容）
+3. 仍然无法解析时（通常是被截断），退回到最近一个完整的值并补齐括号；
+   daily_itinerary 只保留已经完整闭合的天（recover_itinerary 对顶层字段同样如此）
+4. missing_itinerary_sections: 找出修复后仍缺失的部分，由调用方只重新生成这些部分
+
+返回的"是否经过修复"表示输出被截断、有内容被丢弃；需要完整结果的调用方应视为失败。
+安装了 orjson 时用它解析，否则使用标准库 json。
+"""
+import json
+from typing import List, Optional, Tuple
+
+from incremental_json import DAY, IncrementalItineraryParser
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+REQUIRED_SECTIONS = ("trip_overview", "accommodation", "daily_itinerary", "budget_breakdown")
+# 截断修复时最多尝试的回退位置数
+MAX_REPAIR_ATTEMPTS = 64
+# 最多尝试的候选对象数（说明文字中的 {…}、空对象会被跳过）
+MAX_CANDIDATES = 16
+
+
+def loads(text):
+    """解析 JSON 文本或字节"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _object_end(text: str, start: int) -> Optional[int]:
+    """返回 start 处的 { 对应的闭合位置之后的下标，没有闭合（输出被截断）时返回 None"""
+    depth = 0
+    in_string = False
+    escape = False
+    for index in range(start, len(text)):
+        ch = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+
+def extract_json_object(text: str) -> str:
+    """
+    返回第一个 { 开始的平衡 JSON 对象；没有闭合（输出被截断）时返回从 { 到结尾的全部文本
+    """
+    start = text.find("{")
+    if start == -1:
+        return ""
+    end = _object_end(text, start)
+    return text[start:end]
+
+
+def remove_trailing_commas(text: str) -> str:
+    """去掉字符串之外、紧跟在 } 或 ] 之前的逗号"""
+    result = []
+    in_string = False
+    escape = False
+    pending_comma = None  # 逗号之后尚未确认的空白
+    for ch in text:
+        if in_string:
+            result.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if ch.isspace():
+                pending_comma.append(ch)
+                continue
+            if ch not in "}]":
+                result.append(",")
+            result.extend(pending_comma)
+            pending_comma = None
+        if ch == ",":
+            pending_comma = []
+            continue
+        result.append(ch)
+        if ch == '"':
+            in_string = True
+    if pending_comma is not None:
+        result.append(",")
+        result.extend(pending_comma)
+    return "".join(result)
+
+
+def _truncation_candidates(text: str) -> List[Tuple[int, str]]:
+    """
+    截断修复的候选位置：每个逗号之前、每个 { / [ 之后都是一个完整值的边界，
+    返回 (截断位置, 需要补齐的闭合括号)，从后往前排列
+    """
+    candidates = []
+    stack = []
+    in_string = False
+    escape = False
+    for index, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            candidates.append((index + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if stack:
+                candidates.append((index + 1, "".join(reversed(stack))))
+        elif ch == "," and stack:
+            candidates.append((index, "".join(reversed(stack))))
+    candidates.reverse()
+    return candidates
+
+
+def repair_truncated(text: str):
+    """退回到最近一个能补齐为合法 JSON 的位置，无法修复时返回 None"""
+    for position, closing in _truncation_candidates(text)[:MAX_REPAIR_ATTEMPTS]:
+        try:
+            return loads(remove_trailing_commas(text[:position]) + closing)
+        except ValueError:
+            continue
+    return None
+
+
+def _loads_with_cleanup(text: str):
+    """依次尝试原文和去掉多余逗号后的文本，都无法解析时返回 None"""
+    for candidate in (text, remove_trailing_commas(text)):
+        try:
+            return loads(candidate)
+        except ValueError:  # orjson.JSONDecodeError 也是 ValueError 的子类
+            continue
+    return None
+
+
+def _decode_candidates(content: str) -> Tuple[Optional[dict], str]:
+    """
+    依次尝试每个 { 开始的候选对象，返回第一个解析为非空对象的结果
+
+    Returns:
+        (解析结果, "")；找不到时为 (None, 被截断的候选文本)，没有被截断的候选时文本为空
+    """
+    position = content.find("{")
+    for _ in range(MAX_CANDIDATES):
+        if position == -1:
+            break
+        end = _object_end(content, position)
+        if end is None:
+            # 没有闭合：输出被截断，交给调用方修复
+            return None, remove_trailing_commas(content[position:])
+        data = _loads_with_cleanup(content[position:end])
+        if isinstance(data, dict) and data:
+            return data, ""
+        # 说明文字中的 {…} 或空对象：跳过整个候选，不进入它内部查找
+        position = content.find("{", end)
+    return None, ""
+
+
+def _closed_sections(text: str) -> dict:
+    """被截断的行程中已经完整闭合的顶层字段和天，写到一半的部分被丢弃"""
+    itinerary = {}
+    days = []
+
+    def on_value(kind, key, value):
+        if kind == DAY:
+            days.append(value)
+        elif key != "daily_itinerary":
+            itinerary[key] = value
+
+    IncrementalItineraryParser(on_value).feed(text)
+    if days:
+        itinerary["daily_itinerary"] = days
+    return itinerary
+
+
+def parse_llm_json(content: str) -> Tuple[Optional[dict], bool]:
+    """
+    从模型输出中提取并解析 JSON 对象
+
+    Returns:
+        (解析结果, 是否因截断丢弃了内容)；完全无法解析或只得到空对象时结果为 None
+    """
+    data, truncated = _decode_candidates(content or "")
+    if data is not None:
+        return data, False
+    if not truncated:
+        return None, False
+    data = repair_truncated(truncated)
+    if isinstance(data, dict) and isinstance(data.get("daily_itinerary"), list):
+        # 补齐括号会保留写到一半的那一天，只保留完整闭合的天
+        data["daily_itinerary"] = _closed_sections(truncated).get("daily_itinerary", [])
+    return (data or None), True
+
+
+def recover_itinerary(content: str) -> Tuple[Optional[dict], bool]:
+    """
+    解析行程 JSON；被截断时只保留已经完整闭合的部分（顶层字段和每一天），
+    写到一半的那一天会被丢弃，交给调用方重新生成
+
+    Returns:
+        (行程, 是否因截断丢弃了内容)
+    """
+    data, truncated = _decode_candidates(content or "")
+    if data is not None:
+        return data, False
+    if not truncated:
+        return None, False
+    return (_closed_sections(truncated) or None), True
+
+
+def missing_itinerary_sections(itinerary: dict, num_days: int) -> Tuple[List[str], List[int]]:
+    """返回 (缺失的顶层部分, 缺失或没有活动的天)"""
+    missing_sections = [key for key in REQUIRED_SECTIONS if key != "daily_itinerary" and not itinerary.get(key)]
+    present = {
+        day.get("day") for day in itinerary.get("daily_itinerary") or []
+        if isinstance(day, dict) and day.get("activities")
+    }
+    missing_days = [day for day in range(1, num_days + 1) if day not in present]
+    return missing_sections, missing_days
@@ -0,0 +1,180 @@
+"""
+多关键词匹配器
+
+所有分组的关键词在模块加载时合并为一张关键词表（关键词 -> 所属分组），
+不再在每次调用时重建；匹配语义与逐个 `keyword in text` 子串判断完全一致
+（包括 "go viral" / "viral" 这类相互重叠的关键词），标签顺序固定。
+
+注：在 CPython 上实测，单遍扫描的自动机（支持重叠匹配的前瞻交替正则、纯 Python 的
+Aho-Corasick）都比逐个关键词的子串查找（C 实现）更慢，因此这里保留子串查找。
+运行 `python keyword_matcher.py` 执行微基准测试，对比这几种实现并检查结果一致。
+"""
+import re
+from typing import Dict, Iterable, List, Set
+
+
+class KeywordMatcher:
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        """
+        Args:
+            groups: 分组名 -> 关键词列表（关键词按小写匹配）
+        """
+        self.keyword_groups: Dict[str, Set[str]] = {}
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                self.keyword_groups.setdefault(keyword.lower(), set()).add(group)
+        self.keywords = tuple(self.keyword_groups)
+
+    def find(self, text: str) -> Set[str]:
+        """返回文本中出现的所有关键词"""
+        text = text.lower()
+        return {keyword for keyword in self.keywords if keyword in text}
+
+    def find_batch(self, texts: List[str]) -> List[Set[str]]:
+        """匹配多条文本，结果顺序与输入一致"""
+        return [self.find(text) for text in texts]
+
+    def groups_of(self, keywords: Set[str]) -> Set[str]:
+        """关键词集合对应的分组"""
+        return {group for keyword in keywords for group in self.keyword_groups[keyword]}
+
+
+# 常见旅行标签
+TRAVEL_TAG_KEYWORDS = {
+    "food": ["food", "restaurant", "eat", "dining", "cuisine", "meal"],
+    "attraction": ["attraction", "landmark", "sight", "tour", "visit"],
+    "adventure": ["adventure", "hiking", "explore", "outdoor"],
+    "culture": ["culture", "historical", "museum", "temple", "shrine"],
+    "shopping": ["shopping", "market", "mall", "store"],
+    "nightlife": ["nightlife", "bar", "club", "night", "party"],
+    "budget": ["budget", "cheap", "affordable", "save"],
+    "luxury": ["luxury", "premium", "expensive", "luxurious"]
+}
+
+# 热度关键词
+HOT_KEYWORDS = [
+    'viral', 'popular', 'trending', 'must-see', 'best', 'top',
+    'amazing', 'incredible', 'awesome', 'fantastic', 'recommended',
+    'most viewed', 'most liked', 'go viral'
+]
+
+# 互动关键词
+ENGAGEMENT_KEYWORDS = [
+    'like', 'share', 'comment', 'views', 'follow', 'subscribe',
+    'million', 'thousand', 'k views'
+]
+
+KEYWORD_SCORES = {"hot": 10, "engagement": 5}
+
+travel_tag_matcher = KeywordMatcher(TRAVEL_TAG_KEYWORDS)
+popularity_matcher = KeywordMatcher({"hot": HOT_KEYWORDS, "engagement": ENGAGEMENT_KEYWORDS})
+
+
+def _build_tags(keywords: Set[str], destination: str) -> List[str]:
+    tags = [destination.lower(), "travel"]
+    categories = travel_tag_matcher.groups_of(keywords)
+    tags.extend(category for category in TRAVEL_TAG_KEYWORDS if category in categories)
+    return list(dict.fromkeys(tags))[:5]  # 去重并限制数量
+
+
+def extract_tags(text: str, destination: str) -> List[str]:
+    """从文本中提取标签"""
+    return _build_tags(travel_tag_matcher.find(text), destination)
+
+
+def extract_tags_batch(texts: List[str], destination: str) -> List[List[str]]:
+    """批量提取标签"""
+    return [_build_tags(keywords, destination) for keywords in travel_tag_matcher.find_batch(texts)]
+
+
+def _score(keywords: Set[str], title: str) -> int:
+    score = 0
+    for keyword in keywords:
+        for group in popularity_matcher.keyword_groups[keyword]:
+            score += KEYWORD_SCORES[group]
+
+    # 标题长度适中加分
+    if 20 <= len(title) <= 80:
+        score += 5
+    return score
+
+
+def estimate_popularity(title: str, snippet: str) -> int:
+    """估算内容热度（基于标题和描述中的关键词）"""
+    return _score(popularity_matcher.find(title + " " + snippet), title)
+
+
+def estimate_popularity_batch(items: List[tuple]) -> List[int]:
+    """批量估算热度，items 为 (title, snippet) 列表"""
+    keyword_sets = popularity_matcher.find_batch([title + " " + snippet for title, snippet in items])
+    return [_score(keywords, title) for keywords, (title, _) in zip(keyword_sets, items)]
+
+
+
+def _benchmark(rounds: int = 200):
+    """与原实现、单遍扫描的正则自动机对比的微基准测试"""
+    import random
+    import timeit
+
+    random.seed(0)
+    vocabulary = ("the a of in to and with for your this my we our is are it day trip guide tokyo "
+                  "osaka kyoto city walk street local train station hotel weekend vlog food temple "
+                  "market night nightlife views hiking cheap amazing best go viral İstanbul").split()
+    # 模拟标题 + 摘要长度（约 150-300 字符）的搜索结果
+    texts = [" ".join(random.choices(vocabulary, k=random.randint(25, 50))) for _ in range(50)]
+    items = [(text[:60], text) for text in texts]
+
+    def naive_tags(text):
+        # 原实现：每次调用重建关键词表，逐分组逐关键词扫描
+        travel_keywords = {category: list(keywords) for category, keywords in TRAVEL_TAG_KEYWORDS.items()}
+        text_lower = text.lower()
+        found = [category for category, keywords in travel_keywords.items()
+                 if any(keyword in text_lower for keyword in keywords)]
+        return list(dict.fromkeys(["osaka", "travel"] + found))[:5]
+
+    def naive_score(title, snippet):
+        text = (title + " " + snippet).lower()
+        score = sum(10 for keyword in HOT_KEYWORDS if keyword in text)
+        score += sum(5 for keyword in ENGAGEMENT_KEYWORDS if keyword in text)
+        return score + (5 if 20 <= len(title) <= 80 else 0)
+
+    def automaton(matcher):
+        # 单遍扫描：每个位置取最长的关键词，再补上它包含的较短关键词（"nightlife" -> "night"）
+        keywords = sorted(matcher.keywords, key=len, reverse=True)
+        pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))")
+        contained = {keyword: {other for other in keywords if other in keyword} for keyword in keywords}
+
+        def find(text):
+            found = set()
+            for match in pattern.finditer(text.lower()):
+                found |= contained[match.group(1)]
+            return found
+        return find
+
+    tags_automaton = automaton(travel_tag_matcher)
+    popularity_automaton = automaton(popularity_matcher)
+
+    def automaton_batch():
+        tags = [_build_tags(tags_automaton(text), "osaka") for text in texts]
+        scores = [_score(popularity_automaton(title + " " + snippet), title) for title, snippet in items]
+        return tags, scores
+
+    expected = ([naive_tags(text) for text in texts], [naive_score(*item) for item in items])
+    assert (extract_tags_batch(texts, "osaka"), estimate_popularity_batch(items)) == expected
+    assert automaton_batch() == expected
+
+    cases = {
+        "naive": lambda: ([naive_tags(t) for t in texts], [naive_score(*i) for i in items]),
+        "keyword table": lambda: (extract_tags_batch(texts, "osaka"), estimate_popularity_batch(items)),
+        "regex automaton": automaton_batch,
+    }
+    timings = {}
+    for name, func in cases.items():
+        seconds = timeit.timeit(func, number=rounds) / rounds
+        timings[name] = seconds
+        print(f"{name:>16}: {seconds * 1000:.3f} ms / batch of {len(texts)} posts")
+    return timings
+
+
+if __name__ == "__main__":
+    _benchmark()
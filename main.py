@@ -2,27 +2,47 @@ import asyncio
 import json
 import os
 import re
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from datetime import timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
 
 import certifi
-import httpx
+import orjson
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
+from agno.run.agent import RunEvent
 from agno.tools.googlesearch import GoogleSearchTools
-from agno.tools.mcp import MultiMCPTools
 from dotenv import load_dotenv
 from fastapi import Depends, Header
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
 from icalendar import Calendar, Event
 
 from database.auth import router as auth_router
 from database.supabase_client import SupabaseClient
-from flight_service import SimpleFlightService
-from google_maps_utils import get_place_photo_url
+from flight_service import flight_service
+from google_maps_utils import photo_resolver
+from admission import admission_controller
+from airbnb_service import get_airbnb_images_many
+from cache_utils import SWRCache
+from compression import CompressionMiddleware
+from http_client import close_http_client, start_http_client
+from incremental_json import DAY, SECTION, IncrementalItineraryParser
+from itinerary_cache import canonical_destination, itinerary_cache
+from itinerary_schema import activity_addresses, build_daily_itinerary, build_daily_responses, day_adapter, validate_itinerary
+from json_repair import missing_itinerary_sections, parse_llm_json, recover_itinerary
+from job_service import job_manager
+from keyword_matcher import extract_tags, extract_tags_batch
+from mcp_pool import PoolTimeoutError, travel_mcp_pool, xhs_mcp_pool
+from pipeline import StageGraph
+from progress import progress_manager
+from revision import build_revision_slice, classify_revision, merge_revision, summarize_itinerary
+from session_store import session_store
+from singleflight import SingleFlight
 from models import (
     TravelInfo, 
     ChatRequest, 
@@ -37,7 +57,7 @@ from models import (
     XiaohongshuRequest, XiaohongshuResponse
 )
 from xhs import generate_xhs
-from social_service import YouTubeService, GoogleSearchService
+from social_service import YouTubeService, GoogleSearchService, stable_post_id, warm_google_services
 
 
 def configure_ssl():
@@ -51,8 +71,6 @@ def configure_ssl():
     os.environ['HTTPS_PROXY'] = "http://127.0.0.1:15236"
     print(f"🔐 SSL 证书已配置: {cert_path}")
 
-temp_output=""
-
 load_dotenv()
 # configure_ssl() # 解决 Mac Python SSL证书环境配置问题
 # 初始化Supabase客户端
@@ -60,7 +78,6 @@ supabase_client = SupabaseClient()
 
 from dotenv import load_dotenv
 
-from google_maps_utils import get_place_photo_url
 from models import (
     TravelInfo, 
     ChatRequest, 
@@ -79,9 +96,25 @@ from fastapi import Depends, Header
 from typing import Optional
 
 
-app = FastAPI(title="MCP AI Travel Planner API")
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：创建共享 HTTP 客户端，预热 MCP 会话池、任务 worker 和 Google API 客户端，关闭时释放连接"""
+    await start_http_client()
+    await asyncio.gather(travel_mcp_pool.start(), xhs_mcp_pool.start(), job_manager.start())
+    await asyncio.to_thread(warm_google_services, os.getenv("GOOGLE_MAP_KEY"))
+    yield
+    await job_manager.close()
+    await asyncio.gather(travel_mcp_pool.close(), xhs_mcp_pool.close())
+    await close_http_client()
+    session_store.close()
+
+
+# 行程、计划列表等大响应使用 orjson 序列化
+app = FastAPI(title="MCP AI Travel Planner API", lifespan=lifespan, default_response_class=ORJSONResponse)
+
 # 初始化Supabase客户端
 supabase_client = SupabaseClient()
 
@@ -93,6 +126,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 超过阈值的响应按 Accept-Encoding 压缩（br / gzip），SSE 不压缩
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("RESPONSE_COMPRESS_MIN_SIZE", "1024")))
 
 def generate_ics_from_daily_itinerary(daily_itinerary: list, trip_overview: dict = None, start_date: datetime = None) -> bytes:
     """
@@ -241,61 +276,6 @@ def generate_ics_content(plan_text: str, start_date: datetime = None) -> bytes:
     return cal.to_ical()
 
 
-class ProgressManager:
-    def __init__(self):
-        self.progress_queues = {}
-    
-    async def add_progress(self, request_id: str, message: str, progress_type: str = "info"):
-        """添加进度消息"""
-        if request_id in self.progress_queues:
-            progress_data = {
-                "type": progress_type,
-                "message": message,
-                "timestamp": datetime.now().isoformat()
-            }
-            await self.progress_queues[request_id].put(progress_data)
-    
-    async def get_progress_stream(self, request_id: str):
-        """获取进度流"""
-        self.progress_queues[request_id] = asyncio.Queue()
-        try:
-            while True:
-                progress_data = await self.progress_queues[request_id].get()
-                yield f"data: {json.dumps(progress_data)}\n\n"
-        except asyncio.CancelledError:
-            del self.progress_queues[request_id]
-
-progress_manager = ProgressManager()
-
-
-def extract_tags(text: str, destination: str):
-    """
-    从文本中提取标签
-    """
-    text_lower = text.lower()
-    destination_lower = destination.lower()
-
-    tags = [destination_lower, "travel"]
-
-    # 常见旅行标签
-    travel_keywords = {
-        "food": ["food", "restaurant", "eat", "dining", "cuisine", "meal"],
-        "attraction": ["attraction", "landmark", "sight", "tour", "visit"],
-        "adventure": ["adventure", "hiking", "explore", "outdoor"],
-        "culture": ["culture", "historical", "museum", "temple", "shrine"],
-        "shopping": ["shopping", "market", "mall", "store"],
-        "nightlife": ["nightlife", "bar", "club", "night", "party"],
-        "budget": ["budget", "cheap", "affordable", "save"],
-        "luxury": ["luxury", "premium", "expensive", "luxurious"]
-    }
-
-    for category, keywords in travel_keywords.items():
-        if any(keyword in text_lower for keyword in keywords):
-            tags.append(category)
-
-    return list(set(tags))[:5]  # 去重并限制数量
-
-
 @app.post("/api/xiaohongshu", response_model=XiaohongshuResponse)
 async def get_xiaohongshu_content(request: XiaohongshuRequest):
     """
@@ -312,116 +292,173 @@ async def get_xiaohongshu_content(request: XiaohongshuRequest):
         raise HTTPException(status_code=500, detail=f"获取小红书内容失败: {str(e)}")
 
 
+# 社交媒体内容缓存：1 小时内视为新鲜，之后 6 小时内先返回旧值再后台刷新
+# 缓存的是 (序列化好的响应体, 是否含降级内容)，命中时不再重复校验和序列化；
+# YouTube / 搜索失败时补充的占位内容只缓存几秒，避免一次上游故障锁定数小时的假内容
+social_media_cache = SWRCache(
+    maxsize=512,
+    fresh_ttl=float(os.getenv("SOCIAL_CACHE_FRESH_TTL", "3600")),
+    stale_ttl=float(os.getenv("SOCIAL_CACHE_STALE_TTL", "21600")),
+    is_degraded=lambda entry: entry[1],
+    degraded_ttl=float(os.getenv("SOCIAL_CACHE_FALLBACK_TTL", "10"))
+)
+
+
+def social_media_cache_key(request: SocialMediaRequest):
+    """规范化 (目的地, 排序后的标签, 数量) 作为缓存键"""
+    destination = " ".join(request.destination.split()).casefold()
+    tags = tuple(sorted({tag.strip().casefold() for tag in (request.tags or []) if tag.strip()}))
+    return destination, tags, request.limit
+
+
 @app.post("/api/social-media-content", response_model=SocialMediaResponse)
 async def get_social_media_content(request: SocialMediaRequest):
     """
-    获取真实的社交媒体旅行内容
+    获取真实的社交媒体旅行内容（带缓存，相同目的地的并发请求只查询一次上游）
     """
     try:
-        google_api_key = os.getenv("GOOGLE_MAP_KEY")  # 使用你已有的 Google API Key
-        posts = []
-
-        # 1. 使用 YouTube Data API 获取视频
-        youtube_service = YouTubeService(google_api_key)
-        # configure_ssl()
-        youtube_videos = await youtube_service.search_travel_videos(
-            destination=request.destination,
-            categorytags=request.tags,
-            max_results=request.limit // 4
+        body, _ = await social_media_cache.get_or_fetch(
+            social_media_cache_key(request),
+            lambda: fetch_social_media_body(request)
         )
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        print(f"获取社交媒体内容失败: {e}")
+        # 返回降级内容
+        return get_fallback_content(request.destination, request.limit)
 
-        # 转换 YouTube 视频格式
-        for i, video in enumerate(youtube_videos):
-            post = SocialMediaPost(
-                id=f"youtube_{video['video_id']}",
-                title=video['title'],
-                description=video['description'][:200] + "..." if len(video['description']) > 200 else video[
-                    'description'],
-                creator=video['channel_title'],
-                likes=video['likes'],
-                duration=video['duration'],
-                thumbnail=video['thumbnail'],
-                video_url=f"https://www.youtube.com/watch?v={video['video_id']}",
-                tags=extract_tags(video['title'] + " " + video['description'], request.destination),
-                platform="youtube"
-            )
+
+async def fetch_social_media_body(request: SocialMediaRequest) -> Tuple[bytes, bool]:
+    """返回 (响应体, 是否包含降级占位内容)"""
+    response = await fetch_social_media_content(request)
+    has_fallback = any(post.id.startswith(FALLBACK_POST_PREFIX) for post in response.posts)
+    return orjson.dumps(response.model_dump()), has_fallback
+
+
+async def fetch_social_media_content(request: SocialMediaRequest) -> SocialMediaResponse:
+    """
+    从 YouTube Data API 和 Custom Search 获取社交媒体旅行内容
+    """
+    google_api_key = os.getenv("GOOGLE_MAP_KEY")  # 使用你已有的 Google API Key
+    posts = []
+    seen_ids = set()  # 同一帖子可能同时出现在 YouTube、站点搜索和一般搜索结果中
+
+    def add_post(post: SocialMediaPost):
+        if post.id not in seen_ids:
+            seen_ids.add(post.id)
             posts.append(post)
 
-        search_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
-        if search_engine_id and len(posts) < request.limit:
-            google_search = GoogleSearchService(google_api_key, search_engine_id)
-            # configure_ssl()
-            # 尝试搜索特定网站的内容
-            site_results = await google_search.search_travel_content(
+    # 1. 使用 YouTube Data API 获取视频
+    youtube_service = YouTubeService(google_api_key)
+    # configure_ssl()
+    youtube_videos = await youtube_service.search_travel_videos(
+        destination=request.destination,
+        categorytags=request.tags,
+        max_results=request.limit // 4
+    )
+
+    # 转换 YouTube 视频格式，标签一次批量提取
+    youtube_tags = extract_tags_batch(
+        [video['title'] + " " + video['description'] for video in youtube_videos],
+        request.destination
+    )
+    for video, tags in zip(youtube_videos, youtube_tags):
+        video_url = f"https://www.youtube.com/watch?v={video['video_id']}"
+        post = SocialMediaPost(
+            id=f"youtube_{video['video_id']}",
+            title=video['title'],
+            description=video['description'][:200] + "..." if len(video['description']) > 200 else video[
+                'description'],
+            creator=video['channel_title'],
+            likes=video['likes'],
+            duration=video['duration'],
+            thumbnail=video['thumbnail'],
+            video_url=video_url,
+            tags=tags,
+            platform="youtube"
+        )
+        add_post(post)
+
+    search_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
+    if search_engine_id and len(posts) < request.limit:
+        google_search = GoogleSearchService(google_api_key, search_engine_id)
+        # configure_ssl()
+        # 特定网站搜索与一般旅行内容搜索并发执行
+        site_results, general_results = await asyncio.gather(
+            google_search.search_travel_content(
                 destination=request.destination,
                 categorytags=request.tags,
                 max_results=request.limit - len(posts)
+            ),
+            google_search.search_general_travel_content(
+                destination=request.destination,
+                max_results=request.limit - len(posts)
             )
+        )
 
-            for i, result in enumerate(site_results):
-                # 确保有缩略图
+        site_tags = extract_tags_batch(
+            [result['title'] + " " + result['snippet'] for result in site_results],
+            request.destination
+        )
+        for result, tags in zip(site_results, site_tags):
+            # 确保有缩略图
+            thumbnail = result['thumbnail']
+            if not thumbnail:
+                thumbnail = f"https://via.placeholder.com/200x350/6A5ACD/FFFFFF?text={request.destination}"
+
+            post = SocialMediaPost(
+                id=stable_post_id(result['link']),
+                title=result['title'],
+                description=result['snippet'],
+                creator=result['platform'].title(),
+                likes="1K+",
+                duration="2:00",
+                thumbnail=thumbnail,
+                video_url=result['link'],
+                tags=tags,
+                platform=result['platform']
+            )
+            add_post(post)
+
+        # 如果还不够，补充一般旅行内容
+        if len(posts) < request.limit:
+            for result in general_results:
+                if len(posts) >= request.limit:
+                    break
                 thumbnail = result['thumbnail']
                 if not thumbnail:
-                    thumbnail = f"https://via.placeholder.com/200x350/6A5ACD/FFFFFF?text={request.destination}"
+                    thumbnail = f"https://via.placeholder.com/200x350/4ECDC4/FFFFFF?text={request.destination}"
 
                 post = SocialMediaPost(
-                    id=f"{result['platform']}_{hash(result['link'])}",
+                    id=stable_post_id(result['link']),
                     title=result['title'],
                     description=result['snippet'],
-                    creator=result['platform'].title(),
-                    likes="1K+",
-                    duration="2:00",
+                    creator="Travel Blogger",
+                    likes="500+",
+                    duration="3:00",
                     thumbnail=thumbnail,
                     video_url=result['link'],
                     tags=extract_tags(result['title'] + " " + result['snippet'], request.destination),
                     platform=result['platform']
                 )
-                posts.append(post)
+                add_post(post)
 
-            # 如果还不够，搜索一般旅行内容
-            if len(posts) < request.limit:
-                general_results = await google_search.search_general_travel_content(
-                    destination=request.destination,
-                    max_results=request.limit - len(posts)
-                )
+    # 3. 如果真实API没有返回足够内容，用模拟数据补充
+    if len(posts) < request.limit:
+        fallback_posts = get_fallback_content(request.destination, request.limit - len(posts)).posts
+        posts.extend(fallback_posts)
 
-                for result in general_results:
-                    thumbnail = result['thumbnail']
-                    if not thumbnail:
-                        thumbnail = f"https://via.placeholder.com/200x350/4ECDC4/FFFFFF?text={request.destination}"
-
-                    post = SocialMediaPost(
-                        id=f"web_{hash(result['link'])}",
-                        title=result['title'],
-                        description=result['snippet'],
-                        creator="Travel Blogger",
-                        likes="500+",
-                        duration="3:00",
-                        thumbnail=thumbnail,
-                        video_url=result['link'],
-                        tags=extract_tags(result['title'] + " " + result['snippet'], request.destination),
-                        platform=result['platform']
-                    )
-                    posts.append(post)
-
-        # 3. 如果真实API没有返回足够内容，用模拟数据补充
-        if len(posts) < request.limit:
-            fallback_posts = get_fallback_content(request.destination, request.limit - len(posts)).posts
-            posts.extend(fallback_posts)
+    return SocialMediaResponse(
+        posts=posts[:request.limit],
+        destination=request.destination,
+        total_count=len(posts)
+    )
 
-        return SocialMediaResponse(
-            posts=posts[:request.limit],
-            destination=request.destination,
-            total_count=len(posts)
-        )
 
-    except Exception as e:
-        print(f"获取社交媒体内容失败: {e}")
-        # 返回降级内容
-        return get_fallback_content(request.destination, request.limit)
+# 更新降级内容生成函数
+FALLBACK_POST_PREFIX = "fallback_"
 
 
-# 更新降级内容生成函数
 def get_fallback_content(destination: str, limit: int):
     import random
 
@@ -469,7 +506,7 @@ def get_fallback_content(destination: str, limit: int):
         duration = f"{random.randint(1, 4)}:{random.randint(0, 59):02d}"
 
         post = SocialMediaPost(
-            id=f"fallback_{i}",
+            id=f"{FALLBACK_POST_PREFIX}{i}",
             title=theme["title"],
             description=theme["description"],
             creator=creator,
@@ -505,10 +542,17 @@ async def debug_ssl():
 
 # 添加 SSE 端点
 @app.get("/api/progress/{request_id}")
-async def progress_stream(request_id: str):
-    """进度流端点"""
+async def progress_stream(
+    request_id: str,
+    last_event_id: Optional[int] = None,
+    pace: float = 0,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """进度流端点，支持 Last-Event-ID 断线续传；pace 为可选的事件展示间隔（秒，最多 5 秒）"""
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
     return StreamingResponse(
-        progress_manager.get_progress_stream(request_id),
+        progress_manager.get_progress_stream(request_id, last_event_id, pace=min(max(pace, 0), 5)),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -518,50 +562,64 @@ async def progress_stream(request_id: str):
     )
 
 
+def create_travel_agent(openai_key: str, mcp_tools) -> Agent:
+    return Agent(
+        name="Travel Planner",
+        model=OpenAIChat(
+        id="openai/gpt-4o", 
+        api_key=openai_key,
+        base_url="https://openrouter.ai/api/v1"
+        ),
+        tools=[mcp_tools, GoogleSearchTools()],
+        markdown=True
+    )
+
+
+async def stream_agent_content(agent: Agent, prompt: str, on_section: Callable) -> str:
+    """
+    流式运行 Agent，边生成边增量解析 JSON，
+    trip_overview / 每一天的行程一闭合就通过 on_section 回调，返回完整输出文本
+    """
+    parser = IncrementalItineraryParser(on_section)
+    async for event in agent.arun(prompt, stream=True):
+        if getattr(event, "event", None) != RunEvent.run_content.value:
+            continue
+        if isinstance(event.content, str):
+            parser.feed(event.content)
+    return parser.text
+
+
 async def run_mcp_travel_planner(destination: str, num_days: int, num_people: int, budget: int, openai_key: str, 
-                                google_maps_key: str, first_complete_flag: int, user_new_requirements: str, request_id: str = None):
-    """Run the MCP-based travel planner agent with real-time data access."""
-    global temp_output
+                                google_maps_key: str, first_complete_flag: int, user_new_requirements: str, request_id: str = None,
+                                on_section: Optional[Callable] = None, previous_itinerary: str = ""):
+    """
+    Run the MCP-based travel planner agent with real-time data access.
+
+    传入 on_section 时以流式模式运行，行程的各部分生成完毕即回调 on_section(kind, key, value)
+    previous_itinerary 为修改行程时该会话的上一版行程 JSON
+    """
     # for test 
     print("@@@@@@@@@@@@@@@@  Start  @@@@@@@@@@@@@@@@@@@@@@@@")
-    try:
-        # Set Google Maps API key environment variable
-        os.environ["GOOGLE_MAPS_API_KEY"] = google_maps_key
-        # Initialize MCPTools with Airbnb MCP
-        mcp_tools = MultiMCPTools(
-            [
-                # Windows
-                " cmd /c npx -y @openbnb/mcp-server-airbnb --ignore-robots-txt",
-                "cmd /c npx -y @gongrzhe/server-travelplanner-mcp",
-                # Linux
-                # "npx -y @openbnb/mcp-server-airbnb --ignore-robots-txt",
-                # "npx @gongrzhe/server-travelplanner-mcp",
-            ],
-            env={
-                "GOOGLE_MAPS_API_KEY": google_maps_key,
-            },
-            timeout_seconds=100,
-        )
-
-        # Connect to Airbnb MCP server
-        await mcp_tools.connect()
-
+    # Set Google Maps API key environment variable
+    os.environ["GOOGLE_MAPS_API_KEY"] = google_maps_key
+    # 从会话池借用已连接的 Airbnb / Travel Planner MCP 会话
+    async with travel_mcp_pool.lease() as mcp_tools:
         if request_id:
             await progress_manager.add_progress(request_id, "🤖 Create an AI travel agent", "info")
        
-        travel_planner = Agent(
-            name="Travel Planner",
-            model=OpenAIChat(
-            id="openai/gpt-4o", 
-            api_key=openai_key,
-            base_url="https://openrouter.ai/api/v1"
-            ),
-            tools=[mcp_tools, GoogleSearchTools()],
-            markdown=True
-        )
+        travel_planner = create_travel_agent(openai_key, mcp_tools)
         print("Success create Agent")
 
         # 根据标志选择模板并处理不同参数
+        revision_scope = None
+        previous_data = None
+        if first_complete_flag != 0:
+            try:
+                previous_data = json.loads(previous_itinerary)
+                revision_scope = classify_revision(user_new_requirements, previous_data, num_days, destination)
+            except (ValueError, AttributeError) as e:
+                print(f"上一版行程无法解析，完整重写: {e}")
+
         if first_complete_flag == 0:
             # 使用 prompt.md，需要基础行程参数
             with open('./prompt/prompt.md', "r", encoding="utf-8") as f:
@@ -572,6 +630,23 @@ async def run_mcp_travel_planner(destination: str, num_days: int, num_people: in
                 num_people=num_people,
                 budget=budget
             )
+        elif revision_scope:
+            # 使用 revise.md，只发送涉及的天 / 部分，其余部分以摘要形式提供
+            print(f"增量修改行程: {revision_scope.describe()}")
+            if request_id:
+                await progress_manager.add_progress(request_id, f"Updating {revision_scope.describe()}", "detail")
+            with open('./prompt/revise.md', "r", encoding="utf-8") as f:
+                prompt_template = f.read()
+            prompt = prompt_template.format(
+                user_new_requirements=user_new_requirements,
+                destination=destination,
+                num_days=num_days,
+                num_people=num_people,
+                budget=budget,
+                scope=revision_scope.describe(),
+                selected_json=json.dumps(build_revision_slice(previous_data, revision_scope), ensure_ascii=False),
+                plan_summary=summarize_itinerary(previous_data, revision_scope)
+            )
         else:
             # 使用 change.md，需要用户新需求和原始行程参数
             with open('./prompt/change.md', "r", encoding="utf-8") as f:
@@ -582,100 +657,303 @@ async def run_mcp_travel_planner(destination: str, num_days: int, num_people: in
                 num_days=num_days,
                 num_people=num_people,
                 budget=budget,
-                temp_output=temp_output
+                temp_output=previous_itinerary
             )
 
-        response = await travel_planner.arun(prompt)
+        if on_section:
+            content = await stream_agent_content(travel_planner, prompt, on_section)
+        else:
+            content = (await travel_planner.arun(prompt)).content
 
-        if request_id:
-            await progress_manager.add_progress(request_id, "Identifying the best possible route", "info")
-            await asyncio.sleep(1)
-            await progress_manager.add_progress(request_id,
-                                                f"{num_days} full days to explore {destination}'s iconic spots andhidden gems.",
-                                                "detail")
-        
-        print(response.content)
-        start_index = response.content.find('{')
-        end_index = response.content.rfind('}')
-        json_str = response.content[start_index:end_index + 1]
-        temp_output=json_str
-        print(json_str)
-        return json_str
+    if request_id:
+        await progress_manager.add_progress(request_id, "Identifying the best possible route", "info")
+        await progress_manager.add_progress(request_id,
+                                            f"{num_days} full days to explore {destination}'s iconic spots andhidden gems.",
+                                            "detail")
+
+    print(content)
+    if revision_scope:
+        # 模型只返回了修改的部分，合并回上一版行程
+        # 空补丁或被截断的补丁不能合并，否则会把不完整的修改当作成功返回
+        patch, truncated = parse_llm_json(content)
+        if not patch or truncated:
+            raise ValueError("模型返回的修改内容无法解析或不完整")
+        itinerary = merge_revision(previous_data, patch, revision_scope)
+    else:
+        itinerary, repaired = recover_itinerary(content)
+        itinerary = itinerary or {}
+        if repaired:
+            print("模型输出的 JSON 不完整，已修复")
+        missing_sections, missing_days = missing_itinerary_sections(itinerary, num_days)
+        if missing_sections or missing_days:
+            # 只重新生成缺失的部分，不丢弃已经生成的内容
+            print(f"补全缺失部分: {missing_sections} 天: {missing_days}")
+            if request_id:
+                await progress_manager.add_progress(request_id, "Filling in the remaining parts of your trip", "detail")
+            await complete_itinerary(itinerary, missing_sections, missing_days, destination, num_days,
+                                     num_people, budget, openai_key, on_section=on_section)
+
+    json_str = json.dumps(itinerary, ensure_ascii=False)
+    print(json_str)
+    return json_str
+
+
+# 单次调用中每天的计划串行生成，长行程可选用"大纲 + 每日并行"模式（默认关闭）：
+# 请求中 planning_mode="parallel" 显式开启，或设置 PARALLEL_PLANNING_MIN_DAYS 按天数自动开启
+PARALLEL_PLANNING_MIN_DAYS = int(os.getenv("PARALLEL_PLANNING_MIN_DAYS", "0"))
+# 每天的生成都会占用一个 travel MCP 会话，默认与会话池大小（MCP_TRAVEL_POOL_SIZE）相同，
+# 让各天真正并行；不能超过会话池大小，否则多出的天只会在池中排队
+PARALLEL_DAY_CONCURRENCY = min(
+    int(os.getenv("PARALLEL_DAY_CONCURRENCY", str(travel_mcp_pool.size))),
+    travel_mcp_pool.size
+)
+
+
+def use_parallel_planning(planning_mode: Optional[str], num_days: int, first_complete_flag: int) -> bool:
+    """planning_mode 显式指定 "parallel" / "single"；未指定时仅在配置了 PARALLEL_PLANNING_MIN_DAYS 后按天数开启"""
+    if first_complete_flag != 0:
+        return False
+    if planning_mode:
+        return planning_mode == "parallel"
+    return 0 < PARALLEL_PLANNING_MIN_DAYS <= num_days
+
+
+def load_prompt(name: str) -> str:
+    with open(f'./prompt/{name}', "r", encoding="utf-8") as f:
+        return f.read()
+
+
+async def run_outline(openai_key: str, destination: str, num_days: int, num_people: int, budget: int) -> dict:
+    """生成 trip_overview、住宿、预算和每日主题大纲（prompt/outline.md）"""
+    async with travel_mcp_pool.lease() as mcp_tools:
+        response = await create_travel_agent(openai_key, mcp_tools).arun(load_prompt("outline.md").format(
+            destination=destination,
+            num_days=num_days,
+            num_people=num_people,
+            budget=budget
+        ))
+    outline, truncated = parse_llm_json(response.content)
+    if not outline or truncated:
+        raise ValueError("行程大纲无法解析或不完整")
+    return outline
+
+
+async def generate_day_itinerary(openai_key: str, destination: str, num_days: int, num_people: int, budget: int,
+                                 day_outline: dict, accommodation: list, other_days: str) -> dict:
+    """按大纲生成某一天的详细行程（prompt/day.md）"""
+    accommodation_text = ", ".join(f'{acc.get("name", "")} ({acc.get("address", "")})' for acc in accommodation) or "N/A"
+    prompt = load_prompt("day.md").format(
+        day=day_outline["day"],
+        num_days=num_days,
+        destination=destination,
+        num_people=num_people,
+        theme=day_outline.get("theme", ""),
+        area=day_outline.get("area", ""),
+        highlights=", ".join(day_outline.get("highlights", [])),
+        daily_budget=day_outline.get("daily_budget_hkd", int(budget / num_days)),
+        accommodation=accommodation_text,
+        other_days=other_days or "        - (none)"
+    )
+    async with travel_mcp_pool.lease() as mcp_tools:
+        response = await create_travel_agent(openai_key, mcp_tools).arun(prompt)
+    day_info, truncated = parse_llm_json(response.content)
+    if not day_info or truncated:
+        raise ValueError(f"第 {day_outline['day']} 天的行程无法解析或不完整")
+    day_info["day"] = day_outline["day"]
+    return day_info
+
+
+async def run_parallel_travel_planner(destination: str, num_days: int, num_people: int, budget: int, openai_key: str,
+                                      google_maps_key: str, request_id: str = None, on_section: Optional[Callable] = None):
+    """
+    长行程并行规划：
+    1. 一次较短的调用生成 trip_overview、住宿、预算和每日主题大纲
+    2. 每天的详细行程按大纲并行生成（信号量与 MCP 会话池共同限制并发）
+    3. 按天合并为与 prompt.md 相同结构的行程 JSON
+
+    总耗时取决于最慢的一天，而不是天数之和
+    """
+    os.environ["GOOGLE_MAPS_API_KEY"] = google_maps_key
+
+    if request_id:
+        await progress_manager.add_progress(request_id, "🤖 Create an AI travel agent", "info")
+    outline = await run_outline(openai_key, destination, num_days, num_people, budget)
+    day_outlines = sorted(outline.pop("day_outlines", None) or [], key=lambda item: item["day"])
+    if on_section and outline.get("trip_overview"):
+        on_section(SECTION, "trip_overview", outline["trip_overview"])
+    if request_id:
+        await progress_manager.add_progress(request_id, "Identifying the best possible route", "info")
+        await progress_manager.add_progress(request_id,
+                                            f"{num_days} full days to explore {destination}'s iconic spots andhidden gems.",
+                                            "detail")
+
+    itinerary = {
+        "trip_overview": outline.get("trip_overview"),
+        "accommodation": outline.get("accommodation") or [],
+        "daily_itinerary": [],
+        "budget_breakdown": outline.get("budget_breakdown"),
+    }
+    await complete_itinerary(itinerary, [], list(range(1, num_days + 1)), destination, num_days, num_people, budget,
+                             openai_key, on_section=on_section, day_outlines=day_outlines)
+    return json.dumps(itinerary, ensure_ascii=False)
+
+
+async def complete_itinerary(itinerary: dict, missing_sections: list, missing_days: list, destination: str,
+                             num_days: int, num_people: int, budget: int, openai_key: str,
+                             on_section: Optional[Callable] = None, day_outlines: Optional[list] = None):
+    """
+    只重新生成行程中缺失的部分（原地修改 itinerary）：
+    缺失的顶层部分由一次大纲调用补齐，缺失的天按大纲并行生成
+    """
+    outlines_by_day = {item["day"]: item for item in day_outlines or []}
+    if missing_sections:
+        outline = await run_outline(openai_key, destination, num_days, num_people, budget)
+        for key in missing_sections:
+            if outline.get(key):
+                itinerary[key] = outline[key]
+        if not outlines_by_day:
+            outlines_by_day = {item["day"]: item for item in outline.get("day_outlines") or []}
+    if not missing_days:
+        return
+
+    missing = set(missing_days)
+    existing_days = [
+        day for day in itinerary.get("daily_itinerary") or []
+        if isinstance(day, dict) and day.get("day") not in missing
+    ]
+    semaphore = asyncio.Semaphore(PARALLEL_DAY_CONCURRENCY)
+
+    def other_days_of(day: int) -> str:
+        lines = [f'        - Day {item["day"]}: {item.get("day_summary", "")}' for item in existing_days]
+        lines += [
+            f'        - Day {item["day"]}: {item.get("theme", "")} ({", ".join(item.get("highlights", []))})'
+            for number, item in outlines_by_day.items() if number in missing and number != day
+        ]
+        return "\n".join(lines)
+
+    async def plan_day(index: int, day: int) -> dict:
+        day_outline = outlines_by_day.get(day) or {"day": day, "theme": f"Explore more of {destination}"}
+        async with semaphore:
+            day_info = await generate_day_itinerary(openai_key, destination, num_days, num_people, budget,
+                                                    day_outline, itinerary.get("accommodation") or [],
+                                                    other_days_of(day))
+        if on_section:
+            on_section(DAY, index, day_info)
+        return day_info
+
+    new_days = await asyncio.gather(*[plan_day(index, day) for index, day in enumerate(sorted(missing))])
+    itinerary["daily_itinerary"] = sorted(existing_days + list(new_days), key=lambda item: item.get("day", 0))
+
+
+planner_flights = SingleFlight("planner")
+SESSION_EXPIRED_DETAIL = "行程会话已过期或不存在，请重新生成行程"
+
+
+def check_itinerary(itinerary):
+    """校验整份行程，不符合格式时返回 500"""
+    try:
+        return validate_itinerary(itinerary)
+    except ValidationError as e:
+        raise HTTPException(status_code=500, detail=f"行程数据格式错误: {e.error_count()} 处字段不符合要求")
 
-    finally:
-        await mcp_tools.close()
 
 @app.get("/")
 async def root():
     return {"message": "MCP AI Travel Planner API"}
 
 
-async def generate_itinerary(request: TravelPlanRequest, user_new_requirements: str, first_complete_flag: int, request_id: str = None):
+async def generate_itinerary(request: TravelPlanRequest, user_new_requirements: str, first_complete_flag: int, request_id: str = None,
+                             on_section: Optional[Callable] = None, planning_mode: Optional[str] = None,
+                             session_id: Optional[str] = None, user_id: Optional[str] = None):
 
     """
-    生成旅行行程
+    生成旅行行程；修改行程时从会话状态中取回该会话的上一版行程，生成结果写回会话
+    Agent 运行前需通过准入控制（全局并发、每用户上限、排队），被拒绝时抛出 429 / 503
     """
     openai_key = os.getenv("OPENROUTER_API_KEY")
     googlemap_key = os.getenv("GOOGLE_MAP_KEY")
+    previous_itinerary = ""
+    if first_complete_flag != 0:
+        previous_itinerary = await session_store.get_itinerary(session_id)
+        if not previous_itinerary:
+            # 不能把修改请求当作新行程生成，否则用户的修改要求会被忽略
+            print(f"会话 {session_id} 没有可修改的行程")
+            raise HTTPException(status_code=409, detail=SESSION_EXPIRED_DETAIL)
+
+    # 只有不带修改要求的首次行程才读写行程缓存，修改请求不能拿到未修改的旧行程
+    cacheable = first_complete_flag == 0 and not user_new_requirements
+    if cacheable:
+        cached = itinerary_cache.get(request.destination, request.num_days, request.num_people, request.budget)
+        if cached is not None:
+            print(f"命中行程缓存: {request.destination} {request.num_days} 天")
+            await progress_manager.add_progress(request_id, "Found a matching itinerary", "info")
+            await session_store.save(session_id, cached)
+            return {
+                "success": True,
+                "itinerary": cached,
+                "message": "行程生成成功"
+            }
+
+    parallel = use_parallel_planning(planning_mode, request.num_days, first_complete_flag)
+
+    async def plan(progress_id: str, emit: Callable) -> str:
+        async with admission_controller.admit(user_id, progress_id):
+            if parallel:
+                itinerary = await run_parallel_travel_planner(
+                    destination=request.destination,
+                    num_days=request.num_days,
+                    num_people=request.num_people,
+                    budget=request.budget,
+                    openai_key=openai_key,
+                    google_maps_key=googlemap_key,
+                    request_id=progress_id,
+                    on_section=emit,
+                )
+            else:
+                itinerary = await run_mcp_travel_planner(
+                    destination=request.destination,
+                    num_days=request.num_days,
+                    num_people=request.num_people,
+                    budget=request.budget,
+                    openai_key=openai_key,
+                    google_maps_key=googlemap_key,
+                    request_id=progress_id,
+                    first_complete_flag=first_complete_flag,
+                    user_new_requirements=user_new_requirements,
+                    on_section=emit,
+                    previous_itinerary=previous_itinerary,
+                )
+        # 只有通过校验的行程才写入缓存和会话，格式错误的结果不能被后续请求复用
+        check_itinerary(itinerary)
+        if cacheable:
+            itinerary_cache.set(request.destination, request.num_days, request.num_people, request.budget, itinerary)
+        return itinerary
+
+    # 相同参数的新行程（或同一会话的相同修改，如重复点击）只运行一次 Agent
+    if first_complete_flag == 0:
+        flight_key = planner_flights.make_key(canonical_destination(request.destination), request.num_days,
+                                              request.num_people, request.budget, parallel)
+    else:
+        flight_key = planner_flights.make_key(session_id, user_new_requirements, request.destination,
+                                              request.num_days, request.num_people, request.budget)
+
     try:
-        itinerary = await run_mcp_travel_planner(
-            destination=request.destination,
-            num_days=request.num_days,
-            num_people=request.num_people,
-            budget=request.budget,
-            openai_key=openai_key,
-            google_maps_key=googlemap_key,
-            request_id=request_id,
-            first_complete_flag=first_complete_flag,
-            user_new_requirements=user_new_requirements,
-        )
+        itinerary = await planner_flights.do(flight_key, plan, request_id=request_id, on_event=on_section)
+        await session_store.save(session_id, itinerary)
 
         return {
             "success": True,
             "itinerary": itinerary,
             "message": "行程生成成功"
         }
+    except HTTPException:
+        raise
+    except PoolTimeoutError as e:
+        print(f"生成行程时等待 MCP 会话超时: {e}")
+        admission_controller.reject_overloaded()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成行程时出错: {str(e)}")
 
-async def get_airbnb_images(room_url: str):
-    """
-    获取 Airbnb 房源图片的代理接口
-    """
-    try:
-        print(f"正在获取 Airbnb 房源图片: {room_url}")
-
-        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            }
-            
-            response = await client.get(room_url, headers=headers)
-            response.raise_for_status()
-            
-            # 查找JSON-LD数据
-            json_ld_pattern = r'<script type="application/ld\+json">(.*?)</script>'
-            matches = re.findall(json_ld_pattern, response.text, re.DOTALL)
-            
-            image_urls = []
-            for match in matches:
-                try:
-                    data = json.loads(match)
-                    if 'image' in data:
-                        if isinstance(data['image'], str):
-                            image_urls.append(data['image'])
-                        elif isinstance(data['image'], list):
-                            image_urls.extend(data['image'][:3])
-                except:
-                    continue
-
-            print(f"找到 {len(image_urls)} 张图片")
-            return image_urls[:1]  # 返回第一张图片
-            
-    except Exception as e:
-        print(f"获取 Airbnb 图片失败: {e}")
-        return []
-
 @app.post("/api/download-calendar")
 async def download_calendar(request: dict):
     """
@@ -737,11 +1015,46 @@ async def download_calendar(request: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成日历文件时出错: {str(e)}")
 
+# ============================================
+# 用户身份（行程生成、后台任务、历史记录共用）
+# ============================================
+
+def get_user_id_from_token(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """从请求头中提取用户ID"""
+    if not authorization:
+        return None
+    try:
+        # 格式: "Bearer <token>" 或直接是user_id
+        if authorization.startswith("Bearer "):
+            token = authorization.replace("Bearer ", "")
+            # 验证Google ID token并提取user_id
+            try:
+                from google.oauth2 import id_token
+                from google.auth.transport import requests
+                import os
+
+                google_client_id = os.getenv("GOOGLE_CLIENT_ID")
+                if google_client_id:
+                    idinfo = id_token.verify_oauth2_token(
+                        token,
+                        requests.Request(),
+                        google_client_id
+                    )
+                    return idinfo.get("sub")  # Google user ID
+            except:
+                # 如果验证失败，尝试直接使用token作为user_id（简化处理）
+                pass
+            return token
+        return authorization
+    except:
+        return None
+
+
 # -----------------------------------------------
 # 4. 创建 API 终结点 (Endpoint)
 # -----------------------------------------------
 @app.post("/api/chat", response_model=ItineraryResponse)
-async def handle_chat(request: ChatRequest):
+async def handle_chat(request: ChatRequest, user_id: Optional[str] = Depends(get_user_id_from_token)):
 
     print(f"✅ 收到前端消息: {request.message}")
     if request.vibe:
@@ -749,9 +1062,11 @@ async def handle_chat(request: ChatRequest):
     if request.travel_info:
         print(f"✅ 收到 Travel Info: {request.travel_info}")        
 
+    request_id = request.request_id
+    # 会话 ID 标识同一次规划的多轮修改，首次请求时由服务端分配并随响应返回
+    session_id = request.session_id or uuid.uuid4().hex
     if request.travel_info:
         print(f"✅ 收到 request_id: {request.request_id}")   
-        request_id = request.request_id
 
     mock_flights = [
         Flight(
@@ -778,138 +1093,169 @@ async def handle_chat(request: ChatRequest):
         )
     ]
 
-    flight_service = SimpleFlightService()
     travel_info = request.travel_info
 
+    # 修改要求只用于修改行程（首次生成的 prompt.md 不使用聊天内容）
     user_new_requirements = ""
-    if request.chat_history and len(request.chat_history) > 0:
+    if request.first_complete_flag != 0 and request.chat_history:
         last_msg = request.chat_history[-1]
         if last_msg.get("role") == "user":
             user_new_requirements = last_msg.get("content", "")
 
-    response = await generate_itinerary(
-        TravelPlanRequest(
-            destination=travel_info.destination,
-            departure=travel_info.departure,
-            num_days=travel_info.num_days, 
-            num_people=travel_info.num_people, 
-            budget=travel_info.budget
-        ),
-        request_id=request_id,  # 传递请求ID
-        user_new_requirements=user_new_requirements,
-        first_complete_flag=request.first_complete_flag
-    )
-
-    itinerary_data = json.loads(response.get("itinerary", {}))
-
     start_date = datetime.strptime(travel_info.start_date, '%a %b %d %Y')
     end_date = datetime.strptime(travel_info.end_date, '%a %b %d %Y')
     departure_date = start_date.strftime('%Y-%m-%d')
     return_date = end_date.strftime('%Y-%m-%d')
 
-    overview = itinerary_data["trip_overview"]
-    real_overview = TripOverview(
-        title=overview['title'],
-        image_url=get_place_photo_url(overview["destination"], os.getenv("GOOGLE_MAP_KEY")),
-        location=overview['destination'],
-        date_range=travel_info.start_date + ' - ' + travel_info.end_date,
-        description=overview['summary']
-    )
+    # 修改行程需要该会话保存的上一版行程，缺失时在发起任何工作之前返回 409
+    if request.first_complete_flag != 0 and not await session_store.get_itinerary(session_id):
+        raise HTTPException(status_code=409, detail=SESSION_EXPIRED_DETAIL)
 
-    # 每日行程信息
-    daily_data = []
-    days_info = itinerary_data["daily_itinerary"]
-    for day_info in days_info:
-        for activity in day_info["activities"]:
-            url = get_place_photo_url(activity["address"], os.environ["GOOGLE_MAPS_API_KEY"])
-            if (url == None):
-                url = ""
-            daily_itinerary = DailyItinerary(
-                start_time=activity["start_time"],
-                end_time=activity["end_time"],
-                activity=activity["activity_name"],
-                activity_description=activity["description"],
-                activity_cost=str(activity["cost_hkd"]),
-                activity_transport=f'{activity["travel_info"]["from_previous_duration_minutes"]} minutes from_previous attraction by {activity["travel_info"]["transportation_mode"]}',
-                image_url=url
-            )
-            daily_data.append({
-                "day": day_info["day"],
-                "itinerary": daily_itinerary
-            })
+    # 准入控制：在发起航班、小红书等任何工作之前拒绝注定要排队超时的请求
+    # （命中缓存的新行程不会运行 Agent，无需检查）
+    if request.first_complete_flag != 0 or user_new_requirements or itinerary_cache.get(
+            travel_info.destination, travel_info.num_days, travel_info.num_people, travel_info.budget) is None:
+        admission_controller.check(user_id)
 
-    # 搜索航班
-    if request_id:
-        await asyncio.sleep(1)
-        await progress_manager.add_progress(request_id, "Searching for flights", "info")
-
-    outbound_flights, inbound_flights = flight_service.get_round_trip_flights(
-        departure_city=travel_info.departure.lower(),
-        destination_city=travel_info.destination.lower(),
-        num_people=travel_info.num_people,
-        budget=travel_info.budget,
-        departure_date=departure_date,
-        return_date=return_date
-    )
+    # --- 流式生成：每一天的行程一生成就补全照片并通过 SSE 推送给前端 ---
+    streamed_tasks = []
 
-    real_flights = []
+    async def publish_overview(overview: dict):
+        await progress_manager.add_progress(request_id, f"Planning your trip: {overview.get('title', '')}", "itinerary_overview",
+                                            data=overview)
 
-    if outbound_flights and inbound_flights:
-        best_outbound = outbound_flights[0]
-        best_inbound = inbound_flights[0]
+    async def publish_day(day_info: dict):
+        try:
+            day = day_adapter.validate_python(day_info)
+        except ValidationError as e:
+            print(f"流式行程数据不完整，等待完整结果: {e}")
+            return
+        urls = await photo_resolver.resolve_many(activity_addresses([day]), os.getenv("GOOGLE_MAP_KEY"))
+        itinerary = [build_daily_itinerary(activity, url).model_dump() for activity, url in zip(day.activities, urls)]
+        await progress_manager.add_progress(request_id, f"Day {day.day} is ready", "itinerary_day",
+                                            data={"day": day.day, "itinerary": itinerary})
+
+    def on_section(kind, key, value):
+        if kind == DAY and isinstance(value, dict):
+            streamed_tasks.append(asyncio.create_task(publish_day(value)))
+        elif kind == SECTION and key == "trip_overview" and isinstance(value, dict):
+            streamed_tasks.append(asyncio.create_task(publish_overview(value)))
+
+    # --- 阶段图：航班与小红书不依赖 LLM 输出，与行程生成并发执行 ---
+    async def itinerary_stage():
+        response = await generate_itinerary(
+            TravelPlanRequest(
+                destination=travel_info.destination,
+                departure=travel_info.departure,
+                num_days=travel_info.num_days,
+                num_people=travel_info.num_people,
+                budget=travel_info.budget
+            ),
+            request_id=request_id,  # 传递请求ID
+            user_new_requirements=user_new_requirements,
+            first_complete_flag=request.first_complete_flag,
+            on_section=on_section if request_id else None,  # 无人订阅进度时无需流式解析
+            planning_mode=request.planning_mode,
+            session_id=session_id,
+            user_id=user_id
+        )
+        # 一次性校验整份行程，格式问题在补全照片和酒店图片之前暴露
+        return check_itinerary(response["itinerary"])
+
+    async def overview_stage(itinerary_data):
+        overview = itinerary_data.trip_overview
+        image_url = await photo_resolver.resolve(overview.destination, os.getenv("GOOGLE_MAP_KEY"))
+        return TripOverview(
+            title=overview.title,
+            image_url=image_url or "",
+            location=overview.destination,
+            date_range=travel_info.start_date + ' - ' + travel_info.end_date,
+            description=overview.summary
+        )
 
-        # 解析去程/返程航段
-        seg_out = best_outbound['itineraries'][0]['segments'][0]
-        seg_in = best_inbound['itineraries'][0]['segments'][0]
-        dur_out = best_outbound['itineraries'][0]['duration']
-        dur_in = best_inbound['itineraries'][0]['duration']
-        flight_total_price = (float(best_outbound['price']['total']) + float(best_inbound['price']['total']))*9 #EUR->HKD
+    async def daily_stage(itinerary_data):
+        # 流式阶段已提前发起的照片查询在此汇合，下面的查询直接命中缓存
+        await asyncio.gather(*streamed_tasks, return_exceptions=True)
+        # 每日行程信息：所有活动的照片查询一次性并发展开，再批量构建响应
+        days = itinerary_data.daily_itinerary
+        urls = await photo_resolver.resolve_many(activity_addresses(days), os.getenv("GOOGLE_MAP_KEY"))
+        return build_daily_responses(days, urls)
 
-        real_flights = [
-            flight_service.extract_flight(seg_out, dur_out, travel_info.departure, travel_info.destination),
-            flight_service.extract_flight(seg_in, dur_in, travel_info.destination, travel_info.departure)
-        ]
-    else:
-        real_flights = mock_flights
+    async def flights_stage():
+        # 搜索航班
+        if request_id:
+            await progress_manager.add_progress(request_id, "Searching for flights", "info")
+
+        outbound_flights, inbound_flights = await flight_service.get_round_trip_flights(
+            departure_city=travel_info.departure.lower(),
+            destination_city=travel_info.destination.lower(),
+            num_people=travel_info.num_people,
+            budget=travel_info.budget,
+            departure_date=departure_date,
+            return_date=return_date
+        )
 
-    if request_id:
-        await progress_manager.add_progress(request_id, f"Direct flights from {travel_info.departure} to {travel_info.destination} take about {dur_out.replace('PT','').lower()} each way.", "detail")
+        if outbound_flights and inbound_flights:
+            best_outbound = outbound_flights[0]
+            best_inbound = inbound_flights[0]
 
-    if request_id:
-        await asyncio.sleep(1)
-        await progress_manager.add_progress(request_id, "Searching for hotels", "info")
-    
-    real_hotels = []
-    accommodation_data = itinerary_data["accommodation"]
-    for acc in accommodation_data:
-        # 获取 Airbnb 图片
-        image_url = ""
-        if acc.get("link") and "airbnb.com" in acc["link"]:
-            images = await get_airbnb_images(acc["link"])
-            if images:
-                image_url = images[0]
-        hotel = Hotel(
-            name=acc.get("name", ""),
-            image_url=image_url,
-            rating=acc.get("rating", 0),
-            review_count=acc.get("review_count", 0),
-            price_per_night=int(acc.get("price_per_night_hkd", 0)),
-            currency="HKD",
-            address=acc.get("address", ""),
-            amenities=acc.get("amenities", []),
-            link=acc.get("link", "")
-        )
-        
-        real_hotels.append(hotel)
+            # 解析去程/返程航段
+            seg_out = best_outbound['itineraries'][0]['segments'][0]
+            seg_in = best_inbound['itineraries'][0]['segments'][0]
+            dur_out = best_outbound['itineraries'][0]['duration']
+            dur_in = best_inbound['itineraries'][0]['duration']
+            flight_total_price = (float(best_outbound['price']['total']) + float(best_inbound['price']['total']))*9 #EUR->HKD
+
+            real_flights = [
+                flight_service.extract_flight(seg_out, dur_out, travel_info.departure, travel_info.destination),
+                flight_service.extract_flight(seg_in, dur_in, travel_info.destination, travel_info.departure)
+            ]
+
+            if request_id:
+                await progress_manager.add_progress(request_id, f"Direct flights from {travel_info.departure} to {travel_info.destination} take about {dur_out.replace('PT','').lower()} each way.", "detail")
+        else:
+            real_flights = mock_flights
+            flight_total_price = 0
+
+        return {"flights": real_flights, "total_price": flight_total_price}
+
+    async def hotels_stage(itinerary_data):
+        if request_id:
+            await progress_manager.add_progress(request_id, "Searching for hotels", "info")
+
+        accommodation_data = itinerary_data.accommodation
+
+        # 并发获取 Airbnb 图片
+        airbnb_links = [acc.link for acc in accommodation_data if acc.link and "airbnb.com" in acc.link]
+        images_by_link = dict(zip(airbnb_links, await get_airbnb_images_many(airbnb_links)))
+
+        real_hotels = []
+        for acc in accommodation_data:
+            images = images_by_link.get(acc.link)
+            image_url = images[0] if images else ""
+            hotel = Hotel(
+                name=acc.name,
+                image_url=image_url,
+                rating=acc.rating,
+                review_count=int(acc.review_count),
+                price_per_night=int(acc.price_per_night_hkd),
+                currency="HKD",
+                address=acc.address,
+                amenities=acc.amenities,
+                link=acc.link
+            )
+            real_hotels.append(hotel)
+        return real_hotels
+
+    async def xhs_stage():
+        # 如果用户选择了preference，搜索小红书内容
+        if not (request.vibe and len(request.vibe) > 0):
+            return None
 
-    # 如果用户选择了preference，搜索小红书内容
-    xhs_data = None
-    if request.vibe and len(request.vibe) > 0:
         if request_id:
-            await asyncio.sleep(1)
             await progress_manager.add_progress(request_id, "Searching Rednote based on your preferences", "info")
             await progress_manager.add_progress(request_id, "Searching top 5 relevant rednote posts", "info")
-        
+
         try:
             xhs_result = await generate_xhs(
                 destination=travel_info.destination,
@@ -921,73 +1267,97 @@ async def handle_chat(request: ChatRequest):
                     await progress_manager.add_progress(request_id,
                                                         f"Found {len(xhs_data.get('summary', {}).get('top_places', []))} places, {len(xhs_data.get('summary', {}).get('top_restaurants', []))} restaurants, and {len(xhs_data.get('summary', {}).get('top_activities', []))} activities based on your preferences.",
                                                         "detail")
+                return xhs_data
         except Exception as e:
             print(f"Error fetching Rednote content: {str(e)}")
             if request_id:
                 await progress_manager.add_progress(request_id,
                                                     "Unable to fetch Rednote recommendations, but continuing with itinerary generation.",
                                                     "detail")
+        return None
 
-    real_price = PriceSummary(
-        flights_total=int(flight_total_price),
-        hotels_total=int(itinerary_data["budget_breakdown"]["accommodation_total_hkd"]),
-        grand_total=int(travel_info.budget - itinerary_data["budget_breakdown"]["remaining_budget_hkd"]),  # 332 + 221
-        currency="HKD"
+    async def price_stage(itinerary_data, flights):
+        return PriceSummary(
+            flights_total=int(flights["total_price"]),
+            hotels_total=int(itinerary_data.budget_breakdown.accommodation_total_hkd),
+            # 行程自身的预算减去剩余预算（缓存复用的行程预算可能与本次请求不同）
+            grand_total=int((itinerary_data.trip_overview.total_budget_hkd or travel_info.budget)
+                            - itinerary_data.budget_breakdown.remaining_budget_hkd),
+            currency="HKD"
+        )
+
+    graph = (
+        StageGraph()
+        .add("itinerary_data", itinerary_stage)
+        .add("flights", flights_stage)
+        .add("xhs", xhs_stage)
+        .add("overview", overview_stage, inputs=["itinerary_data"])
+        .add("daily", daily_stage, inputs=["itinerary_data"])
+        .add("hotels", hotels_stage, inputs=["itinerary_data"])
+        .add("price", price_stage, inputs=["itinerary_data", "flights"])
     )
+    results = await graph.run()
 
     if request_id:
-        await asyncio.sleep(1)
         await progress_manager.add_progress(request_id, "Creating an itinerary", "info")
-        await asyncio.sleep(1)
         await progress_manager.add_progress(request_id, f"I've focused on {travel_info.destination}'s iconic highlights perfect for your short visit.", "detail")
         await progress_manager.add_progress(request_id, "I made sure to include must-see attractions for that iconic experience!", "detail")
-        await asyncio.sleep(1)
         await progress_manager.add_progress(request_id, "Trip Generated!", "success")
 
     # --- 返回完整的响应 ---
     return ItineraryResponse(
         # ai_response=response.get("itinerary"),
         ai_response="",
-        trip_overview=real_overview,
-        daily_itinerary=daily_data,
-        flights=real_flights,
-        hotels=real_hotels,
-        price_summary=real_price
+        trip_overview=results["overview"],
+        daily_itinerary=results["daily"],
+        flights=results["flights"]["flights"],
+        hotels=results["hotels"],
+        price_summary=results["price"],
+        session_id=session_id
     )
 
 # ============================================
-# 历史记录相关API端点
+# 后台任务API端点
 # ============================================
 
-def get_user_id_from_token(authorization: Optional[str] = Header(None)) -> Optional[str]:
-    """从请求头中提取用户ID"""
-    if not authorization:
-        return None
-    try:
-        # 格式: "Bearer <token>" 或直接是user_id
-        if authorization.startswith("Bearer "):
-            token = authorization.replace("Bearer ", "")
-            # 验证Google ID token并提取user_id
-            try:
-                from google.oauth2 import id_token
-                from google.auth.transport import requests
-                import os
+@app.post("/api/jobs/chat", status_code=202)
+async def submit_chat_job(request: ChatRequest, user_id: Optional[str] = Depends(get_user_id_from_token)):
+    """
+    提交行程生成任务，立即返回 job_id；进度可通过 /api/progress/{job_id} 订阅
+    任务按提交者的 user_id 隔离，未登录时没有可区分的身份，需要登录后使用
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="未授权，请先登录")
+    if not request.request_id:
+        request.request_id = uuid.uuid4().hex
+    admission_controller.check(user_id)
+    job = job_manager.submit(lambda: handle_chat(request, user_id=user_id), job_id=request.request_id, owner=user_id)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "request_id": request.request_id,
+        "status": job.status
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, user_id: Optional[str] = Depends(get_user_id_from_token)):
+    """
+    查询任务状态和结果；wait > 0 时长轮询等待任务完成（最多 60 秒）
+    只能查询自己提交的任务；任务保存在提交它的 worker 进程内存中
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="未授权，请先登录")
+    job = await job_manager.wait(job_id, timeout=min(max(wait, 0), 60), owner=user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+
+# ============================================
+# 历史记录相关API端点
+# ============================================
 
-                google_client_id = os.getenv("GOOGLE_CLIENT_ID")
-                if google_client_id:
-                    idinfo = id_token.verify_oauth2_token(
-                        token,
-                        requests.Request(),
-                        google_client_id
-                    )
-                    return idinfo.get("sub")  # Google user ID
-            except:
-                # 如果验证失败，尝试直接使用token作为user_id（简化处理）
-                pass
-            return token
-        return authorization
-    except:
-        return None
 
 @app.post("/api/plans/save")
 async def save_plan(
@@ -0,0 +1,255 @@
+"""
+MCP 服务器会话池
+
+应用生命周期内保持已连接的 MultiMCPTools 会话，请求通过 lease() 借用、用完归还，
+避免每个请求都重新 npx 启动 Node 子进程。会话崩溃或健康检查失败时自动重启。
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+from agno.tools.mcp import MultiMCPTools
+
+
+class PoolTimeoutError(TimeoutError):
+    """等待空闲会话超时"""
+
+
+def _shell_command(command: str) -> str:
+    """Windows 下需要通过 cmd /c 启动 npx"""
+    return f"cmd /c {command}" if os.name == "nt" else command
+
+
+class _PooledSession:
+    """
+    单个 MCP 会话
+
+    connect/close 必须在同一个任务中完成（MCP stdio 客户端基于 anyio 的 cancel scope），
+    因此每个会话由一个专属任务持有。
+    """
+
+    def __init__(self, factory: Callable[[], MultiMCPTools]):
+        self._factory = factory
+        self._stop = asyncio.Event()
+        self._ready: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.tools: Optional[MultiMCPTools] = None
+
+    async def start(self):
+        self._ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run())
+        return await self._ready
+
+    async def _run(self):
+        tools = self._factory()
+        try:
+            await tools.connect()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            return
+
+        self.tools = tools
+        self._ready.set_result(tools)
+        try:
+            await self._stop.wait()
+        finally:
+            try:
+                await tools.close()
+            except Exception as e:
+                print(f"关闭 MCP 会话失败: {e}")
+
+    @property
+    def alive(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def ping(self, timeout: float) -> bool:
+        """检查会话是否可用（MultiMCPTools.is_alive 会对每个 MCP 服务器发送 ping）"""
+        if not self.alive or self.tools is None:
+            return False
+        try:
+            healthy = await asyncio.wait_for(self.tools.is_alive(), timeout=timeout)
+        except asyncio.TimeoutError:
+            healthy = False
+        if not healthy:
+            print("MCP 会话健康检查失败")
+        return healthy
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except BaseException as e:
+                print(f"MCP 会话退出异常: {e}")
+
+
+class MCPSessionPool:
+    def __init__(
+        self,
+        name: str,
+        commands: List[str],
+        size: int = 1,
+        warm: int = 0,
+        env_factory: Optional[Callable[[], Dict[str, str]]] = None,
+        timeout_seconds: int = 100,
+        acquire_timeout: float = 120,
+        health_check_interval: float = 30,
+    ):
+        """
+        Args:
+            name: 池名称（用于日志）
+            commands: MultiMCPTools 启动命令列表
+            size: 最大会话数
+            warm: 启动时预热的会话数
+            env_factory: 启动会话时生成子进程环境变量
+            timeout_seconds: MCP 工具调用超时
+            acquire_timeout: 借用会话的最长等待时间
+            health_check_interval: 空闲会话健康检查间隔（秒）
+        """
+        self.name = name
+        self.commands = commands
+        self.size = max(1, size)
+        self.warm = min(warm, self.size)
+        self.env_factory = env_factory
+        self.timeout_seconds = timeout_seconds
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: "asyncio.Queue[_PooledSession]" = asyncio.Queue()
+        self._total = 0
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _create_tools(self) -> MultiMCPTools:
+        return MultiMCPTools(
+            self.commands,
+            env=self.env_factory() if self.env_factory else None,
+            timeout_seconds=self.timeout_seconds,
+        )
+
+    async def _spawn(self) -> _PooledSession:
+        self._total += 1
+        session = _PooledSession(self._create_tools)
+        try:
+            await session.start()
+        except BaseException:
+            self._total -= 1
+            raise
+        print(f"MCP 会话池 {self.name}: 新会话已连接 ({self._total}/{self.size})")
+        return session
+
+    async def _discard(self, session: _PooledSession):
+        self._total -= 1
+        await session.stop()
+
+    async def start(self):
+        """预热会话并启动健康检查"""
+        self._closed = False
+        results = await asyncio.gather(*[self._spawn() for _ in range(self.warm - self._total)],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                print(f"MCP 会话池 {self.name} 预热失败: {result}")
+            else:
+                self._idle.put_nowait(result)
+        if self._health_task is None and self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        """定期检查空闲会话，替换已崩溃的会话"""
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            for _ in range(self._idle.qsize()):
+                try:
+                    session = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if await session.ping(timeout=5):
+                    self._idle.put_nowait(session)
+                    continue
+                print(f"MCP 会话池 {self.name}: 会话失效，正在重启")
+                await self._discard(session)
+                try:
+                    self._idle.put_nowait(await self._spawn())
+                except Exception as e:
+                    print(f"MCP 会话池 {self.name} 重启会话失败: {e}")
+
+    async def acquire(self) -> _PooledSession:
+        """借用一个健康的会话；池未满时按需创建"""
+        if self._closed:
+            raise RuntimeError(f"MCP 会话池 {self.name} 已关闭")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.acquire_timeout
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                if self._total < self.size:
+                    return await self._spawn()
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"等待 MCP 会话池 {self.name} 超时")
+                # 分段等待，以便其他请求丢弃会话后能及时按需重建
+                try:
+                    session = await asyncio.wait_for(self._idle.get(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    continue
+
+            if session.alive:
+                return session
+            await self._discard(session)
+
+    async def release(self, session: _PooledSession, broken: bool = False):
+        """归还会话；调用过程中出错的会话直接丢弃，下次按需重建"""
+        if broken or self._closed or not session.alive:
+            await self._discard(session)
+        else:
+            self._idle.put_nowait(session)
+
+    @asynccontextmanager
+    async def lease(self):
+        session = await self.acquire()
+        broken = False
+        try:
+            yield session.tools
+        except asyncio.CancelledError:
+            broken = not session.alive
+            raise
+        except Exception:
+            broken = not await session.ping(timeout=5)
+            raise
+        finally:
+            await self.release(session, broken=broken)
+
+    async def close(self):
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+
+travel_mcp_pool = MCPSessionPool(
+    "travel",
+    [
+        _shell_command("npx -y @openbnb/mcp-server-airbnb --ignore-robots-txt"),
+        _shell_command("npx -y @gongrzhe/server-travelplanner-mcp"),
+    ],
+    # 并行规划时每天占用一个会话，超出预热数的会话按需启动
+    size=int(os.getenv("MCP_TRAVEL_POOL_SIZE", "4")),
+    warm=int(os.getenv("MCP_TRAVEL_POOL_WARM", "2")),
+    env_factory=lambda: {"GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAP_KEY", "")},
+    timeout_seconds=100,
+)
+
+# generate_xhs 目前使用模拟数据，默认不预热
+xhs_mcp_pool = MCPSessionPool(
+    "xiaohongshu",
+    [_shell_command("npx -y rednote-mind-mcp")],
+    size=int(os.getenv("MCP_XHS_POOL_SIZE", "1")),
+    warm=int(os.getenv("MCP_XHS_POOL_WARM", "0")),
+    timeout_seconds=5000,
+)
@@ -19,6 +19,8 @@ class ChatRequest(BaseModel):
     travel_info:Optional[TravelInfo] = None
     request_id:Optional[str]
     first_complete_flag:int
+    planning_mode: Optional[str] = None  # "single" / "parallel"，为空时默认 single（可通过 PARALLEL_PLANNING_MIN_DAYS 按天数自动选择）
+    session_id: Optional[str] = None  # 修改行程时传回上一次响应中的 session_id
 
 # --- 响应体 (与 UI 完全匹配) ---
 
@@ -81,6 +83,7 @@ class ItineraryResponse(BaseModel):
     flights: List[Flight]
     hotels: List[Hotel]
     price_summary: PriceSummary
+    session_id: Optional[str] = None
 
 
 class TravelPlanRequest(BaseModel):
@@ -0,0 +1,99 @@
+"""
+轻量级阶段图执行器
+
+每个阶段声明自己依赖的输入，互不依赖的阶段并发执行，
+下游阶段在其全部输入就绪后立即启动。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable[..., Awaitable[Any]], inputs: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+
+
+class StageGraph:
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], inputs: Iterable[str] = ()):
+        """注册阶段，func 以关键字参数接收各输入阶段的结果"""
+        if name in self.stages:
+            raise ValueError(f"阶段重复注册: {name}")
+        self.stages[name] = Stage(name, func, inputs)
+        return self
+
+    def _check(self, initial: Dict[str, Any]):
+        """检查依赖是否存在且无环"""
+        for stage in self.stages.values():
+            for dep in stage.inputs:
+                if dep not in self.stages and dep not in initial:
+                    raise ValueError(f"阶段 {stage.name} 依赖未知输入: {dep}")
+
+        visiting, done = set(), set(initial)
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"阶段图存在环: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].inputs:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self, initial: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        执行阶段图
+
+        Args:
+            initial: 预先已知的输入（例如请求参数）
+
+        Returns:
+            dict: 阶段名 -> 阶段结果（包含 initial）
+
+        任一阶段抛出异常时取消其余阶段并向上抛出该异常。
+        """
+        initial = dict(initial or {})
+        self._check(initial)
+
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, asyncio.Future] = {}
+        for name, value in initial.items():
+            futures[name] = loop.create_future()
+            futures[name].set_result(value)
+        for name in self.stages:
+            futures[name] = loop.create_future()
+
+        async def run_stage(stage: Stage):
+            try:
+                kwargs = {dep: await futures[dep] for dep in stage.inputs}
+                result = await stage.func(**kwargs)
+            except BaseException as e:
+                if not futures[stage.name].done():
+                    futures[stage.name].set_exception(e)
+                raise
+            futures[stage.name].set_result(result)
+
+        tasks = [asyncio.create_task(run_stage(stage), name=f"stage:{stage.name}")
+                 for stage in self.stages.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 已被上游异常连带失败的 future 不再报 "exception was never retrieved"
+            for future in futures.values():
+                if future.done() and not future.cancelled():
+                    future.exception()
+
+        return {name: future.result() for name, future in futures.items()}
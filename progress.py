@@ -0,0 +1,160 @@
+"""
+进度事件总线
+
+每个 request_id 对应一个定长环形缓冲区：
+- 订阅前产生的事件会被保留并在订阅时回放
+- 支持 SSE Last-Event-ID 断线续传
+- 空闲频道按 TTL 淘汰，频道总数有上限，单 worker 内存占用有界
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+
+class ProgressChannel:
+    def __init__(self, buffer_size: int):
+        self.events = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+        self._updated = asyncio.Event()
+
+    def publish(self, data: dict) -> int:
+        event_id = self.next_id
+        self.next_id += 1
+        self.events.append((event_id, data))
+        self.last_active = time.monotonic()
+        # 唤醒所有订阅者，并为下一轮等待换上新的 Event
+        self._updated.set()
+        self._updated = asyncio.Event()
+        return event_id
+
+    def since(self, last_event_id: int):
+        return [(event_id, data) for event_id, data in self.events if event_id > last_event_id]
+
+    async def wait(self, last_event_id: int, timeout: float) -> bool:
+        """等待新事件，超时返回 False"""
+        if self.next_id - 1 > last_event_id:
+            return True
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class ProgressManager:
+    def __init__(self, buffer_size: int = 256, channel_ttl: float = 600, max_channels: int = 2000,
+                 keepalive_interval: float = 15):
+        """
+        Args:
+            buffer_size: 每个频道保留的最大事件数
+            channel_ttl: 无订阅者的频道空闲多久后淘汰（秒）
+            max_channels: 频道数上限，超出时淘汰最久未活动的空闲频道
+            keepalive_interval: SSE 心跳间隔（秒）
+        """
+        self.buffer_size = buffer_size
+        self.channel_ttl = channel_ttl
+        self.max_channels = max_channels
+        self.keepalive_interval = keepalive_interval
+        self.channels: "OrderedDict[str, ProgressChannel]" = OrderedDict()
+        # 进度分组：合并执行的请求把分组事件转发给每个成员 request_id
+        self.groups: Dict[str, Set[str]] = {}
+        self.group_events: Dict[str, deque] = {}
+
+    def _channel(self, request_id: str) -> ProgressChannel:
+        channel = self.channels.get(request_id)
+        if channel is None:
+            channel = ProgressChannel(self.buffer_size)
+            self.channels[request_id] = channel
+        channel.last_active = time.monotonic()
+        self.channels.move_to_end(request_id)
+        self._evict()
+        return channel
+
+    def _evict(self):
+        """淘汰过期或超量的空闲频道（按最近活动时间从旧到新）"""
+        now = time.monotonic()
+        overflow = len(self.channels) - self.max_channels
+        for request_id in list(self.channels):
+            channel = self.channels[request_id]
+            expired = now - channel.last_active > self.channel_ttl
+            if not expired and overflow <= 0:
+                break
+            if channel.subscribers == 0:
+                del self.channels[request_id]
+                overflow -= 1
+
+    def join(self, group_id: str, request_id: str):
+        """把 request_id 加入进度分组，并补发分组之前的事件"""
+        members = self.groups.setdefault(group_id, set())
+        events = self.group_events.setdefault(group_id, deque(maxlen=self.buffer_size))
+        if request_id in members:
+            return
+        members.add(request_id)
+        channel = self._channel(request_id)
+        for progress_data in events:
+            channel.publish(progress_data)
+
+    def leave(self, group_id: str, request_id: str):
+        members = self.groups.get(group_id)
+        if members is None:
+            return
+        members.discard(request_id)
+        if not members:
+            del self.groups[group_id]
+            self.group_events.pop(group_id, None)
+
+    async def add_progress(self, request_id: str, message: str, progress_type: str = "info", data: Optional[dict] = None):
+        """
+        添加进度消息；订阅者尚未连接时事件会被缓存等待回放。data 为随事件推送的结构化内容
+        request_id 为进度分组时，事件转发给分组内的每个成员
+        """
+        if not request_id:
+            return
+        progress_data = {
+            "type": progress_type,
+            "message": message,
+            "timestamp": datetime.now().isoformat()
+        }
+        if data is not None:
+            progress_data["data"] = data
+        if request_id in self.groups:
+            self.group_events[request_id].append(progress_data)
+            for member in list(self.groups[request_id]):
+                self._channel(member).publish(progress_data)
+            return
+        self._channel(request_id).publish(progress_data)
+
+    async def get_progress_stream(self, request_id: str, last_event_id: Optional[int] = None, pace: float = 0):
+        """
+        获取进度流，先回放 last_event_id 之后的历史事件
+
+        pace > 0 时相邻事件之间至少间隔 pace 秒推送，仅用于前端展示节奏，
+        不会拖慢后端的行程生成。
+        """
+        channel = self._channel(request_id)
+        channel.subscribers += 1
+        cursor = last_event_id or 0
+        last_sent = 0.0
+        try:
+            while True:
+                for event_id, progress_data in channel.since(cursor):
+                    if pace > 0:
+                        delay = last_sent + pace - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        last_sent = time.monotonic()
+                    cursor = event_id
+                    yield f"id: {event_id}\ndata: {json.dumps(progress_data)}\n\n"
+                if not await channel.wait(cursor, timeout=self.keepalive_interval):
+                    yield ": keep-alive\n\n"
+        finally:
+            channel.subscribers -= 1
+            channel.last_active = time.monotonic()
+
+
+progress_manager = ProgressManager()
@@ -0,0 +1,142 @@
+"""
+增量修改行程
+
+常见的修改只涉及一两天（"把第 3 天的晚餐换掉"），不必把整份行程发给模型重写：
+1. classify_revision: 按规则判断修改需求涉及哪些天 / 哪些部分
+2. build_revision_slice / summarize_itinerary: 只发送涉及的部分，其余部分压缩为一行一天的摘要
+3. merge_revision: 把模型返回的补丁合并回原行程
+
+无法确定范围（涉及整个行程、预算、天数或目的地变化）时返回 None，调用方退回完整重写（change.md）。
+"""
+import copy
+import re
+from typing import Optional, Set
+
+_EN_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+}
+_EN_ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+    "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14,
+}
+_ZH_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+_DAY_NUMBER = re.compile(r"\bday\s*(\d{1,2})\b|\bd(\d{1,2})\b|第\s*(\d{1,2})\s*[天日]", re.IGNORECASE)
+_DAY_WORD = re.compile(r"\bday\s+(" + "|".join(_EN_NUMBERS) + r")\b", re.IGNORECASE)
+_ORDINAL_DAY = re.compile(r"\b(" + "|".join(_EN_ORDINALS) + r"|last|final)\s+day\b", re.IGNORECASE)
+_ZH_DAY = re.compile(r"第\s*([一二两三四五六七八九十]{1,3})\s*[天日]|(最后一)[天日]")
+
+# 涉及住宿的需求只修改 accommodation
+_ACCOMMODATION_WORDS = ("hotel", "airbnb", "accommodation", "stay", "lodging", "hostel", "住宿", "酒店", "民宿", "旅馆")
+# 涉及整个行程的需求无法局部修改
+_GLOBAL_WORDS = (
+    "every day", "each day", "all days", "whole trip", "entire trip", "overall", "budget",
+    "cheaper", "more expensive", "destination", "more days", "fewer days", "extend",
+    "每天", "每一天", "整个", "全部", "所有", "预算", "目的地", "天数",
+)
+
+
+def _zh_number(text: str) -> int:
+    if text == "十":
+        return 10
+    if text.startswith("十"):
+        return 10 + _ZH_DIGITS.get(text[1:], 0)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return _ZH_DIGITS.get(tens, 0) * 10 + _ZH_DIGITS.get(ones, 0)
+    return _ZH_DIGITS.get(text, 0)
+
+
+def find_referenced_days(requirement: str, num_days: int) -> Set[int]:
+    """提取需求中提到的天数（Day 3 / day three / third day / 第3天 / 第三天 / 最后一天）"""
+    days = set()
+    for match in _DAY_NUMBER.finditer(requirement):
+        days.add(int(next(group for group in match.groups() if group)))
+    for match in _DAY_WORD.finditer(requirement):
+        days.add(_EN_NUMBERS[match.group(1).lower()])
+    for match in _ORDINAL_DAY.finditer(requirement):
+        word = match.group(1).lower()
+        days.add(num_days if word in ("last", "final") else _EN_ORDINALS[word])
+    for match in _ZH_DAY.finditer(requirement):
+        days.add(num_days if match.group(2) else _zh_number(match.group(1)))
+    return days
+
+
+class RevisionScope:
+    def __init__(self, days: Set[int], accommodation: bool = False):
+        self.days = days
+        self.accommodation = accommodation
+
+    def describe(self) -> str:
+        parts = [f"Day {day}" for day in sorted(self.days)]
+        if self.accommodation:
+            parts.append("accommodation")
+        return ", ".join(parts)
+
+
+def classify_revision(requirement: str, itinerary: dict, num_days: int, destination: str) -> Optional[RevisionScope]:
+    """判断修改范围，无法局部修改时返回 None"""
+    text = (requirement or "").lower()
+    if not text.strip():
+        return None
+
+    overview = itinerary.get("trip_overview") or {}
+    existing_days = {day.get("day") for day in itinerary.get("daily_itinerary") or []}
+    # 天数或目的地变化需要完整重写
+    if len(existing_days) != num_days:
+        return None
+    if str(overview.get("destination", "")).strip().lower() not in ("", destination.strip().lower()):
+        return None
+    if any(word in text for word in _GLOBAL_WORDS):
+        return None
+
+    days = find_referenced_days(text, num_days)
+    accommodation = any(word in text for word in _ACCOMMODATION_WORDS)
+    if not days and not accommodation:
+        return None
+    if not days <= existing_days:
+        return None
+    return RevisionScope(days, accommodation)
+
+
+def summarize_itinerary(itinerary: dict, scope: RevisionScope) -> str:
+    """不在修改范围内的部分压缩为摘要，供模型保持整体一致、避免重复安排"""
+    lines = []
+    for day in itinerary.get("daily_itinerary") or []:
+        if day.get("day") in scope.days:
+            continue
+        names = "; ".join(activity.get("activity_name", "") for activity in day.get("activities") or [])
+        lines.append(f"- Day {day.get('day')}: {day.get('day_summary', '')} | {names}")
+    if not scope.accommodation:
+        for acc in itinerary.get("accommodation") or []:
+            lines.append(f"- Accommodation: {acc.get('name', '')} ({acc.get('address', '')})")
+    return "\n".join(lines) or "- (none)"
+
+
+def build_revision_slice(itinerary: dict, scope: RevisionScope) -> dict:
+    """需要重写的部分：涉及的天、住宿（如涉及）以及用于保持总额一致的预算"""
+    selected = {
+        "daily_itinerary": [day for day in itinerary.get("daily_itinerary") or [] if day.get("day") in scope.days],
+        "budget_breakdown": itinerary.get("budget_breakdown") or {},
+    }
+    if scope.accommodation:
+        selected["accommodation"] = itinerary.get("accommodation") or []
+    return selected
+
+
+def merge_revision(itinerary: dict, patch: dict, scope: RevisionScope) -> dict:
+    """把补丁合并回原行程，只替换修改范围内的部分"""
+    merged = copy.deepcopy(itinerary)
+    patched_days = {
+        day.get("day"): day for day in patch.get("daily_itinerary") or []
+        if isinstance(day, dict) and day.get("day") in scope.days
+    }
+    merged["daily_itinerary"] = [
+        patched_days.get(day.get("day"), day) for day in merged.get("daily_itinerary") or []
+    ]
+    if scope.accommodation and isinstance(patch.get("accommodation"), list):
+        merged["accommodation"] = patch["accommodation"]
+    if isinstance(patch.get("budget_breakdown"), dict):
+        merged["budget_breakdown"] = patch["budget_breakdown"]
+    return merged
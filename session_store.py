@@ -0,0 +1,92 @@
+"""
+按会话保存的行程状态
+
+替代进程全局的 temp_output：每个会话的最新行程 JSON 按 session_id 保存，
+修改行程（first_complete_flag != 0）时取回调用方自己的上一版行程。
+
+- 内存 LRU + TTL 作为第一层
+- 可选持久层（SESSION_STORE_URL）：
+    - 未设置：SQLite，默认路径 .cache/sessions.sqlite3，同一台机器的多个 worker 共享
+    - redis://...：Redis 或兼容协议的服务，多台机器共享
+    - memory：仅内存
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from cache_utils import RedisTTLCache, SQLiteTTLCache, TTLCache
+
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_MEMORY_SIZE = int(os.getenv("SESSION_MEMORY_SIZE", "1024"))
+
+
+def _create_backend(url: str, ttl: float):
+    try:
+        if url == "memory":
+            return None
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RedisTTLCache(url, prefix="itinerary_session", ttl=ttl)
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else ".cache/sessions.sqlite3"
+        return SQLiteTTLCache(path, table="itinerary_sessions", ttl=ttl)
+    except (ImportError, sqlite3.Error, OSError) as e:
+        print(f"会话持久层不可用，仅使用内存存储: {e}")
+        return None
+
+
+class ItineraryStateStore:
+    def __init__(self, maxsize: int = 1024, ttl: float = 24 * 3600, backend=None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.backend = backend
+
+    async def get(self, session_id: Optional[str]) -> Optional[dict]:
+        """
+        返回会话状态 {"itinerary": 行程 JSON 文本, "updated_at": 时间戳}，不存在时返回 None
+        """
+        if not session_id:
+            return None
+        state = self.memory.get(session_id)
+        if state is None and self.backend is not None:
+            try:
+                state = await asyncio.to_thread(self.backend.get, session_id)
+            except Exception as e:
+                print(f"读取会话状态失败 {session_id}: {e}")
+                return None
+            if state is not None:
+                self.memory.set(session_id, state)
+        return state
+
+    async def get_itinerary(self, session_id: Optional[str]) -> str:
+        state = await self.get(session_id)
+        return state["itinerary"] if state else ""
+
+    async def save(self, session_id: Optional[str], itinerary: str):
+        """保存会话的最新行程，每次写入都会刷新 TTL"""
+        if not session_id:
+            return
+        state = {"itinerary": itinerary, "updated_at": time.time()}
+        self.memory.set(session_id, state)
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, session_id, state)
+            except Exception as e:
+                print(f"写入会话状态失败 {session_id}: {e}")
+
+    async def delete(self, session_id: str):
+        self.memory.delete(session_id)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.delete, session_id)
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+
+session_store = ItineraryStateStore(
+    maxsize=SESSION_MEMORY_SIZE,
+    ttl=SESSION_TTL,
+    backend=_create_backend(SESSION_STORE_URL, SESSION_TTL),
+)
@@ -0,0 +1,87 @@
+"""
+进行中请求合并（single-flight）
+
+相同 key 的并发调用只执行一次，其余调用方等待同一个 future：
+- 共享的执行在独立任务中运行，某个调用方断开（被取消）不影响其他调用方
+- 每次执行分配一个进度分组 ID，执行过程中发往该分组的进度事件会转发到
+  每个调用方自己的 request_id（后加入的调用方会先收到之前的事件）
+- 执行过程中通过 emit 发出的结构化事件（如流式生成的每日行程）同样分发给每个调用方，并为后加入者回放
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from progress import progress_manager
+
+
+class _Flight:
+    def __init__(self, group_id: str):
+        self.group_id = group_id
+        self.future: Optional[asyncio.Future] = None
+        self.handlers: List[Callable] = []
+        self.events: List[tuple] = []
+
+    def emit(self, *args):
+        self.events.append(args)
+        for handler in list(self.handlers):
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"分发合并请求事件失败: {e}")
+
+    def subscribe(self, handler: Callable):
+        for args in self.events:
+            handler(*args)
+        self.handlers.append(handler)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+
+    def make_key(self, *parts) -> str:
+        """把规范化后的参数序列化为 key"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def do(self, key: str, func: Callable[[str, Callable], Awaitable[Any]],
+                 request_id: Optional[str] = None, on_event: Optional[Callable] = None):
+        """
+        执行或加入相同 key 的进行中调用
+
+        Args:
+            func: func(group_id, emit)，group_id 作为进度的 request_id 使用，emit 分发结构化事件
+            request_id: 调用方自己的进度 ID
+            on_event: 调用方的结构化事件回调
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(f"{self.name}:{key}")
+            self._flights[key] = flight
+
+            async def run():
+                try:
+                    return await func(flight.group_id, flight.emit)
+                finally:
+                    self._flights.pop(key, None)
+
+            flight.future = asyncio.ensure_future(run())
+        else:
+            print(f"合并进行中的请求: {flight.group_id}")
+
+        if request_id:
+            progress_manager.join(flight.group_id, request_id)
+        if on_event:
+            flight.subscribe(on_event)
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            if request_id:
+                progress_manager.leave(flight.group_id, request_id)
+            if on_event and on_event in flight.handlers:
+                flight.handlers.remove(on_event)
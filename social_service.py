@@ -1,13 +1,144 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import isodate
 
+from keyword_matcher import estimate_popularity, estimate_popularity_batch
+from singleflight import SingleFlight
+
+VIDEOS_LIST_MAX_IDS = 50
+CSE_QUERY_TIMEOUT = float(os.getenv("CSE_QUERY_TIMEOUT", "8"))
+# 所有请求共享的 Custom Search 并发上限
+_cse_semaphore = asyncio.Semaphore(int(os.getenv("CSE_MAX_CONCURRENCY", "6")))
+
+# 不同请求发出的相同搜索（同一查询、同一参数）在进行中时只执行一次
+_search_flights = SingleFlight("social_search")
+
+# 进程级缓存的 discovery 客户端：(服务名, 版本, API key) -> Resource
+_service_cache = {}
+_service_lock = threading.Lock()
+# httplib2.Http 不是线程安全的，每个线程使用独立的连接对象
+_thread_local = threading.local()
+
+
+def get_google_service(name: str, version: str, api_key: str):
+    """
+    获取缓存的 googleapiclient 服务对象
+
+    使用库内置的静态 discovery 文档构建，不再每次请求下载和解析 discovery JSON。
+    """
+    key = (name, version, api_key)
+    service = _service_cache.get(key)
+    if service is None:
+        with _service_lock:
+            service = _service_cache.get(key)
+            if service is None:
+                service = build(name, version, developerKey=api_key,
+                                static_discovery=True, cache_discovery=False)
+                _service_cache[key] = service
+    return service
+
+
+def warm_google_services(api_key: str):
+    """应用启动时预先构建 YouTube 和 Custom Search 客户端"""
+    if not api_key:
+        return
+    get_google_service('youtube', 'v3', api_key)
+    get_google_service('customsearch', 'v1', api_key)
+
+
+# 不影响内容的跟踪参数，规范化 URL 时去掉
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "si", "feature", "is_from_webapp", "sender_device", "ref"}
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化链接：统一大小写/协议，去掉 www.、m.、片段、跟踪参数和末尾斜杠，查询参数排序"""
+    parts = urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = parts.path.rstrip("/") or "/"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in _TRACKING_PARAMS and not k.startswith("utm_")]
+
+    # youtu.be/<id> 与 youtube.com/watch?v=<id> 指向同一视频
+    if host == "youtu.be" and path != "/":
+        host, query, path = "youtube.com", [("v", path.lstrip("/"))], "/watch"
+
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """从 YouTube 视频链接中取出 videoId，不是视频链接时返回 None"""
+    parts = urlsplit(canonicalize_url(url))
+    if parts.hostname != "youtube.com" or parts.path != "/watch":
+        return None
+    return dict(parse_qsl(parts.query)).get("v") or None
+
+
+def stable_post_id(url: str) -> str:
+    """
+    确定性帖子 ID，跨进程、跨重启保持一致
+
+    YouTube 视频沿用 youtube_<videoId>（客户端已按此保存），
+    其他链接只取规范化 URL 的摘要，不带平台前缀：各个搜索轮次对同一链接
+    判定的平台可能不同（website / tripadvisor / travel_blog），ID 必须相同才能去重
+    """
+    video_id = youtube_video_id(url)
+    if video_id:
+        return f"youtube_{video_id}"
+    return hashlib.blake2b(canonicalize_url(url).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _thread_http(timeout: float) -> httplib2.Http:
+    """当前线程按 socket 超时区分的 Http 连接对象"""
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None:
+        clients = _thread_local.clients = {}
+    http = clients.get(timeout)
+    if http is None:
+        http = clients[timeout] = httplib2.Http(timeout=timeout)
+    return http
+
+
+def execute_request(request, timeout: float = 15):
+    """在当前线程的独立 Http 连接上执行 API 请求（线程安全）"""
+    return request.execute(http=_thread_http(timeout))
+
+
+async def run_request(request, timeout: float = 15):
+    """在线程池中执行 API 请求，避免阻塞事件循环；timeout 为 socket 超时"""
+    return await asyncio.to_thread(execute_request, request, timeout)
+
+
+def _release_cse_slot(request: asyncio.Future):
+    _cse_semaphore.release()
+    if not request.cancelled():
+        request.exception()  # 超时后才失败的请求无人等待，在此取走异常
+
 
 class YouTubeService:
     def __init__(self, api_key: str):
-        self.youtube = build('youtube', 'v3', developerKey=api_key)
+        self.youtube = get_google_service('youtube', 'v3', api_key)
 
     async def search_travel_videos(self, destination: str, categorytags: list[str], max_results: int = 10):
+        """
+        搜索旅行相关视频，相同参数的并发搜索合并为一次
+        """
+        key = _search_flights.make_key("youtube", destination, categorytags, max_results)
+        return await _search_flights.do(
+            key, lambda progress_id, emit: self._search_travel_videos(destination, categorytags, max_results)
+        )
+
+    async def _search_travel_videos(self, destination: str, categorytags: list[str], max_results: int = 10):
         """
         搜索旅行相关视频 - 保持原有逻辑，添加按播放量排序
         """
@@ -19,54 +150,56 @@ class YouTubeService:
             search_query = f"{destination} travel guide {tags}"
             # 执行搜索 - 保持原有逻辑
             print("开始搜索")
-            search_response = self.youtube.search().list(
-                q=search_query,
-                part='id,snippet',
-                type='video',
-                maxResults=max_results * 2,  # 获取更多结果用于排序
-                relevanceLanguage='en',
-                order='relevance'
-            ).execute()
+            search_response = await run_request(
+                self.youtube.search().list(
+                    q=search_query,
+                    part='id,snippet',
+                    type='video',
+                    maxResults=max_results * 2,  # 获取更多结果用于排序
+                    relevanceLanguage='en',
+                    order='relevance'
+                )
+            )
             print(search_response)
+            items = [item for item in search_response.get('items', [])
+                     if item['id']['kind'] == 'youtube#video']
+
+            # 批量获取视频详情（包括时长），每次最多 50 个 ID
+            video_ids = [item['id']['videoId'] for item in items]
+            details_by_id = await self.get_video_details(video_ids)
+
             videos = []
-            for item in search_response.get('items', []):
-                if item['id']['kind'] == 'youtube#video':
-                    video_id = item['id']['videoId']
-
-                    # 获取视频详情（包括时长）
-                    video_response = self.youtube.videos().list(
-                        part='contentDetails,statistics',
-                        id=video_id
-                    ).execute()
-
-                    if video_response['items']:
-                        video_details = video_response['items'][0]
-
-                        # 解析时长
-                        duration = video_details['contentDetails']['duration']
-                        duration_str = self.parse_duration(duration)
-
-                        # 获取统计数据
-                        stats = video_details.get('statistics', {})
-                        like_count = stats.get('likeCount', '0')
-                        view_count = stats.get('viewCount', '0')
-
-                        # 格式化点赞数
-                        likes = self.format_count(like_count)
-
-                        video_data = {
-                            'video_id': video_id,
-                            'title': item['snippet']['title'],
-                            'description': item['snippet']['description'],
-                            'thumbnail': item['snippet']['thumbnails']['high']['url'],
-                            'channel_title': item['snippet']['channelTitle'],
-                            'duration': duration_str,
-                            'likes': likes,
-                            'views': view_count,
-                            'view_count': int(view_count) if view_count.isdigit() else 0,  # 添加用于排序的字段
-                            'published_at': item['snippet']['publishedAt']
-                        }
-                        videos.append(video_data)
+            for item in items:
+                video_id = item['id']['videoId']
+                video_details = details_by_id.get(video_id)
+                if not video_details:
+                    continue
+
+                # 解析时长
+                duration = video_details['contentDetails']['duration']
+                duration_str = self.parse_duration(duration)
+
+                # 获取统计数据
+                stats = video_details.get('statistics', {})
+                like_count = stats.get('likeCount', '0')
+                view_count = stats.get('viewCount', '0')
+
+                # 格式化点赞数
+                likes = self.format_count(like_count)
+
+                video_data = {
+                    'video_id': video_id,
+                    'title': item['snippet']['title'],
+                    'description': item['snippet']['description'],
+                    'thumbnail': item['snippet']['thumbnails']['high']['url'],
+                    'channel_title': item['snippet']['channelTitle'],
+                    'duration': duration_str,
+                    'likes': likes,
+                    'views': view_count,
+                    'view_count': int(view_count) if view_count.isdigit() else 0,  # 添加用于排序的字段
+                    'published_at': item['snippet']['publishedAt']
+                }
+                videos.append(video_data)
 
             # 新增：按播放量排序，取前 max_results 个
             videos_sorted = sorted(videos, key=lambda x: x['view_count'], reverse=True)[:max_results]
@@ -79,6 +212,26 @@ class YouTubeService:
             print(f"YouTube search error: {e}")
             return []
 
+    async def get_video_details(self, video_ids: list[str]) -> dict:
+        """
+        批量获取视频详情，videos.list 每次最多接受 50 个 ID
+
+        Returns:
+            dict: video_id -> 视频详情
+        """
+        pages = [video_ids[i:i + VIDEOS_LIST_MAX_IDS] for i in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS)]
+        responses = await asyncio.gather(*[
+            run_request(
+                self.youtube.videos().list(
+                    part='contentDetails,statistics',
+                    id=','.join(page),
+                    maxResults=len(page)
+                )
+            )
+            for page in pages
+        ])
+        return {video['id']: video for response in responses for video in response.get('items', [])}
+
     def parse_duration(self, duration):
         """解析 ISO 8601 时长格式"""
         try:
@@ -117,7 +270,7 @@ class GoogleSearchService:
             tags = ""
             for tag in categorytags:
                 tags += f" {tag}"
-            service = build("customsearch", "v1", developerKey=self.api_key)
+            service = get_google_service("customsearch", "v1", self.api_key)
 
             # TikTok 只搜索包含 /video/ 的链接
             sites_to_search = [
@@ -133,57 +286,11 @@ class GoogleSearchService:
                 f"site:lonelyplanet.com {destination} travel guide {tags}",
             ]
 
-            all_results = []
-            for site_query in sites_to_search[:3]:  # 限制查询数量
-                try:
-                    result = service.cse().list(
-                        q=site_query,
-                        cx=self.search_engine_id,
-                        num=min(3, max_results)  # 每次查询限制结果数
-                    ).execute()
-
-                    for item in result.get('items', []):
-                        # 确定平台 - 保持原有逻辑
-                        platform = "website"
-                        link = item.get('link', '')
-
-                        # TikTok 平台检测和过滤
-                        if 'tiktok.com' in link:
-                            # 只接受包含 /video/ 的 TikTok 链接
-                            if '/video/' not in link:
-                                continue  # 跳过非视频链接
-                            platform = "tiktok"
-                        elif 'youtube.com' in link:
-                            platform = "youtube"
-                        elif 'instagram.com' in link:
-                            platform = "instagram"
-                        elif 'tripadvisor.com' in link:
-                            platform = "tripadvisor"
-                        elif 'lonelyplanet.com' in link:
-                            platform = "lonelyplanet"
-
-                        # 获取缩略图 - 保持原有逻辑
-                        thumbnail = ""
-                        if item.get('pagemap'):
-                            if item['pagemap'].get('cse_thumbnail'):
-                                thumbnail = item['pagemap']['cse_thumbnail'][0].get('src', '')
-                            elif item['pagemap'].get('cse_image'):
-                                thumbnail = item['pagemap']['cse_image'][0].get('src', '')
-
-                        search_result = {
-                            'title': item.get('title', ''),
-                            'link': link,
-                            'snippet': item.get('snippet', ''),
-                            'platform': platform,
-                            'thumbnail': thumbnail,
-                            # 新增：估算热度用于排序
-                            'popularity_score': self.estimate_popularity(item.get('title', ''), item.get('snippet', ''))
-                        }
-                        all_results.append(search_result)
-
-                except Exception as e:
-                    print(f"搜索 {site_query} 失败: {e}")
-                    continue
+            all_results = await self._run_queries(
+                service, sites_to_search[:3],  # 限制查询数量
+                num=min(3, max_results),  # 每次查询限制结果数
+                parse_item=self._parse_site_item
+            )
 
             # 新增：按平台分组并均衡选择
             balanced_results = self.balance_platforms(all_results, max_results)
@@ -202,7 +309,7 @@ class GoogleSearchService:
         搜索一般的旅行相关内容 - TikTok 只搜索包含 /video/ 的链接
         """
         try:
-            service = build("customsearch", "v1", developerKey=self.api_key)
+            service = get_google_service("customsearch", "v1", self.api_key)
 
             # 修改查询：TikTok 只搜索包含 /video/ 的链接
             queries = [
@@ -212,52 +319,11 @@ class GoogleSearchService:
                 f"{destination} itinerary travel tips"
             ]
 
-            all_results = []
-            for query in queries[:2]:
-                try:
-                    result = service.cse().list(
-                        q=query,
-                        cx=self.search_engine_id,
-                        num=min(5, max_results)
-                    ).execute()
-
-                    for item in result.get('items', []):
-                        link = item.get('link', '')
-
-                        # 跳过不相关的网站 - 保持原有逻辑
-                        if any(skip in link for skip in ['wikipedia.org', 'booking.com', 'agoda.com']):
-                            continue
-
-                        platform = "travel_blog"
-                        if 'youtube.com' in link:
-                            platform = "youtube"
-                        elif 'tiktok.com' in link:
-                            # 只接受包含 /video/ 的 TikTok 链接
-                            if '/video/' not in link:
-                                continue  # 跳过非视频链接
-                            platform = "tiktok"
-                        elif 'instagram.com' in link:
-                            platform = "instagram"
-
-                        thumbnail = ""
-                        if item.get('pagemap'):
-                            if item['pagemap'].get('cse_thumbnail'):
-                                thumbnail = item['pagemap']['cse_thumbnail'][0].get('src', '')
-
-                        search_result = {
-                            'title': item.get('title', ''),
-                            'link': link,
-                            'snippet': item.get('snippet', ''),
-                            'platform': platform,
-                            'thumbnail': thumbnail,
-                            # 新增：估算热度用于排序
-                            'popularity_score': self.estimate_popularity(item.get('title', ''), item.get('snippet', ''))
-                        }
-                        all_results.append(search_result)
-
-                except Exception as e:
-                    print(f"搜索 {query} 失败: {e}")
-                    continue
+            all_results = await self._run_queries(
+                service, queries[:2],
+                num=min(5, max_results),
+                parse_item=self._parse_general_item
+            )
 
             # 新增：按热度排序
             sorted_results = sorted(all_results, key=lambda x: x['popularity_score'], reverse=True)
@@ -267,6 +333,126 @@ class GoogleSearchService:
             print(f"General Google Search error: {e}")
             return []
 
+    async def _run_query(self, service, query: str, num: int):
+        """执行单个查询，相同查询在进行中时合并"""
+        key = _search_flights.make_key("cse", self.search_engine_id, query, num)
+        return await _search_flights.do(key, lambda progress_id, emit: self._execute_query(service, query, num))
+
+    async def _execute_query(self, service, query: str, num: int):
+        """
+        在共享并发限制下执行单个查询，超时或失败时返回空结果
+
+        wait_for 超时无法中止线程池中的请求：并发名额在线程真正结束后才归还，
+        socket 超时与 CSE_QUERY_TIMEOUT 一致，保证超时的线程也会很快结束
+        """
+        await _cse_semaphore.acquire()
+        request = asyncio.ensure_future(run_request(
+            service.cse().list(q=query, cx=self.search_engine_id, num=num),
+            timeout=CSE_QUERY_TIMEOUT
+        ))
+        request.add_done_callback(_release_cse_slot)
+        try:
+            return await asyncio.wait_for(asyncio.shield(request), timeout=CSE_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"搜索 {query} 超时")
+        except Exception as e:
+            print(f"搜索 {query} 失败: {e}")
+        return {}
+
+    async def _run_queries(self, service, queries: list[str], num: int, parse_item):
+        """并发执行所有查询，按完成顺序合并结果，慢查询不会阻塞其他结果"""
+        tasks = [asyncio.ensure_future(self._run_query(service, query, num)) for query in queries]
+        all_results = []
+        seen = set()
+        for future in asyncio.as_completed(tasks):
+            result = await future
+            for item in result.get('items', []):
+                search_result = parse_item(item)
+                # 不同查询可能返回同一链接，按规范化 URL 去重
+                if search_result is None or search_result['canonical_url'] in seen:
+                    continue
+                seen.add(search_result['canonical_url'])
+                all_results.append(search_result)
+
+        # 估算热度用于排序，整批结果一次匹配
+        scores = estimate_popularity_batch([(r['title'], r['snippet']) for r in all_results])
+        for search_result, score in zip(all_results, scores):
+            search_result['popularity_score'] = score
+        return all_results
+
+    def _parse_site_item(self, item: dict):
+        """解析站点搜索结果，返回 None 表示跳过"""
+        # 确定平台 - 保持原有逻辑
+        platform = "website"
+        link = item.get('link', '')
+
+        # TikTok 平台检测和过滤
+        if 'tiktok.com' in link:
+            # 只接受包含 /video/ 的 TikTok 链接
+            if '/video/' not in link:
+                return None  # 跳过非视频链接
+            platform = "tiktok"
+        elif 'youtube.com' in link:
+            platform = "youtube"
+        elif 'instagram.com' in link:
+            platform = "instagram"
+        elif 'tripadvisor.com' in link:
+            platform = "tripadvisor"
+        elif 'lonelyplanet.com' in link:
+            platform = "lonelyplanet"
+
+        # 获取缩略图 - 保持原有逻辑
+        thumbnail = ""
+        if item.get('pagemap'):
+            if item['pagemap'].get('cse_thumbnail'):
+                thumbnail = item['pagemap']['cse_thumbnail'][0].get('src', '')
+            elif item['pagemap'].get('cse_image'):
+                thumbnail = item['pagemap']['cse_image'][0].get('src', '')
+
+        search_result = {
+            'title': item.get('title', ''),
+            'link': link,
+            'canonical_url': canonicalize_url(link),
+            'snippet': item.get('snippet', ''),
+            'platform': platform,
+            'thumbnail': thumbnail,
+        }
+        return search_result
+
+    def _parse_general_item(self, item: dict):
+        """解析一般搜索结果，返回 None 表示跳过"""
+        link = item.get('link', '')
+
+        # 跳过不相关的网站 - 保持原有逻辑
+        if any(skip in link for skip in ['wikipedia.org', 'booking.com', 'agoda.com']):
+            return None
+
+        platform = "travel_blog"
+        if 'youtube.com' in link:
+            platform = "youtube"
+        elif 'tiktok.com' in link:
+            # 只接受包含 /video/ 的 TikTok 链接
+            if '/video/' not in link:
+                return None  # 跳过非视频链接
+            platform = "tiktok"
+        elif 'instagram.com' in link:
+            platform = "instagram"
+
+        thumbnail = ""
+        if item.get('pagemap'):
+            if item['pagemap'].get('cse_thumbnail'):
+                thumbnail = item['pagemap']['cse_thumbnail'][0].get('src', '')
+
+        search_result = {
+            'title': item.get('title', ''),
+            'link': link,
+            'canonical_url': canonicalize_url(link),
+            'snippet': item.get('snippet', ''),
+            'platform': platform,
+            'thumbnail': thumbnail,
+        }
+        return search_result
+
     def debug_platform_distribution(self, results):
         """
         调试平台分布
@@ -340,36 +526,4 @@ class GoogleSearchService:
         """
         估算内容热度（基于标题和描述中的关键词）
         """
-        text = (title + " " + snippet).lower()
-
-        # 热度关键词
-        hot_keywords = [
-            'viral', 'popular', 'trending', 'must-see', 'best', 'top',
-            'amazing', 'incredible', 'awesome', 'fantastic', 'recommended',
-            'most viewed', 'most liked', 'go viral'
-        ]
-
-        # 互动关键词
-        engagement_keywords = [
-            'like', 'share', 'comment', 'views', 'follow', 'subscribe',
-            'million', 'thousand', 'k views'
-        ]
-
-        score = 0
-
-        # 检查热度关键词
-        for keyword in hot_keywords:
-            if keyword in text:
-                score += 10
-
-        # 检查互动关键词
-        for keyword in engagement_keywords:
-            if keyword in text:
-                score += 5
-
-        # 标题长度适中加分
-        title_length = len(title)
-        if 20 <= title_length <= 80:
-            score += 5
-
-        return score
\ No newline at end of file
+        return estimate_popularity(title, snippet)
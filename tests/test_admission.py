@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionController
+from progress import progress_manager
+
+
+async def attempt(controller, user_id, hold, request_id=None, started=None):
+    try:
+        async with controller.admit(user_id, request_id):
+            if started is not None:
+                started.append(user_id)
+            await hold.wait()
+        return "ok"
+    except HTTPException as e:
+        return e.status_code
+
+
+def test_anonymous_callers_are_not_one_user():
+    async def main():
+        controller = AdmissionController(max_concurrent=4, per_user_limit=2)
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(attempt(controller, None, hold)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        running = controller.running
+        hold.set()
+        return running, await asyncio.gather(*tasks)
+
+    running, results = asyncio.run(main())
+    assert running == 4
+    assert results == ["ok"] * 4
+
+
+def test_per_user_limit_returns_429_with_retry_after():
+    async def main():
+        controller = AdmissionController(max_concurrent=4, per_user_limit=2)
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(attempt(controller, "alice", hold)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            controller.check("alice")
+        controller.check("bob")
+        hold.set()
+        await asyncio.gather(*tasks)
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_full_queue_returns_503():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_waiting=1, max_wait_seconds=1000)
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(attempt(controller, f"user-{i}", hold)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        hold.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == ["ok", "ok", 503]
+
+
+def test_waiters_are_released_fairly_and_told_their_position():
+    async def main():
+        controller = AdmissionController(max_concurrent=2, per_user_limit=3, max_wait_seconds=1000)
+        alice_hold, carol_hold, queued_hold = asyncio.Event(), asyncio.Event(), asyncio.Event()
+        started = []
+        running = [
+            asyncio.ensure_future(attempt(controller, "alice", alice_hold, started=started)),
+            asyncio.ensure_future(attempt(controller, "carol", carol_hold, started=started)),
+        ]
+        await asyncio.sleep(0)
+        # alice 先排队，bob 后到；carol 结束时 alice 仍有运行中的请求，应先放行 bob
+        queued = [
+            asyncio.ensure_future(attempt(controller, "alice", queued_hold, request_id="adm-alice", started=started)),
+            asyncio.ensure_future(attempt(controller, "bob", queued_hold, request_id="adm-bob", started=started)),
+        ]
+        await asyncio.sleep(0.01)
+        carol_hold.set()
+        await asyncio.sleep(0.01)
+        after_carol = list(started)
+        alice_hold.set()
+        queued_hold.set()
+        await asyncio.gather(*running, *queued)
+        return after_carol, started
+
+    after_carol, started = asyncio.run(main())
+    assert after_carol == ["alice", "carol", "bob"]
+    assert started == ["alice", "carol", "bob", "alice"]
+    queue_events = [data for _, data in progress_manager._channel("adm-bob").since(0) if data["type"] == "queue"]
+    assert queue_events[0]["data"]["position"] == 2
+
+
+def test_wait_timeout_returns_503_and_frees_the_queue():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_wait_seconds=0.05, initial_run_seconds=0.01)
+        hold = asyncio.Event()
+        running = asyncio.ensure_future(attempt(controller, "alice", hold))
+        await asyncio.sleep(0)
+        result = await attempt(controller, "bob", hold)
+        waiting = len(controller.waiters)
+        hold.set()
+        await running
+        return result, waiting, controller.running
+
+    assert asyncio.run(main()) == (503, 0, 0)
+
+
+def test_default_concurrency_fits_the_mcp_pool():
+    from admission import admission_controller
+    from mcp_pool import travel_mcp_pool
+
+    assert admission_controller.max_concurrent <= travel_mcp_pool.size
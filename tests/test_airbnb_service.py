@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+
+import airbnb_service
+import http_client
+from cache_utils import TTLCache, TieredCache
+
+LISTING_HTML = (
+    '<html><head><script type="application/ld+json">{"@type": "Product"}</script>'
+    '<script type="application/ld+json">{"image": ["https://img/1.jpg", "https://img/2.jpg"]}</script>'
+    '</head><body>' + "x" * 10000 + '</body></html>'
+)
+
+
+def setup(monkeypatch, handler):
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(airbnb_service, "listing_cache", TieredCache(TTLCache()))
+    monkeypatch.setattr(airbnb_service, "_host_semaphores", {})
+
+
+def test_invalid_listing_url_does_not_fail_the_batch(monkeypatch):
+    setup(monkeypatch, lambda request: httpx.Response(200, text=LISTING_HTML))
+    urls = ["https://www.airbnb.com/rooms/1", "https://www.airbnb.com:notaport/rooms/2", "not a url"]
+
+    results = asyncio.run(airbnb_service.get_airbnb_images_many(urls))
+
+    assert results == [["https://img/1.jpg"], [], []]
+    assert airbnb_service.listing_cache.get(urls[1]) is None
+
+
+def test_http_errors_are_not_cached(monkeypatch):
+    setup(monkeypatch, lambda request: httpx.Response(503))
+    url = "https://www.airbnb.com/rooms/1"
+
+    assert asyncio.run(airbnb_service.get_airbnb_images(url)) == []
+    assert airbnb_service.listing_cache.get(url) is None
+
+
+def test_scanner_handles_tags_split_across_chunks():
+    scanner = airbnb_service.JsonLdImageScanner()
+    chunks = [LISTING_HTML[i:i + 7] for i in range(0, len(LISTING_HTML), 7)]
+    found = next(images for images in map(scanner.feed, chunks) if images)
+    assert found == ["https://img/1.jpg", "https://img/2.jpg"]
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from cache_utils import SQLiteTTLCache, SWRCache, TTLCache, TieredCache
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=-1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    cache.set("c", 3)
+    cache.set("d", 4)
+    assert "a" not in cache
+    assert cache.get("d") == 4
+
+
+def test_sqlite_cache_reports_remaining_ttl(tmp_path):
+    disk = SQLiteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=3600)
+    disk.set("key", {"value": 1}, ttl=100)
+
+    value, remaining = disk.get_with_ttl("key")
+    assert value == {"value": 1}
+    assert 90 < remaining <= 100
+    assert disk.get_with_ttl("missing") == (None, None)
+    disk.close()
+
+
+def test_sqlite_cache_purges_expired_rows_on_write(tmp_path):
+    disk = SQLiteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=3600, purge_every=3)
+
+    def rows():
+        return disk._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    disk.set("old-1", 1, ttl=-1)
+    disk.set("old-2", 2, ttl=-1)
+    assert rows() == 2  # 过期但从未再次读取的条目仍在表中
+    disk.set("new", 3)
+    assert rows() == 1
+    assert disk.get("new") == 3
+    disk.close()
+
+def test_tiered_cache_backfills_memory_with_disk_ttl(tmp_path):
+    disk = SQLiteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=3600)
+    disk.set("miss", "", ttl=0.2)
+    # 模拟重启：内存层为空，条目只存在于磁盘
+    cache = TieredCache(TTLCache(ttl=30 * 24 * 3600), disk)
+
+    assert cache.get("miss") == ""
+    disk.delete("miss")
+    assert cache.get("miss") == ""  # 来自内存
+
+    time.sleep(0.3)
+    assert cache.get("miss") is None
+    disk.close()
+
+
+def test_tiered_cache_set_caps_memory_ttl(tmp_path):
+    disk = SQLiteTTLCache(str(tmp_path / "cache.sqlite3"), ttl=3600)
+    cache = TieredCache(TTLCache(ttl=0.1), disk)
+    cache.set("key", "value", ttl=3600)
+
+    time.sleep(0.2)
+    assert cache.memory.get("key") is None
+    assert cache.get("key") == "value"
+    disk.close()
+
+
+def test_swr_cache_coalesces_misses_and_serves_stale():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        cache = SWRCache(fresh_ttl=0.05, stale_ttl=60)
+        first = await asyncio.gather(*[cache.get_or_fetch("key", fetch) for _ in range(5)])
+        await asyncio.sleep(0.06)
+        stale = await cache.get_or_fetch("key", fetch)  # 返回旧值并在后台刷新
+        await asyncio.sleep(0.03)
+        refreshed = await cache.get_or_fetch("key", fetch)
+        return first, stale, refreshed
+
+    first, stale, refreshed = asyncio.run(main())
+    assert first == [1] * 5
+    assert (stale, refreshed) == (1, 2)
+    assert len(calls) == 2
+
+
+def test_swr_cache_keeps_degraded_results_briefly():
+    results = iter(["fallback", "real"])
+
+    async def fetch():
+        return next(results)
+
+    async def main():
+        cache = SWRCache(fresh_ttl=60, is_degraded=lambda value: value == "fallback", degraded_ttl=0.05)
+        first = await cache.get_or_fetch("key", fetch)
+        cached = await cache.get_or_fetch("key", fetch)
+        await asyncio.sleep(0.06)
+        after_expiry = await cache.get_or_fetch("key", fetch)
+        return first, cached, after_expiry
+
+    assert asyncio.run(main()) == ("fallback", "fallback", "real")
+
+
+def test_swr_cache_degraded_refresh_keeps_good_value():
+    results = iter(["real", "fallback", "fallback"])
+
+    async def fetch():
+        return next(results)
+
+    async def main():
+        cache = SWRCache(fresh_ttl=0.01, stale_ttl=60, is_degraded=lambda value: value == "fallback")
+        await cache.get_or_fetch("key", fetch)
+        await asyncio.sleep(0.02)
+        stale = await cache.get_or_fetch("key", fetch)  # 后台刷新得到降级内容
+        await asyncio.sleep(0.01)
+        return stale, await cache.get_or_fetch("key", fetch)
+
+    assert asyncio.run(main()) == ("real", "real")
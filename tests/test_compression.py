@@ -0,0 +1,85 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware
+
+LARGE = "itinerary " * 500
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse(LARGE, headers={"Vary": "Origin"})
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/events")
+    async def events():
+        async def stream():
+            for _ in range(3):
+                yield f"data: {LARGE}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/chunks")
+    async def chunks():
+        async def stream():
+            for _ in range(3):
+                yield LARGE
+        return StreamingResponse(stream(), media_type="text/plain")
+
+    @app.get("/encoded")
+    async def encoded():
+        return Response(gzip.compress(LARGE.encode()), headers={"Content-Encoding": "gzip"})
+
+    return TestClient(app)
+
+
+def test_gzip_when_accepted():
+    response = make_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(LARGE)
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert response.text == LARGE
+
+
+def test_no_compression_without_accept_encoding():
+    response = make_client().get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == LARGE
+
+
+def test_brotli_preferred_only_when_installed(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression._choose_encoding("br") is None
+    assert compression._choose_encoding("br;q=1.0, gzip;q=0.8") == "gzip"
+    response = make_client().get("/large", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_small_responses_are_not_compressed():
+    response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
+
+
+def test_streaming_responses_pass_through():
+    client = make_client()
+    for path, expected in (("/events", f"data: {LARGE}\n\n" * 3), ("/chunks", LARGE * 3)):
+        with client.stream("GET", path, headers={"Accept-Encoding": "gzip"}) as response:
+            assert "content-encoding" not in response.headers
+            assert b"".join(response.iter_raw()).decode() == expected
+
+
+def test_already_encoded_responses_are_not_compressed_twice():
+    response = make_client().get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == LARGE
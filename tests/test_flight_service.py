@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+from flight_service import SimpleFlightService
+
+
+class FakeOffers:
+    def __init__(self, fail_origin=None, delay=0.0):
+        self.calls = []
+        self.fail_origin = fail_origin
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def get(self, originLocationCode, destinationLocationCode, departureDate, adults, **kwargs):
+        with self.lock:
+            self.calls.append((originLocationCode, destinationLocationCode, departureDate, adults))
+        time.sleep(self.delay)
+        if originLocationCode == self.fail_origin:
+            raise ConnectionError("amadeus unreachable")
+        offer = {"price": {"total": "100.00"}, "origin": originLocationCode}
+
+        class Response:
+            data = [offer]
+        return Response()
+
+
+def make_service(cache_ttl=900, **kwargs):
+    service = SimpleFlightService(cache_ttl=cache_ttl)
+    offers = FakeOffers(**kwargs)
+    service.amadeus.shopping.flight_offers_search = offers
+    return service, offers
+
+
+def test_offers_are_cached_within_ttl():
+    service, offers = make_service()
+    first = service.search_flight_offers("HKG", "NRT", "2026-02-06", 2)
+    second = service.search_flight_offers("HKG", "NRT", "2026-02-06", 2)
+    assert first == second
+    assert len(offers.calls) == 1
+    # 人数不同是不同的报价
+    service.search_flight_offers("HKG", "NRT", "2026-02-06", 3)
+    assert len(offers.calls) == 2
+
+
+def test_offers_are_fetched_again_after_expiry():
+    service, offers = make_service(cache_ttl=0.05)
+    service.search_flight_offers("HKG", "NRT", "2026-02-06", 2)
+    time.sleep(0.1)
+    service.search_flight_offers("HKG", "NRT", "2026-02-06", 2)
+    assert len(offers.calls) == 2
+
+
+def test_round_trip_legs_run_concurrently():
+    service, offers = make_service(delay=0.2)
+    started = time.monotonic()
+    outbound, inbound = asyncio.run(service.get_round_trip_flights(
+        "hong kong", "tokyo", 2, 20000, "2026-02-06", "2026-02-08"))
+    assert time.monotonic() - started < 0.35
+    assert outbound[0]["origin"] == "HKG"
+    assert inbound[0]["origin"] == "NRT"
+
+
+def test_failing_leg_does_not_drop_the_other():
+    service, offers = make_service(fail_origin="NRT")
+    outbound, inbound = asyncio.run(service.get_round_trip_flights(
+        "hong kong", "tokyo", 2, 20000, "2026-02-06", "2026-02-08"))
+    assert outbound[0]["origin"] == "HKG"
+    assert inbound is None
+    # 失败的查询不写缓存
+    assert len(service.offer_cache) == 1
@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+from cache_utils import TTLCache, TieredCache
+from google_maps_utils import DETAILS_URL, PHOTO_MISS_TTL, PlacePhotoResolver
+
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "_client", client)
+    return client
+
+
+def resolve(resolver, place):
+    return asyncio.run(resolver.resolve(place, "key"))
+
+
+def places_handler(find_payload, details_payload=None):
+    def handler(request):
+        if str(request.url).startswith(DETAILS_URL):
+            return httpx.Response(200, json=details_payload)
+        return httpx.Response(200, json=find_payload)
+    return handler
+
+
+def test_found_photo_is_cached(monkeypatch):
+    use_transport(monkeypatch, places_handler(
+        {"status": "OK", "candidates": [{"place_id": "p1"}]},
+        {"status": "OK", "result": {"photos": [{"photo_reference": "ref1"}]}},
+    ))
+    cache = TieredCache(TTLCache())
+    url = resolve(PlacePhotoResolver(cache=cache), "Tokyo Tower")
+
+    assert "photoreference=ref1" in url
+    assert cache.get("tokyo tower") == "ref1"
+
+
+@pytest.mark.parametrize("payload", [
+    {"status": "ZERO_RESULTS", "candidates": []},
+    {"status": "OK", "candidates": []},
+])
+def test_no_results_are_negative_cached(monkeypatch, payload):
+    use_transport(monkeypatch, places_handler(payload))
+    cache = TieredCache(TTLCache())
+    stored = []
+    original_set = cache.set
+    cache.set = lambda key, value, ttl=None: (stored.append(ttl), original_set(key, value, ttl=ttl))
+
+    assert resolve(PlacePhotoResolver(cache=cache), "Nowhere") is None
+    assert cache.get("nowhere") == ""
+    assert stored == [PHOTO_MISS_TTL]
+
+
+@pytest.mark.parametrize("status", ["OVER_QUERY_LIMIT", "REQUEST_DENIED", "INVALID_REQUEST", "UNKNOWN_ERROR"])
+def test_error_statuses_are_not_cached(monkeypatch, status):
+    use_transport(monkeypatch, places_handler({"status": status, "candidates": []}))
+    cache = TieredCache(TTLCache())
+
+    assert resolve(PlacePhotoResolver(cache=cache), "Tokyo Tower") is None
+    assert cache.get("tokyo tower") is None
+
+
+def test_details_error_status_is_not_cached(monkeypatch):
+    use_transport(monkeypatch, places_handler(
+        {"status": "OK", "candidates": [{"place_id": "p1"}]},
+        {"status": "OVER_QUERY_LIMIT"},
+    ))
+    cache = TieredCache(TTLCache())
+
+    assert resolve(PlacePhotoResolver(cache=cache), "Tokyo Tower") is None
+    assert cache.get("tokyo tower") is None
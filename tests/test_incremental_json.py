@@ -0,0 +1,45 @@
+import json
+
+from incremental_json import DAY, SECTION, IncrementalItineraryParser
+
+ITINERARY = {
+    "trip_overview": {"destination": "Tokyo", "summary": "braces { } [ ] and \"quotes\" in strings"},
+    "accommodation": [{"name": "Hotel \\ backslash", "amenities": ["wifi"]}],
+    "daily_itinerary": [
+        {"day": 1, "activities": [{"activity_name": "Senso-ji"}]},
+        {"day": 2, "activities": []},
+    ],
+    "budget_breakdown": {"food_total_hkd": 1200},
+}
+
+
+def parse_in_chunks(text, size):
+    events = []
+    parser = IncrementalItineraryParser(lambda kind, key, value: events.append((kind, key, value)))
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser, events
+
+
+def test_sections_and_days_are_emitted_in_order():
+    text = "Here is your plan:\n```json\n" + json.dumps(ITINERARY, ensure_ascii=False, indent=2) + "\n```"
+    for size in (1, 3, 64, len(text)):
+        parser, events = parse_in_chunks(text, size)
+        assert parser.done
+        assert events == [
+            (SECTION, "trip_overview", ITINERARY["trip_overview"]),
+            (SECTION, "accommodation", ITINERARY["accommodation"]),
+            (DAY, 0, ITINERARY["daily_itinerary"][0]),
+            (DAY, 1, ITINERARY["daily_itinerary"][1]),
+            (SECTION, "daily_itinerary", ITINERARY["daily_itinerary"]),
+            (SECTION, "budget_breakdown", ITINERARY["budget_breakdown"]),
+        ]
+
+
+def test_day_is_emitted_before_the_document_ends():
+    text = json.dumps(ITINERARY)
+    cut = text.index('{"day": 2')
+    parser, events = parse_in_chunks(text[:cut], 5)
+    assert not parser.done
+    assert [(kind, key) for kind, key, _ in events] == [(SECTION, "trip_overview"), (SECTION, "accommodation"), (DAY, 0)]
+    assert parser.text == text[:cut]
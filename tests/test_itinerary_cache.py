@@ -0,0 +1,32 @@
+from cache_utils import TTLCache, TieredCache
+from itinerary_cache import ItineraryCache, budget_bucket, canonical_destination
+
+
+def test_destination_aliases_and_suffixes():
+    assert canonical_destination("  Osaka,  Japan ") == "osaka"
+    assert canonical_destination("大阪，日本") == "osaka"
+    assert canonical_destination("東京") == "tokyo"
+    assert canonical_destination("Lisbon") == "lisbon"
+
+
+def test_budget_is_bucketed_per_person_per_day():
+    assert budget_bucket(10000, 5, 2) == budget_bucket(20000, 10, 2) == budget_bucket(20000, 5, 4)
+    assert budget_bucket(10000, 5, 2) < budget_bucket(13000, 5, 2)
+
+
+def test_exact_bucket_only_by_default():
+    cache = ItineraryCache(TieredCache(TTLCache()))
+    cache.set("Tokyo", 3, 2, 12000, '{"plan": "cheaper"}')
+
+    assert cache.get("tokyo, japan", 3, 2, 12000) == '{"plan": "cheaper"}'
+    assert cache.get("Tokyo", 3, 2, 12000 * 1.25) is None
+    assert cache.get("Tokyo", 4, 2, 12000) is None
+
+
+def test_near_buckets_only_reuse_lower_budgets():
+    cache = ItineraryCache(TieredCache(TTLCache()), near_buckets=True)
+    cache.set("Tokyo", 3, 2, 12000, '{"plan": "cheaper"}')
+
+    # 预算高一档的请求可以复用较便宜的行程，预算低一档的请求不能复用较贵的行程
+    assert cache.get("Tokyo", 3, 2, 12000 * 1.25) == '{"plan": "cheaper"}'
+    assert cache.get("Tokyo", 3, 2, 12000 / 1.25) is None
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from itinerary_schema import _to_number, activity_addresses, build_daily_responses, day_adapter, validate_itinerary
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,200 HKD", 1200),
+    ("HK$120", 120),
+    ("约 85.5 港币", 85.5),
+    ("-300", -300),
+    ("Free", 0),
+    ("", 0),
+    (None, 0),
+    (True, 0),
+    (42, 42),
+    (3.5, 3.5),
+    ("12.0", 12),
+])
+def test_to_number(value, expected):
+    assert _to_number(value) == expected
+    assert type(_to_number(value)) is type(expected)
+
+
+def test_nulls_and_strings_are_coerced():
+    itinerary = validate_itinerary(json.dumps({
+        "trip_overview": {"destination": "Tokyo", "total_budget_hkd": "HK$20,000", "people": None},
+        "accommodation": [{"name": "Hotel A", "price_per_night_hkd": "1,200 HKD", "rating": "4.8/5", "review_count": None}],
+        "daily_itinerary": [{
+            "day": 1,
+            "activities": [{"activity_name": "Senso-ji", "cost_hkd": "Free", "address": "Asakusa",
+                            "travel_info": {"from_previous_duration_minutes": "15 min"}}],
+        }],
+        "budget_breakdown": {"remaining_budget_hkd": None},
+        "unexpected": "ignored",
+    }))
+    assert itinerary.trip_overview.total_budget_hkd == 20000
+    assert itinerary.trip_overview.people == 0
+    assert itinerary.accommodation[0].price_per_night_hkd == 1200
+    assert itinerary.accommodation[0].rating == 4.8
+    assert itinerary.accommodation[0].review_count == 0
+    activity = itinerary.daily_itinerary[0].activities[0]
+    assert activity.cost_hkd == 0
+    assert activity.travel_info.from_previous_duration_minutes == 15
+    assert itinerary.budget_breakdown.remaining_budget_hkd == 0
+
+
+def test_missing_optional_sections_use_defaults():
+    itinerary = validate_itinerary(b'{"trip_overview": {"destination": "Tokyo"}}')
+    assert itinerary.accommodation == []
+    assert itinerary.daily_itinerary == []
+    assert itinerary.budget_breakdown.food_total_hkd == 0
+
+
+@pytest.mark.parametrize("data, errors", [
+    ({}, 1),  # 缺少 trip_overview
+    ({"trip_overview": {"title": "no destination"}}, 1),
+    ({"trip_overview": {"destination": "Tokyo"}, "daily_itinerary": [{"activities": [{}]}]}, 2),  # 缺少 day 和 activity_name
+    ({"trip_overview": {"destination": "Tokyo"}, "daily_itinerary": "day 1"}, 1),
+])
+def test_missing_required_fields_raise(data, errors):
+    with pytest.raises(ValidationError) as error:
+        validate_itinerary(json.dumps(data))
+    assert error.value.error_count() == errors
+
+
+def test_invalid_json_raises_validation_error():
+    with pytest.raises(ValidationError):
+        validate_itinerary('{"trip_overview": ')
+
+
+def test_daily_responses_follow_activity_order():
+    days = [day_adapter.validate_python({"day": day, "activities": [
+        {"activity_name": f"Spot {day}-{index}", "address": f"Address {day}-{index}", "cost_hkd": "HK$50"}
+        for index in range(2)
+    ]}) for day in (1, 2)]
+    addresses = activity_addresses(days)
+    responses = build_daily_responses(days, [f"url:{address}" for address in addresses])
+    assert [(response.day, response.itinerary.activity) for response in responses] == [
+        (1, "Spot 1-0"), (1, "Spot 1-1"), (2, "Spot 2-0"), (2, "Spot 2-1")
+    ]
+    assert responses[2].itinerary.image_url == "url:Address 2-0"
+    assert responses[0].itinerary.activity_cost == "50"
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from job_service import JOB_FAILED, JOB_SUCCEEDED, JobManager
+
+
+def run_jobs(scenario):
+    async def main():
+        manager = JobManager(max_workers=2, max_queue=2)
+        await manager.start()
+        try:
+            return await scenario(manager)
+        finally:
+            await manager.close()
+    return asyncio.run(main())
+
+
+def test_job_result_is_only_visible_to_owner():
+    async def scenario(manager):
+        async def work():
+            return {"answer": 42}
+
+        manager.submit(work, job_id="job-1", owner="alice")
+        job = await manager.wait("job-1", timeout=1, owner="alice")
+        return job, manager.get("job-1", owner="bob"), manager.get("job-1")
+
+    job, other_user, anonymous = run_jobs(scenario)
+    assert job.status == JOB_SUCCEEDED
+    assert job.to_dict()["result"] == {"answer": 42}
+    assert other_user is None
+    assert anonymous is None
+
+
+def test_failed_job_keeps_http_status():
+    async def scenario(manager):
+        async def work():
+            raise HTTPException(status_code=429, detail="busy")
+
+        manager.submit(work, job_id="job-1")
+        return await manager.wait("job-1", timeout=1)
+
+    job = run_jobs(scenario)
+    assert job.status == JOB_FAILED
+    assert (job.error, job.error_status) == ("busy", 429)
+
+
+def test_duplicate_and_overflow_submissions_are_rejected():
+    async def scenario(manager):
+        blocker = asyncio.Event()
+
+        async def work():
+            await blocker.wait()
+
+        for i in range(4):  # 2 个 worker 各占一个，队列再容纳 2 个
+            manager.submit(work, job_id=f"job-{i}")
+            await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as duplicate:
+            manager.submit(work, job_id="job-0")
+        with pytest.raises(HTTPException) as overflow:
+            manager.submit(work, job_id="job-9")
+        blocker.set()
+        return duplicate.value.status_code, overflow.value.status_code
+
+    assert run_jobs(scenario) == (409, 503)
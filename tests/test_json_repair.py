@@ -0,0 +1,94 @@
+from json_repair import (
+    extract_json_object,
+    missing_itinerary_sections,
+    parse_llm_json,
+    recover_itinerary,
+    remove_trailing_commas,
+)
+
+FULL_DAY_1 = '{"day": 1, "activities": [{"name": "Senso-ji"}]}'
+
+
+def test_extracts_object_from_fenced_output():
+    content = 'Here is the plan:\n```json\n{"a": "brace } in string", "b": [1, 2]}\n```\nEnjoy!'
+    assert parse_llm_json(content) == ({"a": "brace } in string", "b": [1, 2]}, False)
+
+
+def test_no_object_returns_none():
+    assert parse_llm_json("sorry, I cannot help") == (None, False)
+    assert recover_itinerary("") == (None, False)
+
+
+def test_trailing_commas_outside_strings_are_removed():
+    assert remove_trailing_commas('{"a": [1, 2, ], "b": "x, ]",\n}') == '{"a": [1, 2 ], "b": "x, ]"\n}'
+    # 去掉多余逗号不丢失内容，不算修复
+    assert parse_llm_json('{"a": [1, 2,],}') == ({"a": [1, 2]}, False)
+
+
+def test_truncated_output_falls_back_to_last_complete_value():
+    data, repaired = parse_llm_json('{"title": "Tokyo", "tags": ["food", "tem')
+    assert repaired
+    assert data == {"title": "Tokyo", "tags": ["food"]}
+
+
+def test_braces_in_prose_are_skipped():
+    content = 'Sure! Here is the plan {in JSON}: ```json\n{"daily_itinerary": [' + FULL_DAY_1 + ']}\n```'
+    data, repaired = parse_llm_json(content)
+    assert not repaired
+    assert data == {"daily_itinerary": [{"day": 1, "activities": [{"name": "Senso-ji"}]}]}
+    assert recover_itinerary(content) == (data, False)
+
+
+def test_empty_objects_are_not_a_result():
+    assert parse_llm_json("{} and {  }") == (None, False)
+    assert parse_llm_json('{} then {"a": 1}') == ({"a": 1}, False)
+
+
+def test_truncated_patch_drops_half_written_day():
+    content = (
+        '{"daily_itinerary": [' + FULL_DAY_1
+        + ', {"day": 2, "activities": [{"name": "Shibuya"}, {"name": "Harajuku"'
+    )
+    data, repaired = parse_llm_json(content)
+    assert repaired
+    assert data == {"daily_itinerary": [{"day": 1, "activities": [{"name": "Senso-ji"}]}]}
+
+
+def test_truncated_object_is_not_replaced_by_a_nested_one():
+    data, repaired = parse_llm_json('{"trip_overview": {"destination": "Tokyo"}, "accommodation": [{"name": "Ho')
+    assert repaired
+    assert data["trip_overview"] == {"destination": "Tokyo"}
+
+
+def test_extract_returns_unclosed_tail():
+    assert extract_json_object('note {"a": {"b": 1}') == '{"a": {"b": 1}'
+
+
+def test_recover_itinerary_drops_half_written_day():
+    content = (
+        '{"trip_overview": {"destination": "Tokyo"}, "daily_itinerary": ['
+        + FULL_DAY_1
+        + ', {"day": 2, "activities": [{"name": "Shibu'
+    )
+    itinerary, repaired = recover_itinerary(content)
+    assert repaired
+    assert itinerary["trip_overview"] == {"destination": "Tokyo"}
+    assert [day["day"] for day in itinerary["daily_itinerary"]] == [1]
+
+
+def test_recover_itinerary_accepts_trailing_commas():
+    itinerary, repaired = recover_itinerary('{"daily_itinerary": [' + FULL_DAY_1 + ',],}')
+    assert not repaired
+    assert itinerary == {"daily_itinerary": [{"day": 1, "activities": [{"name": "Senso-ji"}]}]}
+
+
+def test_missing_itinerary_sections():
+    itinerary = {
+        "trip_overview": {"destination": "Tokyo"},
+        "accommodation": [],
+        "daily_itinerary": [
+            {"day": 1, "activities": [{"name": "Senso-ji"}]},
+            {"day": 2, "activities": []},
+        ],
+    }
+    assert missing_itinerary_sections(itinerary, 3) == (["accommodation", "budget_breakdown"], [2, 3])
@@ -0,0 +1,62 @@
+from keyword_matcher import (
+    ENGAGEMENT_KEYWORDS, HOT_KEYWORDS, TRAVEL_TAG_KEYWORDS, KeywordMatcher, _benchmark, estimate_popularity,
+    estimate_popularity_batch, extract_tags, extract_tags_batch,
+)
+
+
+def naive_tags(text, destination):
+    text_lower = text.lower()
+    found = [category for category, keywords in TRAVEL_TAG_KEYWORDS.items()
+             if any(keyword in text_lower for keyword in keywords)]
+    return list(dict.fromkeys([destination.lower(), "travel"] + found))[:5]
+
+
+def naive_score(title, snippet):
+    text = (title + " " + snippet).lower()
+    score = sum(10 for keyword in HOT_KEYWORDS if keyword in text)
+    score += sum(5 for keyword in ENGAGEMENT_KEYWORDS if keyword in text)
+    return score + (5 if 20 <= len(title) <= 80 else 0)
+
+
+def test_overlapping_keywords_match_like_substring_checks():
+    matcher = KeywordMatcher({"hot": ["viral", "go viral"], "other": ["night", "nightlife"]})
+    assert matcher.find("How to GO VIRAL at Nightlife spots") == {"viral", "go viral", "night", "nightlife"}
+    assert matcher.groups_of({"go viral", "nightlife"}) == {"hot", "other"}
+
+
+def test_tags_match_original_semantics():
+    texts = [
+        "Tokyo street food tour and night market",
+        "Hiking near Kyoto temple, cheap eats",
+        "",
+        "Luxury shopping mall guide",
+    ]
+    assert extract_tags_batch(texts, "Tokyo") == [naive_tags(text, "Tokyo") for text in texts]
+    assert extract_tags(texts[0], "Tokyo") == ["tokyo", "travel", "food", "attraction", "shopping"]
+
+
+def test_non_ascii_titles_keep_tags_on_their_own_post():
+    # "İ".lower() 会变成两个字符，批量匹配不能因此错位
+    texts = ["İstanbul İstanbul travel vlog"] * 5 + ["Best street food tour"]
+    tags = extract_tags_batch(texts, "istanbul")
+    assert tags == [naive_tags(text, "istanbul") for text in texts]
+    assert tags[-1] == ["istanbul", "travel", "food", "attraction"]
+    assert tags[0] == ["istanbul", "travel"]
+
+    items = [("İİİİ Best of İstanbul", "Ünforgettable views"), ("東京 の夜 night market", "必見 top spots")]
+    assert estimate_popularity_batch(items) == [naive_score(*item) for item in items]
+
+
+def test_popularity_scores_match_original_semantics():
+    items = [
+        ("Top 10 must-see places in Osaka", "This video went viral with a million views"),
+        ("Osaka", "a quiet walk"),
+    ]
+    assert estimate_popularity_batch(items) == [naive_score(*item) for item in items]
+    assert estimate_popularity(*items[0]) == naive_score(*items[0])
+
+
+def test_benchmark_implementations_agree():
+    # 基准测试内部会断言原实现、关键词表和正则自动机的结果一致
+    timings = _benchmark(rounds=1)
+    assert set(timings) == {"naive", "keyword table", "regex automaton"}
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test")
+os.environ.setdefault("SESSION_STORE_URL", "memory")
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from cache_utils import TTLCache, TieredCache  # noqa: E402
+from itinerary_cache import ItineraryCache  # noqa: E402
+from mcp_pool import PoolTimeoutError  # noqa: E402
+from models import TravelPlanRequest  # noqa: E402
+
+TRAVEL_INFO = {
+    "destination": "Tokyo",
+    "departure": "Hong Kong",
+    "num_days": 3,
+    "num_people": 2,
+    "budget": 20000,
+    "start_date": "Fri Feb 06 2026",
+    "end_date": "Sun Feb 08 2026",
+}
+
+
+def itinerary_json(title):
+    return json.dumps({"trip_overview": {"destination": "Tokyo", "title": title}})
+
+
+def chat_payload(**overrides):
+    payload = {
+        "message": "Make day 2 more relaxed",
+        "chat_history": [{"role": "user", "content": "Make day 2 more relaxed"}],
+        "travel_info": TRAVEL_INFO,
+        "request_id": None,
+        "first_complete_flag": 1,
+    }
+    payload.update(overrides)
+    return payload
+
+
+@pytest.fixture
+def no_agent(monkeypatch):
+    """任何 Agent 运行都视为测试失败"""
+    async def fail(*args, **kwargs):
+        raise AssertionError("planner should not run")
+    monkeypatch.setattr(main, "run_mcp_travel_planner", fail)
+    monkeypatch.setattr(main, "run_parallel_travel_planner", fail)
+
+
+def test_revision_without_session_returns_409(no_agent):
+    client = TestClient(main.app)
+    for session_id in (None, "unknown-session"):
+        response = client.post("/api/chat", json=chat_payload(session_id=session_id))
+        assert response.status_code == 409
+        assert response.json()["detail"] == main.SESSION_EXPIRED_DETAIL
+
+
+def test_generate_itinerary_does_not_downgrade_revision(no_agent):
+    request = TravelPlanRequest(destination="Tokyo", departure="Hong Kong", num_days=3, num_people=2, budget=20000)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.generate_itinerary(request, "Make day 2 more relaxed", 1, session_id="missing"))
+    assert error.value.status_code == 409
+
+
+def test_revision_never_returns_cached_first_plan(monkeypatch):
+    request = TravelPlanRequest(destination="Tokyo", departure="Hong Kong", num_days=3, num_people=2, budget=20000)
+    monkeypatch.setattr(main, "itinerary_cache", ItineraryCache(TieredCache(TTLCache())))
+    main.itinerary_cache.set("Tokyo", 3, 2, 20000, itinerary_json("cached"))
+    calls = []
+
+    async def revise(**kwargs):
+        calls.append(kwargs)
+        return itinerary_json("revised")
+
+    monkeypatch.setattr(main, "run_mcp_travel_planner", revise)
+
+    async def scenario():
+        await main.session_store.save("session-1", itinerary_json("original"))
+        return await main.generate_itinerary(request, "Make day 2 more relaxed", 1, session_id="session-1")
+
+    response = asyncio.run(scenario())
+    assert response["itinerary"] == itinerary_json("revised")
+    assert calls[0]["previous_itinerary"] == itinerary_json("original")
+    assert calls[0]["user_new_requirements"] == "Make day 2 more relaxed"
+
+
+def test_invalid_plan_is_not_cached(monkeypatch):
+    request = TravelPlanRequest(destination="Tokyo", departure="Hong Kong", num_days=3, num_people=2, budget=20000)
+    monkeypatch.setattr(main, "itinerary_cache", ItineraryCache(TieredCache(TTLCache())))
+    calls = []
+
+    async def plan(**kwargs):
+        calls.append(kwargs)
+        return json.dumps({"trip_overview": {"title": "no destination"}})
+
+    monkeypatch.setattr(main, "run_mcp_travel_planner", plan)
+
+    async def scenario():
+        statuses = []
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await main.generate_itinerary(request, "", 0, session_id="session-invalid")
+            statuses.append(error.value.status_code)
+        return statuses, await main.session_store.get_itinerary("session-invalid")
+
+    statuses, saved = asyncio.run(scenario())
+    assert statuses == [500, 500]
+    assert len(calls) == 2
+    assert main.itinerary_cache.get("Tokyo", 3, 2, 20000) is None
+    assert not saved
+
+
+def test_parallel_days_overlap(monkeypatch):
+    assert main.PARALLEL_DAY_CONCURRENCY == main.travel_mcp_pool.size
+    in_flight = []
+    overlap = []
+
+    async def plan_day(openai_key, destination, num_days, num_people, budget, day_outline, accommodation, other_days):
+        in_flight.append(day_outline["day"])
+        overlap.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(day_outline["day"])
+        return {"day": day_outline["day"], "activities": [{"activity_name": "Walk"}]}
+
+    monkeypatch.setattr(main, "generate_day_itinerary", plan_day)
+    monkeypatch.setattr(main, "PARALLEL_DAY_CONCURRENCY", 3)
+    itinerary = {"daily_itinerary": []}
+    asyncio.run(main.complete_itinerary(itinerary, [], [1, 2, 3, 4], "Tokyo", 4, 2, 20000, "key"))
+    assert max(overlap) == 3
+    assert [day["day"] for day in itinerary["daily_itinerary"]] == [1, 2, 3, 4]
+
+
+def test_pool_timeout_returns_503_with_retry_after(monkeypatch):
+    request = TravelPlanRequest(destination="Kyoto", departure="Hong Kong", num_days=2, num_people=1, budget=8000)
+    monkeypatch.setattr(main, "itinerary_cache", ItineraryCache(TieredCache(TTLCache())))
+
+    async def busy(**kwargs):
+        raise PoolTimeoutError("等待 MCP 会话池 travel 超时")
+
+    monkeypatch.setattr(main, "run_mcp_travel_planner", busy)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.generate_itinerary(request, "", 0, session_id="session-busy"))
+    assert error.value.status_code == 503
+    assert int(error.value.headers["Retry-After"]) >= 1
+
+
+def test_check_itinerary_reports_schema_errors_as_500():
+    assert main.check_itinerary(itinerary_json("ok")).trip_overview.title == "ok"
+    with pytest.raises(HTTPException) as error:
+        main.check_itinerary('{"trip_overview": {}}')
+    assert error.value.status_code == 500
+    assert error.value.detail == "行程数据格式错误: 1 处字段不符合要求"
+
+
+def test_job_api_requires_login(no_agent):
+    client = TestClient(main.app)
+    response = client.post("/api/jobs/chat", json=chat_payload(first_complete_flag=0))
+    assert response.status_code == 401
+    assert client.get("/api/jobs/anything").status_code == 401
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from mcp_pool import MCPSessionPool, PoolTimeoutError
+
+
+class FakeTools:
+    created = 0
+
+    def __init__(self):
+        FakeTools.created += 1
+        self.number = FakeTools.created
+        self.healthy = True
+        self.closed = False
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    async def is_alive(self):
+        return self.healthy
+
+
+def make_pool(**kwargs):
+    pool = MCPSessionPool("test", [], **kwargs)
+    pool._create_tools = FakeTools
+    return pool
+
+
+def test_lease_reuses_released_session():
+    async def main():
+        pool = make_pool(size=2, health_check_interval=0)
+        async with pool.lease() as first:
+            pass
+        async with pool.lease() as second:
+            pass
+        await pool.close()
+        return first, second, pool
+
+    first, second, pool = asyncio.run(main())
+    assert first is second
+    assert first.closed
+    assert pool._total == 0
+
+
+def test_concurrent_leases_spawn_up_to_size():
+    async def main():
+        pool = make_pool(size=2, warm=1, health_check_interval=0)
+        await pool.start()
+        hold = asyncio.Event()
+        leased = []
+
+        async def use():
+            async with pool.lease() as tools:
+                leased.append(tools)
+                await hold.wait()
+
+        tasks = [asyncio.ensure_future(use()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        hold.set()
+        await asyncio.gather(*tasks)
+        await pool.close()
+        return leased
+
+    leased = asyncio.run(main())
+    assert len({tools.number for tools in leased}) == 2
+
+
+def test_acquire_times_out_when_pool_is_exhausted():
+    async def main():
+        pool = make_pool(size=1, acquire_timeout=0.05, health_check_interval=0)
+        async with pool.lease():
+            with pytest.raises(PoolTimeoutError):
+                await pool.acquire()
+        # 归还后可以再次借用
+        async with pool.lease() as tools:
+            pass
+        await pool.close()
+        return tools
+
+    assert asyncio.run(main()) is not None
+
+
+def test_broken_session_is_replaced_after_failed_call():
+    async def main():
+        pool = make_pool(size=1, health_check_interval=0)
+        with pytest.raises(RuntimeError):
+            async with pool.lease() as broken:
+                broken.healthy = False
+                raise RuntimeError("tool call failed")
+        async with pool.lease() as replacement:
+            pass
+        await pool.close()
+        return broken, replacement
+
+    broken, replacement = asyncio.run(main())
+    assert broken.closed
+    assert replacement is not broken
+
+
+def test_failed_call_on_healthy_session_keeps_it():
+    async def main():
+        pool = make_pool(size=1, health_check_interval=0)
+        with pytest.raises(ValueError):
+            async with pool.lease() as first:
+                raise ValueError("bad tool arguments")
+        async with pool.lease() as second:
+            pass
+        await pool.close()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second
+
+
+def test_health_check_replaces_unhealthy_idle_session():
+    async def main():
+        pool = make_pool(size=1, warm=1, health_check_interval=0.01)
+        await pool.start()
+        session = pool._idle.get_nowait()
+        unhealthy = session.tools
+        unhealthy.healthy = False
+        pool._idle.put_nowait(session)
+        await asyncio.sleep(0.05)
+        async with pool.lease() as tools:
+            pass
+        await pool.close()
+        return unhealthy, tools
+
+    unhealthy, tools = asyncio.run(main())
+    assert unhealthy.closed
+    assert tools is not unhealthy
+    assert tools.healthy
+
+
+def test_slow_ping_counts_as_unhealthy():
+    class SlowTools(FakeTools):
+        async def is_alive(self):
+            await asyncio.sleep(1)
+            return True
+
+    async def main():
+        pool = make_pool(size=1, health_check_interval=0)
+        pool._create_tools = SlowTools
+        session = await pool.acquire()
+        healthy = await session.ping(timeout=0.01)
+        await pool.release(session)
+        await pool.close()
+        return healthy
+
+    assert asyncio.run(main()) is False
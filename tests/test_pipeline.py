@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from pipeline import StageGraph
+
+
+def test_independent_stages_run_concurrently():
+    order = []
+
+    async def slow(name):
+        order.append(f"start:{name}")
+        await asyncio.sleep(0.01)
+        order.append(f"end:{name}")
+        return name
+
+    graph = (
+        StageGraph()
+        .add("a", lambda: slow("a"))
+        .add("b", lambda: slow("b"))
+        .add("c", lambda a, b: slow(a + b), inputs=["a", "b"])
+    )
+    results = asyncio.run(graph.run())
+
+    assert results["c"] == "ab"
+    assert order[:2] == ["start:a", "start:b"]
+    assert order[-1] == "end:ab"
+
+
+def test_initial_values_are_inputs():
+    async def double(x):
+        return x * 2
+
+    results = asyncio.run(StageGraph().add("y", double, inputs=["x"]).run({"x": 21}))
+    assert results == {"x": 21, "y": 42}
+
+
+def test_failure_cancels_other_stages():
+    cancelled = []
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def forever():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    graph = StageGraph().add("fail", fail).add("forever", forever)
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(graph.run())
+    assert cancelled == [True]
+
+
+def test_unknown_input_and_cycle_are_rejected():
+    async def noop(**kwargs):
+        return None
+
+    with pytest.raises(ValueError):
+        asyncio.run(StageGraph().add("a", noop, inputs=["missing"]).run())
+    with pytest.raises(ValueError):
+        asyncio.run(StageGraph().add("a", noop, inputs=["b"]).add("b", noop, inputs=["a"]).run())
+    with pytest.raises(ValueError):
+        StageGraph().add("a", noop).add("a", noop)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from progress import ProgressManager
+
+
+def parse(frame):
+    header, data = frame.strip().split("\n")
+    return int(header[len("id: "):]), json.loads(data[len("data: "):])
+
+
+async def take(stream, count):
+    return [parse(await stream.__anext__()) for _ in range(count)]
+
+
+def test_events_before_subscribe_are_replayed():
+    async def main():
+        manager = ProgressManager()
+        await manager.add_progress("req", "first")
+        await manager.add_progress("req", "second", "detail", data={"day": 1})
+        stream = manager.get_progress_stream("req")
+        events = await take(stream, 2)
+        await stream.aclose()
+        return events
+
+    (first_id, first), (second_id, second) = asyncio.run(main())
+    assert (first_id, first["message"], first["type"]) == (1, "first", "info")
+    assert "data" not in first
+    assert (second_id, second["type"], second["data"]) == (2, "detail", {"day": 1})
+
+
+def test_resume_from_last_event_id():
+    async def main():
+        manager = ProgressManager()
+        for i in range(3):
+            await manager.add_progress("req", f"event {i}")
+        stream = manager.get_progress_stream("req", last_event_id=2)
+        events = await take(stream, 1)
+        await stream.aclose()
+        return events
+
+    assert [(event_id, data["message"]) for event_id, data in asyncio.run(main())] == [(3, "event 2")]
+
+
+def test_live_events_and_keepalive():
+    async def main():
+        manager = ProgressManager(keepalive_interval=0.05)
+        stream = manager.get_progress_stream("req")
+        keepalive = await stream.__anext__()
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await manager.add_progress("req", "live")
+        event = parse(await pending)
+        await stream.aclose()
+        return keepalive, event
+
+    keepalive, (_, event) = asyncio.run(main())
+    assert keepalive == ": keep-alive\n\n"
+    assert event["message"] == "live"
+
+
+def test_buffer_and_channel_count_are_bounded():
+    async def main():
+        manager = ProgressManager(buffer_size=2, max_channels=3)
+        for i in range(5):
+            await manager.add_progress("req", f"event {i}")
+        buffered = [data["message"] for _, data in manager.channels["req"].since(0)]
+        for i in range(5):
+            await manager.add_progress(f"other-{i}", "hello")
+        return manager, buffered
+
+    manager, buffered = asyncio.run(main())
+    assert buffered == ["event 3", "event 4"]
+    assert len(manager.channels) == 3
+    assert "req" not in manager.channels
+    assert [data["message"] for _, data in manager._channel("other-4").since(0)] == ["hello"]
+
+
+def test_empty_request_id_is_ignored():
+    manager = ProgressManager()
+    asyncio.run(manager.add_progress(None, "ignored"))
+    assert not manager.channels
@@ -0,0 +1,82 @@
+from revision import RevisionScope, build_revision_slice, classify_revision, find_referenced_days, merge_revision
+
+
+def make_itinerary(num_days=3):
+    return {
+        "trip_overview": {"destination": "Tokyo"},
+        "accommodation": [{"name": "Hotel A", "address": "Shinjuku"}],
+        "daily_itinerary": [
+            {"day": day, "day_summary": f"Day {day}", "activities": [{"activity_name": f"Spot {day}"}]}
+            for day in range(1, num_days + 1)
+        ],
+        "budget_breakdown": {"remaining_budget_hkd": 1000},
+    }
+
+
+def test_referenced_days_in_english_and_chinese():
+    assert find_referenced_days("swap day 2 and the third day", 5) == {2, 3}
+    assert find_referenced_days("第二天和最后一天轻松一点", 4) == {2, 4}
+    assert find_referenced_days("change the last day", 3) == {3}
+
+
+def test_day_scoped_revision():
+    scope = classify_revision("Make day 2 more relaxed", make_itinerary(), 3, "Tokyo")
+    assert scope.days == {2}
+    assert not scope.accommodation
+
+
+def test_accommodation_scoped_revision():
+    scope = classify_revision("Change the hotel to something near Shibuya", make_itinerary(), 3, "tokyo")
+    assert scope.days == set()
+    assert scope.accommodation
+    assert build_revision_slice(make_itinerary(), scope)["accommodation"] == [{"name": "Hotel A", "address": "Shinjuku"}]
+
+
+def test_full_replan_cases():
+    itinerary = make_itinerary()
+    # 涉及整个行程、预算
+    assert classify_revision("Make every day cheaper", itinerary, 3, "Tokyo") is None
+    assert classify_revision("Lower the budget for day 2", itinerary, 3, "Tokyo") is None
+    # 天数或目的地变化
+    assert classify_revision("Change day 2", itinerary, 4, "Tokyo") is None
+    assert classify_revision("Change day 2", itinerary, 3, "Osaka") is None
+    # 无法确定范围、引用了不存在的天
+    assert classify_revision("More food please", itinerary, 3, "Tokyo") is None
+    assert classify_revision("Change day 5", itinerary, 3, "Tokyo") is None
+    assert classify_revision("", itinerary, 3, "Tokyo") is None
+
+
+def test_merge_replaces_only_scoped_days():
+    itinerary = make_itinerary()
+    patch = {"daily_itinerary": [
+        {"day": 2, "activities": [{"activity_name": "Onsen"}]},
+        {"day": 3, "activities": [{"activity_name": "Not in scope"}]},  # 多出的天被忽略
+    ]}
+    merged = merge_revision(itinerary, patch, RevisionScope({2}))
+    assert [day["activities"][0]["activity_name"] for day in merged["daily_itinerary"]] == ["Spot 1", "Onsen", "Spot 3"]
+    assert itinerary["daily_itinerary"][1]["activities"][0]["activity_name"] == "Spot 2"  # 原行程不被修改
+
+
+def test_merge_keeps_days_missing_from_patch():
+    patch = {"daily_itinerary": [{"day": 1, "activities": [{"activity_name": "Tsukiji"}]}]}
+    merged = merge_revision(make_itinerary(), patch, RevisionScope({1, 3}))
+    assert [day["activities"][0]["activity_name"] for day in merged["daily_itinerary"]] == ["Tsukiji", "Spot 2", "Spot 3"]
+
+
+def test_merge_replaces_budget_and_scoped_accommodation():
+    patch = {
+        "accommodation": [{"name": "Hotel B"}],
+        "budget_breakdown": {"remaining_budget_hkd": 200},
+    }
+    merged = merge_revision(make_itinerary(), patch, RevisionScope(set(), accommodation=True))
+    assert merged["accommodation"] == [{"name": "Hotel B"}]
+    assert merged["budget_breakdown"] == {"remaining_budget_hkd": 200}
+
+    # 不在修改范围内的住宿不被替换
+    merged = merge_revision(make_itinerary(), patch, RevisionScope({1}))
+    assert merged["accommodation"] == [{"name": "Hotel A", "address": "Shinjuku"}]
+
+
+def test_merge_empty_patch_leaves_itinerary_unchanged():
+    itinerary = make_itinerary()
+    assert merge_revision(itinerary, {}, RevisionScope({2}, accommodation=True)) == itinerary
@@ -0,0 +1,83 @@
+import asyncio
+
+from progress import progress_manager
+from singleflight import SingleFlight
+
+
+def messages(request_id):
+    return [data["message"] for _, data in progress_manager._channel(request_id).since(0)]
+
+
+def test_concurrent_calls_share_one_execution_and_its_events():
+    flights = SingleFlight("test")
+    calls = []
+    events = {"a": [], "b": []}
+
+    async def work(group_id, emit):
+        calls.append(group_id)
+        await progress_manager.add_progress(group_id, "step 1")
+        emit("day", 1)
+        await asyncio.sleep(0.02)
+        await progress_manager.add_progress(group_id, "step 2")
+        emit("day", 2)
+        return "result"
+
+    async def caller(name, delay):
+        await asyncio.sleep(delay)
+        return await flights.do("key", work, request_id=f"sf-{name}",
+                                on_event=lambda *args: events[name].append(args))
+
+    async def main():
+        return await asyncio.gather(caller("a", 0), caller("b", 0.01))
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert len(calls) == 1
+    # 后加入的调用方也会收到加入前的事件
+    assert messages("sf-a") == messages("sf-b") == ["step 1", "step 2"]
+    assert events["a"] == events["b"] == [("day", 1), ("day", 2)]
+    assert not flights.in_flight("key")
+    assert calls[0] not in progress_manager.groups
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    flights = SingleFlight("test")
+
+    async def work(group_id, emit):
+        await asyncio.sleep(0.03)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("key", work))
+        second = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_errors_reach_every_caller_and_next_call_retries():
+    flights = SingleFlight("test")
+    attempts = []
+
+    async def work(group_id, emit):
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream failed")
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(flights.do("key", work), flights.do("key", work), return_exceptions=True)
+        return results, await flights.do("key", work)
+
+    results, retry = asyncio.run(main())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert retry == "ok"
+    assert len(attempts) == 2
+
+
+def test_make_key_is_order_insensitive_for_dicts_only():
+    flights = SingleFlight("test")
+    assert flights.make_key({"a": 1, "b": 2}) == flights.make_key({"b": 2, "a": 1})
+    assert flights.make_key("tokyo", 3) != flights.make_key(3, "tokyo")
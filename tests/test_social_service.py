@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import social_service
+from social_service import GoogleSearchService
+
+
+class FakeRequest:
+    def __init__(self, delay, result):
+        self.delay = delay
+        self.result = result
+        self.finished = threading.Event()
+
+    def execute(self, http=None):
+        self.http_timeout = http.timeout
+        threading.Event().wait(self.delay)
+        self.finished.set()
+        return self.result
+
+
+class FakeService:
+    def __init__(self, request):
+        self.request = request
+
+    def cse(self):
+        return self
+
+    def list(self, **kwargs):
+        return self.request
+
+
+def test_timed_out_query_keeps_slot_until_thread_finishes(monkeypatch):
+    monkeypatch.setattr(social_service, "CSE_QUERY_TIMEOUT", 0.05)
+    request = FakeRequest(delay=0.3, result={"items": [{"link": "late"}]})
+
+    async def main():
+        monkeypatch.setattr(social_service, "_cse_semaphore", asyncio.Semaphore(1))
+        result = await GoogleSearchService("key", "cx")._execute_query(FakeService(request), "tokyo", 3)
+        locked_after_timeout = social_service._cse_semaphore.locked()
+        while not request.finished.is_set():
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        return result, locked_after_timeout, social_service._cse_semaphore.locked()
+
+    result, locked_after_timeout, locked_after_finish = asyncio.run(main())
+    assert result == {}
+    assert locked_after_timeout
+    assert not locked_after_finish
+    assert request.http_timeout == 0.05
+
+
+def test_query_result_is_returned(monkeypatch):
+    request = FakeRequest(delay=0, result={"items": [{"link": "https://example.com"}]})
+
+    async def main():
+        monkeypatch.setattr(social_service, "_cse_semaphore", asyncio.Semaphore(1))
+        result = await GoogleSearchService("key", "cx")._execute_query(FakeService(request), "tokyo", 3)
+        await asyncio.sleep(0)
+        return result, social_service._cse_semaphore.locked()
+
+    assert asyncio.run(main()) == ({"items": [{"link": "https://example.com"}]}, False)
+
+
+def test_youtube_posts_keep_video_id():
+    assert social_service.stable_post_id("https://www.youtube.com/watch?v=abc123&t=30s") == "youtube_abc123"
+    assert social_service.stable_post_id("https://youtu.be/abc123?si=xyz") == "youtube_abc123"
+
+
+def test_other_links_get_stable_hashed_ids():
+    # 站点搜索和一般搜索对同一链接判定的平台不同，ID 仍然相同
+    first = social_service.stable_post_id("https://www.tripadvisor.com/Attraction-Tokyo?utm_source=x")
+    second = social_service.stable_post_id("https://tripadvisor.com/Attraction-Tokyo/")
+    assert first == second
+    assert len(first) == 16 and int(first, 16) >= 0
+    channel = social_service.stable_post_id("https://www.youtube.com/@channel")
+    assert len(channel) == 16 and channel != first
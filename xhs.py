@@ -1,12 +1,14 @@
 from fastapi import HTTPException
 from agno.agent import Agent
-from agno.tools.mcp import MultiMCPTools
 from agno.models.openai import OpenAIChat
 import os
 import logging
 import json
 from typing import List, Optional
 from models import generate_mock_xhs_data
+from json_repair import parse_llm_json
+from mcp_pool import xhs_mcp_pool
+from singleflight import SingleFlight
 
 
 
@@ -14,6 +16,9 @@ from models import generate_mock_xhs_data
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 相同目的地和偏好的并发请求只生成一次
+xhs_flights = SingleFlight("xhs")
+
 async def run_mcp_xiaohongshu(
     openai_key: str, 
     google_maps_key: str,
@@ -28,143 +33,129 @@ async def run_mcp_xiaohongshu(
         if not openai_key or not google_maps_key:
             raise ValueError("API keys are missing")
     
-        # Initialize MCPTools with xiaohongshu MCP
-        mcp_tools = MultiMCPTools(
-            [
-                "cmd /c npx -y rednote-mind-mcp"
-            ],
-            timeout_seconds=5000,
-        )
-        # Connect to Xiaohongshu MCP server
-        await mcp_tools.connect()
-
-        # Initialize Travel Planner Agent
-        travel_planner = Agent(
-            name="Xiaohongshu Search Agent",
-            model=OpenAIChat(
-                id="openai/gpt-4o", 
-                api_key=openai_key,
-                base_url="https://openrouter.ai/api/v1"
-            ),
-            tools=[mcp_tools],
-            markdown=True
-        )
-        logger.info("Successfully created Xiaohongshu Search Agent")
-
-        # Build keyword from destination and preferences
-        if preferences and len(preferences) > 0:
-            preference_str = " ".join(preferences)
-            keyword = f"{destination} {preference_str}"
-        else:
-            preference_str = destination
-            keyword = destination
-
-        # Define prompt for Xiaohongshu search with JSON output
-        prompt = f"""
-        You are a Xiaohongshu Search Agent. Your role is to help users search, analyze, and summarize content using Xiaohongshu MCP.
-
-        **CORE WORKFLOW:**
-        1. When user provides keyword "{keyword}", first translate it to Chinese
-        2. Search ONLY once for top 5 relevant feeds on Xiaohongshu using the Chinese keyword
-        3. Extract detailed content from each of the 5 posts
-        4. Analyze and summarize the key information in English, focusing on the following:
-            - Place names (e.g. tourist spots)
-            - Restaurant names
-            - Activity names (e.g., hiking, sightseeing)
-            - Relevant travel destinations
-            - User reviews and recommendations
-
-        **CRITICAL REQUIREMENT: You MUST output ONLY valid JSON format, do not include any additional text, explanations, or markdown (no ```json ```).**
-
-        **JSON OUTPUT STRUCTURE:**
-        {{
-            "search_keyword": "{keyword}",
-            "destination": "{destination}",
-            "preferences": {json.dumps(preferences) if preferences else "[]"},
-            "posts": [
-                {{
-                    "title": "Post title in English",
-                    "author": "Author name",
-                    "link": "Post URL",
-                    "summary": "Brief summary of the post content",
-                    "places_mentioned": ["Place 1", "Place 2"],
-                    "restaurants_mentioned": ["Restaurant 1", "Restaurant 2"],
-                    "activities_mentioned": ["Activity 1", "Activity 2"],
-                    "key_tips": ["Tip 1", "Tip 2"]
+        # 从会话池借用已连接的小红书 MCP 会话
+        async with xhs_mcp_pool.lease() as mcp_tools:
+            # Initialize Travel Planner Agent
+            travel_planner = Agent(
+                name="Xiaohongshu Search Agent",
+                model=OpenAIChat(
+                    id="openai/gpt-4o", 
+                    api_key=openai_key,
+                    base_url="https://openrouter.ai/api/v1"
+                ),
+                tools=[mcp_tools],
+                markdown=True
+            )
+            logger.info("Successfully created Xiaohongshu Search Agent")
+
+            # Build keyword from destination and preferences
+            if preferences and len(preferences) > 0:
+                preference_str = " ".join(preferences)
+                keyword = f"{destination} {preference_str}"
+            else:
+                preference_str = destination
+                keyword = destination
+
+            # Define prompt for Xiaohongshu search with JSON output
+            prompt = f"""
+            You are a Xiaohongshu Search Agent. Your role is to help users search, analyze, and summarize content using Xiaohongshu MCP.
+
+            **CORE WORKFLOW:**
+            1. When user provides keyword "{keyword}", first translate it to Chinese
+            2. Search ONLY once for top 5 relevant feeds on Xiaohongshu using the Chinese keyword
+            3. Extract detailed content from each of the 5 posts
+            4. Analyze and summarize the key information in English, focusing on the following:
+                - Place names (e.g. tourist spots)
+                - Restaurant names
+                - Activity names (e.g., hiking, sightseeing)
+                - Relevant travel destinations
+                - User reviews and recommendations
+
+            **CRITICAL REQUIREMENT: You MUST output ONLY valid JSON format, do not include any additional text, explanations, or markdown (no ```json ```).**
+
+            **JSON OUTPUT STRUCTURE:**
+            {{
+                "search_keyword": "{keyword}",
+                "destination": "{destination}",
+                "preferences": {json.dumps(preferences) if preferences else "[]"},
+                "posts": [
+                    {{
+                        "title": "Post title in English",
+                        "author": "Author name",
+                        "link": "Post URL",
+                        "summary": "Brief summary of the post content",
+                        "places_mentioned": ["Place 1", "Place 2"],
+                        "restaurants_mentioned": ["Restaurant 1", "Restaurant 2"],
+                        "activities_mentioned": ["Activity 1", "Activity 2"],
+                        "key_tips": ["Tip 1", "Tip 2"]
+                    }}
+                ],
+                "summary": {{
+                    "popular_opinions": "Summary of popular opinions and sentiments",
+                    "key_recommendations": "Key takeaways about {preference_str if preferences else destination} from the posts",
+                    "notable_patterns": "Notable patterns across posts (e.g., frequently mentioned spots, common experiences)",
+                    "top_places": ["Most mentioned place 1", "Most mentioned place 2"],
+                    "top_restaurants": ["Most mentioned restaurant 1", "Most mentioned restaurant 2"],
+                    "top_activities": ["Most mentioned activity 1", "Most mentioned activity 2"]
                 }}
-            ],
-            "summary": {{
-                "popular_opinions": "Summary of popular opinions and sentiments",
-                "key_recommendations": "Key takeaways about {preference_str if preferences else destination} from the posts",
-                "notable_patterns": "Notable patterns across posts (e.g., frequently mentioned spots, common experiences)",
-                "top_places": ["Most mentioned place 1", "Most mentioned place 2"],
-                "top_restaurants": ["Most mentioned restaurant 1", "Most mentioned restaurant 2"],
-                "top_activities": ["Most mentioned activity 1", "Most mentioned activity 2"]
             }}
-        }}
-
-        **TOOLS USAGE STRATEGY:**
-        - First use `search_notes_by_keyword` with Chinese keyword to search for posts, only return text and do not use pictures.
-        - Process all 5 posts texts before generating final JSON summary
-        - Extract at least 3-5 posts with detailed information
-
-        Use Xiaohongshu MCP for real data.
-        """
 
-        # Get response from travel planner agent
-        response = await travel_planner.arun(prompt)
-        logger.info(f"Received response: {response.content[:200]}...")
-
-        # Try to parse JSON from response
-        content = response.content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-
-        try:
-            result = json.loads(content)
-            logger.info("Successfully parsed JSON response")
-            return result
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON: {e}")
-            logger.error(f"Response content: {content[:500]}")
-            # Return a structured error response
-            return {
-                "search_keyword": keyword,
-                "destination": destination,
-                "preferences": preferences or [],
-                "posts": [],
-                "summary": {
-                    "popular_opinions": "Failed to parse response",
-                    "key_recommendations": content[:500],
-                    "notable_patterns": "",
-                    "top_places": [],
-                    "top_restaurants": [],
-                    "top_activities": []
-                },
-                "error": "Failed to parse JSON response",
-                "raw_response": content[:1000]
-            }
+            **TOOLS USAGE STRATEGY:**
+            - First use `search_notes_by_keyword` with Chinese keyword to search for posts, only return text and do not use pictures.
+            - Process all 5 posts texts before generating final JSON summary
+            - Extract at least 3-5 posts with detailed information
+
+            Use Xiaohongshu MCP for real data.
+            """
+
+            # Get response from travel planner agent
+            response = await travel_planner.arun(prompt)
+            logger.info(f"Received response: {response.content[:200]}...")
+
+            # 提取并解析 JSON（兼容 markdown 代码块、多余逗号和被截断的输出）
+            content = response.content.strip()
+            result, repaired = parse_llm_json(content)
+            if result is not None:
+                logger.info("Successfully parsed JSON response" + (" (repaired)" if repaired else ""))
+                return result
+            else:
+                logger.error("Failed to parse JSON")
+                logger.error(f"Response content: {content[:500]}")
+                # Return a structured error response
+                return {
+                    "search_keyword": keyword,
+                    "destination": destination,
+                    "preferences": preferences or [],
+                    "posts": [],
+                    "summary": {
+                        "popular_opinions": "Failed to parse response",
+                        "key_recommendations": content[:500],
+                        "notable_patterns": "",
+                        "top_places": [],
+                        "top_restaurants": [],
+                        "top_activities": []
+                    },
+                    "error": "Failed to parse JSON response",
+                    "raw_response": content[:1000]
+                }
 
     except Exception as e:
         logger.error(f"Error during MCP Xiaohongshu processing: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred while processing Xiaohongshu: {str(e)}")
-    
-    finally:
-        await mcp_tools.close()
-        logger.info("MCP tools connection closed.")
 
 async def generate_xhs(
     destination: str,
     preferences: Optional[List[str]] = None
 ) -> dict:
     """Generate travel recommendations based on Xiaohongshu posts."""
+    key = xhs_flights.make_key(destination.strip().lower(), sorted(preferences or []))
+    return await xhs_flights.do(key, lambda progress_id, emit: _generate_xhs(destination, preferences))
+
+
+async def _generate_xhs(
+    destination: str,
+    preferences: Optional[List[str]] = None
+) -> dict:
     # 暂时使用模拟数据，取消注释下面的代码来使用真实的 API
     # openai_key = os.getenv("OPENROUTER_API_KEY")
     # google_map_key = os.getenv("GOOGLE_MAP_KEY")